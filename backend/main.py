@@ -1,19 +1,40 @@
 # backend/main.py - COMPLETE & TESTED
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 from dotenv import load_dotenv
-import base64
-import requests
+from contextlib import asynccontextmanager
+import asyncio
+import httpx
 
 from routes import diagram_routes, chat_routes
+from services.diagram_renderer import render_diagram, close_renderers, MEDIA_TYPES
+from services.export_cache import export_cache, get_export_key, etag_matches
+from services.llm_cache import llm_cache
+from services.llm_clients import llm_clients
+from services.llm_gateway import llm_gateway
+from services.clone_scheduler import clone_scheduler
+from services.github_client import github_client
+from typing import Optional
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared LLM connection pool at startup; close every pooled client and renderer at shutdown"""
+    llm_clients.start()
+    try:
+        yield
+    finally:
+        await llm_clients.aclose()
+        await close_renderers()
+        await github_client.aclose()
+
 app = FastAPI(
     title="RepoVision AI - GitHub Repository Analyzer",
     description="AI-powered GitHub repository analysis with detailed Mermaid diagrams",
-    version="2.0"
+    version="2.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -30,46 +51,55 @@ app.include_router(diagram_routes.router, tags=["Diagrams"])
 app.include_router(chat_routes.router, tags=["Chat"])
 
 @app.post("/export-diagram")
-async def export_diagram(request: dict):
-    """Convert Mermaid diagram to PNG or SVG image"""
+async def export_diagram(
+    request: dict,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+):
+    """
+    Convert Mermaid diagram to PNG or SVG image
+    ⚡ CACHED: Rendered images are cached by content hash; the hash is the ETag
+    """
     try:
         mermaid_code = request.get("mermaid_code", "")
         format_type = request.get("format", "png").lower()
+        theme = request.get("theme", "default")
         
         if not mermaid_code:
             raise HTTPException(status_code=400, detail="No mermaid code provided")
         
-        # Encode mermaid code to base64
-        encoded = base64.urlsafe_b64encode(mermaid_code.encode('utf-8')).decode('utf-8')
+        format_type = "svg" if format_type == "svg" else "png"
         
-        # Choose endpoint based on format
-        if format_type == "svg":
-            url = f"https://mermaid.ink/svg/{encoded}"
-            media_type = "image/svg+xml"
-        else:
-            url = f"https://mermaid.ink/img/{encoded}"
-            media_type = "image/png"
+        cache_key = get_export_key(mermaid_code, format_type, theme)
+        etag = f'"{cache_key}"'
+        headers = {
+            "Content-Disposition": f"attachment; filename=diagram.{format_type}",
+            "ETag": etag
+        }
         
-        # Fetch the image
-        print(f"📥 Fetching {format_type.upper()} from mermaid.ink...")
-        response = requests.get(url, timeout=30)
+        # The client already holds exactly this rendering
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
         
-        if response.status_code == 200:
-            print(f"✅ Successfully generated {format_type.upper()} image")
+        content = await export_cache.aget(cache_key)
+        if content is not None:
             return Response(
-                content=response.content,
-                media_type=media_type,
-                headers={
-                    "Content-Disposition": f"attachment; filename=diagram.{format_type}"
-                }
-            )
-        else:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Failed to generate image: {response.status_code}"
+                content=content,
+                media_type=MEDIA_TYPES[format_type],
+                headers={**headers, "X-Cache": "HIT"}
             )
+        
+        # Render with the configured backend (local worker pool or mermaid.ink)
+        content, media_type = await render_diagram(mermaid_code, format_type, theme)
+        await export_cache.aput(cache_key, content)
+        
+        print(f"✅ Successfully generated {format_type.upper()} image")
+        return Response(
+            content=content,
+            media_type=media_type,
+            headers={**headers, "X-Cache": "MISS"}
+        )
             
-    except requests.exceptions.Timeout:
+    except (asyncio.TimeoutError, httpx.TimeoutException):
         raise HTTPException(status_code=504, detail="Image generation timed out")
     except Exception as e:
         print(f"❌ Error exporting diagram: {e}")
@@ -99,8 +129,16 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "version": "2.0"}
+    """Health check endpoint (with clone queue depth, GitHub API usage, LLM latency, budget and cache hits)"""
+    return {
+        "status": "healthy",
+        "version": "2.0",
+        "clone_scheduler": clone_scheduler.metrics(),
+        "github_api": github_client.metrics(),
+        "llm": llm_clients.metrics(),
+        "llm_gateway": llm_gateway.metrics(),
+        "llm_cache": dict(llm_cache.stats)
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,6 +1,6 @@
 # backend/models.py - COMPLETE
 from pydantic import BaseModel, Field
-from typing import Literal, List, Optional
+from typing import Literal, List, Optional, Dict
 
 class DiagramRequest(BaseModel):
     """Request model for generating specific diagram types"""
@@ -14,9 +14,12 @@ class DiagramRequest(BaseModel):
         "state", 
         "journey", 
         "gantt", 
-        "mindmap"
-    ] = Field(..., description="Type of diagram to generate")
+        "mindmap",
+        "imports"
+    ] = Field(..., description="Type of diagram to generate (\"imports\" is built from the source without the LLM)")
     github_token: Optional[str] = Field(None, description="GitHub personal access token for private repos")
+    subdirectory: Optional[str] = Field(None, description="Only analyze this directory of the repository (e.g. packages/api)")
+    no_cache: bool = Field(False, description="Skip the LLM response cache and generate a fresh diagram")
 
 class CustomDiagramRequest(BaseModel):
     """Request model for custom diagram generation"""
@@ -24,12 +27,16 @@ class CustomDiagramRequest(BaseModel):
     user_prompt: str = Field(..., description="User's custom prompt for diagram generation")
     diagram_type: Optional[str] = Field(None, description="Optional diagram type hint")
     github_token: Optional[str] = Field(None, description="GitHub personal access token for private repos")
+    subdirectory: Optional[str] = Field(None, description="Only analyze this directory of the repository (e.g. packages/api)")
 
 class DiagramResponse(BaseModel):
     """Response model for diagram generation"""
     mermaid_code: str = Field(..., description="Generated Mermaid diagram code")
     diagram_type: str = Field(..., description="Type of diagram generated")
     repo_name: str = Field(..., description="Repository name")
+    context_tokens: Optional[int] = Field(None, description="Tokens of repository context sent to the model")
+    timings: Optional[Dict[str, float]] = Field(None, description="Wall seconds per repository analysis stage, plus total")
+    cached: bool = Field(default=False, description="Whether the diagram was replayed from the LLM response cache")
 
 class ChatMessage(BaseModel):
     """Chat message model"""
@@ -48,6 +55,7 @@ class ChatRequest(BaseModel):
         description="Previous chat messages for context"
     )
     github_token: Optional[str] = Field(None, description="GitHub personal access token for private repos")
+    subdirectory: Optional[str] = Field(None, description="Only analyze this directory of the repository (e.g. packages/api)")
     
     class Config:
         from_attributes = True
@@ -62,4 +70,6 @@ class ChatResponse(BaseModel):
     follow_up_questions: Optional[List[str]] = Field(
         default_factory=list, 
         description="Suggested follow-up questions"
-    )
\ No newline at end of file
+    )
+    context_tokens: Optional[int] = Field(None, description="Tokens of repository context sent to the model")
+    timings: Optional[Dict[str, float]] = Field(None, description="Wall seconds per repository analysis stage, plus total")
@@ -0,0 +1,38 @@
+// backend/renderer/mermaid_worker.mjs - LONG-LIVED MERMAID RENDERER
+// One headless browser per process, fed JSON lines over stdin by services/diagram_renderer.py
+// Setup: cd backend/renderer && npm install
+import readline from "node:readline";
+import puppeteer from "puppeteer";
+import { renderMermaid } from "@mermaid-js/mermaid-cli";
+
+const send = (message) => process.stdout.write(JSON.stringify(message) + "\n");
+
+const browser = await puppeteer.launch({
+  headless: "new",
+  args: ["--no-sandbox", "--disable-setuid-sandbox"],
+});
+
+send({ ready: true });
+
+const lines = readline.createInterface({ input: process.stdin });
+
+for await (const line of lines) {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch {
+    continue;
+  }
+
+  try {
+    const { data } = await renderMermaid(browser, request.code, request.format, {
+      backgroundColor: request.theme === "dark" ? "#1a1a1a" : "white",
+      mermaidConfig: { theme: request.theme || "default" },
+    });
+    send({ id: request.id, ok: true, data: Buffer.from(data).toString("base64") });
+  } catch (error) {
+    send({ id: request.id, ok: false, error: String((error && error.message) || error) });
+  }
+}
+
+await browser.close();
@@ -1,10 +1,20 @@
 # backend/routes/chat_routes.py - COMPLETE & TESTED
 from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from models import ChatRequest, ChatResponse
-from services.github_service import fetch_github_repo_structure
-from services.llm_service import analyze_repo_with_chat
+from services.analysis_cache import get_repo_analysis
+from services.llm_service import analyze_repo_with_chat, stream_repo_chat
 from typing import Optional
+from dotenv import load_dotenv
 import traceback
+import asyncio
+import json
+import os
+
+load_dotenv()
+
+# Idle streams get an SSE comment this often, so clients with a read timeout keep waiting
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
 
 router = APIRouter()
 
@@ -44,10 +54,8 @@ async def chat_with_repo(
         # Step 1: Fetch repository data
         try:
             print("🔍 Step 1: Fetching repository structure...")
-            repo_data = fetch_github_repo_structure(
-                request.repo_url,
-                deep_fetch=True,
-                github_token=github_token
+            repo_data = await get_repo_analysis(
+                request.repo_url, github_token=github_token, subdirectory=request.subdirectory
             )
             
             files_count = repo_data.get('total_files_analyzed', 0)
@@ -87,7 +95,7 @@ async def chat_with_repo(
             print(f"   - Generating detailed response...")
             
             # Analyze repository with LLM
-            result = analyze_repo_with_chat(
+            result = await analyze_repo_with_chat(
                 repo_data,
                 request.question,
                 chat_history
@@ -111,9 +119,13 @@ async def chat_with_repo(
                 has_diagram=result["has_diagram"],
                 mermaid_code=result.get("mermaid_code"),
                 diagram_type=result.get("diagram_type"),
-                follow_up_questions=result.get("follow_up_questions", [])
+                follow_up_questions=result.get("follow_up_questions", []),
+                context_tokens=result.get("context_tokens"),
+                timings=repo_data.get("timings")
             )
             
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"❌ AI analysis error: {str(e)}")
             traceback.print_exc()
@@ -135,4 +147,108 @@ async def chat_with_repo(
         raise HTTPException(
             status_code=500,
             detail=f"An unexpected error occurred: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+def format_sse(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def with_keepalive(events, interval: float):
+    """
+    Pass SSE messages through, adding a ": keepalive" comment after every `interval` idle seconds
+    Covers the clone queue and the wait for the first model token, which can outlast a read timeout.
+    """
+    events = events.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(events.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield ": keepalive\n\n"
+                continue
+            try:
+                message = pending.result()
+            except StopAsyncIteration:
+                return
+            finally:
+                pending = None
+            yield message
+    finally:
+        if pending is not None:
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await events.aclose()
+
+@router.post("/chat/stream")
+async def chat_with_repo_stream(
+    request: ChatRequest,
+    x_github_token: Optional[str] = Header(None, alias="X-GitHub-Token")
+):
+    """
+    Streaming variant of /chat over server-sent events
+    Emits progress events, then answer tokens, then the validated diagram and a final "done";
+    keepalive comments fill gaps longer than SSE_KEEPALIVE_SECONDS
+    """
+    # Validate inputs before the stream starts so errors keep their status codes
+    if not request.repo_url or not request.repo_url.strip():
+        raise HTTPException(
+            status_code=400, 
+            detail="Repository URL is required. Example: https://github.com/owner/repo"
+        )
+    
+    if not request.question or not request.question.strip():
+        raise HTTPException(
+            status_code=400, 
+            detail="Question is required"
+        )
+    
+    github_token = x_github_token or request.github_token
+    
+    chat_history = []
+    for msg in request.chat_history or []:
+        if isinstance(msg, dict):
+            chat_history.append(msg)
+        else:
+            chat_history.append({"role": msg.role, "content": msg.content})
+    
+    async def event_stream():
+        try:
+            print(f"💬 Streaming chat for {request.repo_url}")
+            yield format_sse("progress", {"stage": "cloning", "message": "📦 Fetching repository..."})
+            
+            repo_data = await get_repo_analysis(
+                request.repo_url, github_token=github_token, subdirectory=request.subdirectory
+            )
+            yield format_sse("progress", {
+                "stage": "analysis_done",
+                "message": f"🔍 Analyzed {repo_data.get('total_files_analyzed', 0)} files",
+                "files_analyzed": repo_data.get('total_files_analyzed', 0),
+                "timings": repo_data.get('timings')
+            })
+            
+            async for event, data in stream_repo_chat(repo_data, request.question, chat_history):
+                yield format_sse(event, data)
+            
+            print(f"✅ Streaming chat complete")
+        
+        except HTTPException as e:
+            print(f"❌ Streaming chat failed: {e.detail}")
+            error = {"status_code": e.status_code, "detail": e.detail}
+            if e.headers and "Retry-After" in e.headers:
+                error["retry_after"] = int(e.headers["Retry-After"])  # Clone queue full or model busy (429/503)
+            yield format_sse("error", error)
+        except Exception as e:
+            print(f"❌ Streaming chat failed: {str(e)}")
+            traceback.print_exc()
+            yield format_sse("error", {"status_code": 500, "detail": f"AI analysis failed: {str(e)}"})
+    
+    return StreamingResponse(
+        with_keepalive(event_stream(), SSE_KEEPALIVE_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
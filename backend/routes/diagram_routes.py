@@ -1,9 +1,13 @@
 # backend/routes/diagram_routes.py - COMPLETE & TESTED
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from models import DiagramRequest, DiagramResponse, CustomDiagramRequest
-from services.github_service import fetch_github_repo_structure, format_file_structure, format_file_contents
-from services.llm_service import get_llm, clean_mermaid_code, detect_diagram_type, validate_mermaid_syntax
+from services.context_builder import build_repo_context
+from services.analysis_cache import get_repo_analysis
+from services.llm_service import get_llm, invoke_llm, clean_mermaid_code, detect_diagram_type, repair_diagram, fit_diagram_to_budget
 from services.prompt_templates import get_diagram_prompt, get_custom_diagram_prompt
+from services.llm_cache import get_llm_cache_key, get_cached_response, put_cached_response
+from services.import_graph import generate_import_diagram
 import traceback
 
 router = APIRouter()
@@ -29,10 +33,8 @@ async def generate_diagram(request: DiagramRequest):
         # Fetch repository data
         try:
             print("🔍 Step 1: Analyzing repository...")
-            repo_data = fetch_github_repo_structure(
-                request.repo_url, 
-                deep_fetch=True,
-                github_token=request.github_token
+            repo_data = await get_repo_analysis(
+                request.repo_url, github_token=request.github_token, subdirectory=request.subdirectory
             )
             print(f"✅ Repository analyzed: {repo_data.get('total_files_analyzed', 0)} files")
             print()
@@ -42,10 +44,27 @@ async def generate_diagram(request: DiagramRequest):
             print(f"❌ Repository fetch failed: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to fetch repository: {str(e)}")
         
+        # Import graphs come straight from the source: no model call, no tokens
+        if request.diagram_type == "imports":
+            print("🧭 Step 2: Building import graph from source...")
+            try:
+                mermaid_code, stats = await run_in_threadpool(generate_import_diagram, repo_data)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            print(f"✅ Import graph ready: {stats['files']} files, {stats['internal_edges']} imports, "
+                  f"{stats['external_packages']} external packages")
+            return DiagramResponse(
+                mermaid_code=mermaid_code,
+                diagram_type=request.diagram_type,
+                repo_name=repo_data.get('name', 'Unknown'),
+                context_tokens=0,
+                timings=repo_data.get('timings')
+            )
+        
         # Initialize LLM
         try:
             print("🤖 Step 2: Initializing AI...")
-            llm = get_llm()
+            llm = get_llm("diagram")
             print("✅ AI initialized")
             print()
         except Exception as e:
@@ -55,26 +74,8 @@ async def generate_diagram(request: DiagramRequest):
         # Build context
         try:
             print("📝 Step 3: Building analysis context...")
-            context = f"""
-Repository: {repo_data.get('name', 'Unknown')}
-Description: {repo_data.get('description', 'No description')}
-Primary Language: {repo_data.get('language', 'Unknown')}
-All Languages: {', '.join([f"{k} ({v} files)" for k, v in list(repo_data.get('languages', {}).items())[:5]])}
-Stars: {repo_data.get('stars', 0)} | Forks: {repo_data.get('forks', 0)}
-
-COMPLETE FILE STRUCTURE:
-{format_file_structure(repo_data.get('file_structure', {}), max_items=150)}
-
-KEY FILE CONTENTS (First 5KB of each file):
-{format_file_contents(repo_data.get('file_contents', {}), max_files=60)}
-
-README:
-{repo_data.get('readme', '')[:8000]}
-
-DEPENDENCIES:
-{', '.join(repo_data.get('dependencies', {}).keys())}
-"""
-            print(f"✅ Context built ({len(context)} characters)")
+            context, context_tokens = await run_in_threadpool(build_repo_context, repo_data, request.diagram_type)
+            print(f"✅ Context built ({context_tokens} tokens, {len(context)} characters)")
             print()
         except Exception as e:
             print(f"❌ Context building failed: {str(e)}")
@@ -90,6 +91,21 @@ DEPENDENCIES:
             print(f"❌ Prompt creation failed: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Prompt creation failed: {str(e)}")
         
+        # ⚡ Same model, temperature and prompt (same repo content + diagram type): replay the accepted answer
+        cache_key = get_llm_cache_key(llm, prompt)
+        if not request.no_cache:
+            cached_content = await get_cached_response(cache_key)
+            if cached_content is not None:
+                print("⚡ LLM response cache hit, skipping generation")
+                return DiagramResponse(
+                    mermaid_code=fit_diagram_to_budget(clean_mermaid_code(cached_content)),
+                    diagram_type=request.diagram_type,
+                    repo_name=repo_data.get('name', 'Unknown'),
+                    context_tokens=context_tokens,
+                    timings=repo_data.get('timings'),
+                    cached=True
+                )
+        
         # Generate diagram with retry logic
         max_retries = 3
         attempt = 0
@@ -97,7 +113,7 @@ DEPENDENCIES:
         while attempt < max_retries:
             try:
                 print(f"🎨 Step 5: Generating detailed diagram (attempt {attempt + 1}/{max_retries})...")
-                response = llm.invoke(prompt)
+                response = await invoke_llm(llm, prompt)
                 print("✅ AI response received")
                 
                 # Clean and validate
@@ -106,31 +122,17 @@ DEPENDENCIES:
                 if not mermaid_code or len(mermaid_code.strip()) < 10:
                     raise ValueError("Generated diagram is empty or too short")
                 
-                # Validate syntax
-                is_valid, errors = validate_mermaid_syntax(mermaid_code)
+                # Syntax errors are repaired on the diagram alone instead of regenerating it
+                mermaid_code, is_valid, errors = await repair_diagram(mermaid_code)
+                if not is_valid:
+                    print(f"⚠️ Syntax warnings after repair: {errors[:2]}")
                 
-                if not is_valid and attempt < max_retries - 1:
-                    print(f"⚠️ Syntax errors detected: {errors[:2]}")
-                    print(f"🔄 Retrying with improved instructions...")
-                    
-                    retry_prompt = prompt + f"""
-
-PREVIOUS ATTEMPT HAD ERRORS: {', '.join(errors[:3])}
-
-REGENERATE with these STRICT RULES:
-1. Node IDs: ONLY letters, numbers, underscores (NO SPACES!)
-   ✅ Good: user_service, auth_controller, UserModel
-   ❌ BAD: user service, auth controller
-2. Arrows: ONLY --> or -.-> or ==>
-3. Include 15-20+ major components for detailed view
-4. Use actual file names from the repository
-5. Organize with subgraphs by folder/module
-
-Generate a DETAILED, comprehensive diagram with ALL major components:"""
-                    
-                    prompt = retry_prompt
-                    attempt += 1
-                    continue
+                # Only answers that passed validation are worth replaying
+                if is_valid:
+                    await put_cached_response(cache_key, mermaid_code)
+                
+                # The cache keeps the full diagram; the budget is applied on the way out
+                mermaid_code = fit_diagram_to_budget(mermaid_code)
                 
                 print(f"✅ Diagram generated successfully!")
                 print(f"   - Size: {len(mermaid_code)} characters")
@@ -143,10 +145,13 @@ Generate a DETAILED, comprehensive diagram with ALL major components:"""
                 return DiagramResponse(
                     mermaid_code=mermaid_code,
                     diagram_type=request.diagram_type,
-                    repo_name=repo_data.get('name', 'Unknown')
+                    repo_name=repo_data.get('name', 'Unknown'),
+                    context_tokens=context_tokens,
+                    timings=repo_data.get('timings')
                 )
                 
-            except Exception as e:
+            except ValueError as e:
+                # Only an unusable answer is regenerated; the gateway already retried provider errors
                 if attempt < max_retries - 1:
                     print(f"⚠️ Attempt {attempt + 1} failed: {str(e)}")
                     attempt += 1
@@ -189,10 +194,8 @@ async def generate_custom_diagram(request: CustomDiagramRequest):
         # Fetch repository data
         try:
             print("🔍 Step 1: Analyzing repository...")
-            repo_data = fetch_github_repo_structure(
-                request.repo_url, 
-                deep_fetch=True,
-                github_token=request.github_token
+            repo_data = await get_repo_analysis(
+                request.repo_url, github_token=request.github_token, subdirectory=request.subdirectory
             )
             print(f"✅ Repository analyzed: {repo_data.get('total_files_analyzed', 0)} files")
             print()
@@ -205,7 +208,7 @@ async def generate_custom_diagram(request: CustomDiagramRequest):
         # Initialize LLM
         try:
             print("🤖 Step 2: Initializing AI...")
-            llm = get_llm()
+            llm = get_llm("custom_diagram")
             print("✅ AI initialized")
             print()
         except Exception as e:
@@ -215,21 +218,8 @@ async def generate_custom_diagram(request: CustomDiagramRequest):
         # Build context
         try:
             print("📝 Step 3: Building context...")
-            context = f"""
-Repository: {repo_data.get('name', 'Unknown')}
-Description: {repo_data.get('description', 'No description')}
-Language: {repo_data.get('language', 'Unknown')}
-
-FILE STRUCTURE:
-{format_file_structure(repo_data.get('file_structure', {}), max_items=150)}
-
-FILE CONTENTS:
-{format_file_contents(repo_data.get('file_contents', {}), max_files=60)}
-
-DEPENDENCIES:
-{repo_data.get('dependencies', {})}
-"""
-            print(f"✅ Context ready")
+            context, context_tokens = await run_in_threadpool(build_repo_context, repo_data, request.user_prompt)
+            print(f"✅ Context ready ({context_tokens} tokens)")
             print()
         except Exception as e:
             print(f"❌ Context building failed: {str(e)}")
@@ -252,7 +242,7 @@ DEPENDENCIES:
         while attempt < max_retries:
             try:
                 print(f"🎨 Step 5: Generating custom diagram (attempt {attempt + 1}/{max_retries})...")
-                response = llm.invoke(prompt)
+                response = await invoke_llm(llm, prompt)
                 print("✅ AI response received")
                 
                 # Clean and detect type
@@ -261,30 +251,13 @@ DEPENDENCIES:
                 if not mermaid_code or len(mermaid_code.strip()) < 10:
                     raise ValueError("Generated diagram is empty")
                 
-                # Validate syntax
-                is_valid, errors = validate_mermaid_syntax(mermaid_code)
-                
-                if not is_valid and attempt < max_retries - 1:
-                    print(f"⚠️ Syntax errors: {errors[:2]}")
-                    print(f"🔄 Retrying...")
-                    
-                    retry_prompt = prompt + f"""
-
-SYNTAX ERRORS IN PREVIOUS ATTEMPT: {', '.join(errors[:3])}
-
-FIX THESE AND REGENERATE:
-1. Node IDs: NO SPACES (use underscore: user_service not user service)
-2. Only use these arrows: --> or -.-> or ==>
-3. Include 15-20+ components for detail
-4. Use actual file names from repository
-
-Generate corrected detailed diagram:"""
-                    
-                    prompt = retry_prompt
-                    attempt += 1
-                    continue
+                # Syntax errors are repaired on the diagram alone instead of regenerating it
+                mermaid_code, is_valid, errors = await repair_diagram(mermaid_code)
+                if not is_valid:
+                    print(f"⚠️ Syntax warnings after repair: {errors[:2]}")
                 
                 diagram_type = detect_diagram_type(mermaid_code)
+                mermaid_code = fit_diagram_to_budget(mermaid_code)
                 
                 print(f"✅ Custom diagram generated!")
                 print(f"   - Type: {diagram_type}")
@@ -297,10 +270,13 @@ Generate corrected detailed diagram:"""
                 return DiagramResponse(
                     mermaid_code=mermaid_code,
                     diagram_type=diagram_type,
-                    repo_name=repo_data.get('name', 'Unknown')
+                    repo_name=repo_data.get('name', 'Unknown'),
+                    context_tokens=context_tokens,
+                    timings=repo_data.get('timings')
                 )
                 
-            except Exception as e:
+            except ValueError as e:
+                # Only an unusable answer is regenerated; the gateway already retried provider errors
                 if attempt < max_retries - 1:
                     print(f"⚠️ Attempt {attempt + 1} failed: {str(e)}")
                     attempt += 1
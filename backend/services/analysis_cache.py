@@ -0,0 +1,119 @@
+# backend/services/analysis_cache.py - SHARED IN-PROCESS ANALYSIS CACHE
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from .file_index import to_jsonable
+from .github_service import (
+    parse_github_url,
+    build_clone_url,
+    normalize_subdirectory,
+    resolve_remote_head,
+    clone_and_analyze_repo,
+    timed_stage
+)
+
+load_dotenv()
+
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 256MB
+
+# (owner, repo, sha, subdirectory) -> (size_bytes, repo_data), oldest first
+_analysis_cache = OrderedDict()
+_analysis_cache_bytes = 0
+
+# (owner, repo, sha, subdirectory) -> asyncio.Task running the clone-and-analyze
+_inflight = {}
+
+def _estimate_size(repo_data: dict) -> int:
+    """Approximate memory footprint of an analysis result"""
+    try:
+        return len(json.dumps(repo_data, default=to_jsonable))
+    except (TypeError, ValueError):
+        return sum(len(str(v)) for v in repo_data.values())
+
+def _cache_get(key: tuple) -> dict:
+    entry = _analysis_cache.get(key)
+    if entry is None:
+        return None
+    _analysis_cache.move_to_end(key)
+    return entry[1]
+
+def _cache_put(key: tuple, repo_data: dict) -> None:
+    global _analysis_cache_bytes
+
+    size = _estimate_size(repo_data)
+    if size > ANALYSIS_CACHE_MAX_BYTES:
+        print(f"⚠️ Analysis too large to keep in memory ({size} bytes)")
+        return
+
+    if key in _analysis_cache:
+        _analysis_cache_bytes -= _analysis_cache.pop(key)[0]
+
+    _analysis_cache[key] = (size, repo_data)
+    _analysis_cache_bytes += size
+
+    # Evict least recently used entries until under budget
+    while _analysis_cache_bytes > ANALYSIS_CACHE_MAX_BYTES and _analysis_cache:
+        _, (evicted_size, _) = _analysis_cache.popitem(last=False)
+        _analysis_cache_bytes -= evicted_size
+
+async def get_repo_analysis(repo_url: str, github_token: str = None, subdirectory: str = None) -> dict:
+    """
+    Get the analyzed repository model shared by /chat and /generate-*
+    - Memoized per commit SHA (and subdirectory scope) within a bounded memory budget
+    - Single-flight: concurrent requests for the same commit share one clone-and-analyze
+    - "timings" holds this request's stage wall times (seconds), including "total"
+    The returned dict is a shallow copy; its values are shared between requests and must not be mutated.
+    """
+    started = time.perf_counter()
+    timings = {}
+    try:
+        owner, repo_name = parse_github_url(repo_url)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid repository URL: {str(e)}\n\n"
+                   "Expected format: https://github.com/owner/repository"
+        )
+
+    subdirectory = normalize_subdirectory(subdirectory)
+    clone_url = build_clone_url(repo_url, owner, repo_name, github_token)
+    commit_sha = await timed_stage(timings, "resolve_head", resolve_remote_head(clone_url))
+
+    if not commit_sha:
+        # Can't key the cache; let the clone surface the real error
+        return await clone_and_analyze_repo(repo_url, github_token, subdirectory=subdirectory)
+
+    key = (owner.lower(), repo_name.lower(), commit_sha, subdirectory)
+
+    cached = _cache_get(key)
+    if cached is not None:
+        print(f"⚡ Memory cache hit for {owner}/{repo_name}@{commit_sha[:12]}")
+        return _with_timings(cached, timings, started)
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_analyze(key, repo_url, github_token, commit_sha))
+        _inflight[key] = task
+    else:
+        print(f"⏳ Joining in-flight analysis of {owner}/{repo_name}@{commit_sha[:12]}")
+
+    # Shield so a disconnecting client doesn't cancel the work other requests await
+    repo_data = await asyncio.shield(task)
+    return _with_timings(repo_data, {**repo_data.get("timings", {}), **timings}, started)
+
+def _with_timings(repo_data: dict, timings: dict, started: float) -> dict:
+    """Per-request copy of a shared analysis carrying this request's timings"""
+    return {**repo_data, "timings": {**timings, "total": round(time.perf_counter() - started, 3)}}
+
+async def _analyze(key: tuple, repo_url: str, github_token: str, commit_sha: str) -> dict:
+    try:
+        repo_data = await clone_and_analyze_repo(repo_url, github_token, commit_sha, subdirectory=key[3])
+        _cache_put(key, repo_data)
+        return repo_data
+    finally:
+        _inflight.pop(key, None)
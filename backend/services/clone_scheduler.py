@@ -0,0 +1,181 @@
+# backend/services/clone_scheduler.py - BOUNDED CLONE/FETCH WORKER POOL
+import os
+import time
+import math
+import asyncio
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv()
+
+CLONE_MAX_CONCURRENCY = int(os.getenv("CLONE_MAX_CONCURRENCY", "4"))
+# Jobs for one git host that may run at once (defaults to the whole pool)
+CLONE_MAX_PER_HOST = int(os.getenv("CLONE_MAX_PER_HOST", str(CLONE_MAX_CONCURRENCY)))
+CLONE_MAX_QUEUE = int(os.getenv("CLONE_MAX_QUEUE", "32"))
+
+# Weight of the latest job in the moving average used for Retry-After
+_DURATION_SMOOTHING = 0.2
+
+def get_remote_host(clone_url: str) -> str:
+    """Host part of a clone URL (credentials stripped)"""
+    return (urlsplit(clone_url).hostname or "unknown").lower()
+
+class CloneScheduler:
+    """
+    Admission control for mirror clones/fetches and the analysis that follows them
+    - At most max_concurrency jobs run at once, at most max_per_host per git host
+    - Waiting jobs are queued per host and started round-robin across hosts
+    - When max_queue jobs are already waiting, new ones get a 429 with Retry-After
+    - A job whose key is already queued or running is joined instead of queued again
+    """
+
+    def __init__(self, max_concurrency: int, max_per_host: int, max_queue: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_per_host = max(1, max_per_host)
+        self.max_queue = max(0, max_queue)
+
+        self._waiting = OrderedDict()  # host -> deque of futures, in round-robin order
+        self._running = {}  # host -> running job count
+        self._active = 0
+        self._inflight = {}  # key -> task
+        self._average_duration = None
+
+        self.stats = {
+            "admitted": 0, "rejected": 0, "coalesced": 0,
+            "completed": 0, "failed": 0, "max_wait_seconds": 0.0
+        }
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiting.values())
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up"""
+        average = self._average_duration or 30.0
+        return max(1, math.ceil(average * (self.queued + 1) / self.max_concurrency))
+
+    def check_admission(self) -> None:
+        """Raise 429 if a new job would have to queue and the queue is full"""
+        if self._active >= self.max_concurrency and self.queued >= self.max_queue:
+            self.stats["rejected"] += 1
+            retry_after = self.retry_after()
+            raise HTTPException(
+                status_code=429,
+                detail=f"⏳ Too many repositories are being fetched right now "
+                       f"({self._active} running, {self.queued} queued).\n\n"
+                       f"Please retry in about {retry_after} seconds.",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+    async def run(self, key, host: str, job):
+        """
+        Run job() (a coroutine function) once a slot is free and return its result
+        Callers with the same key share one run. Raises 429 when the queue is full.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            print(f"⏳ Joining queued/running fetch ({self.queued} queued, {self._active} running)")
+        else:
+            self.check_admission()
+            self.stats["admitted"] += 1
+            task = asyncio.ensure_future(self._run(host, job))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so a disconnecting client doesn't cancel the work other requests await
+        return await asyncio.shield(task)
+
+    async def _run(self, host: str, job):
+        queued_at = time.monotonic()
+        await self._acquire(host)
+
+        started_at = time.monotonic()
+        waited = started_at - queued_at
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], round(waited, 3))
+        if waited >= 1:
+            print(f"🚦 Fetch for {host} started after {waited:.1f}s in queue")
+
+        try:
+            result = await job()
+            self.stats["completed"] += 1
+            return result
+        except BaseException:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            duration = time.monotonic() - started_at
+            if self._average_duration is None:
+                self._average_duration = duration
+            else:
+                self._average_duration += _DURATION_SMOOTHING * (duration - self._average_duration)
+            self._release(host)
+
+    async def _acquire(self, host: str) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(host, deque()).append(waiter)
+        self._dispatch()
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(host)  # Granted just before the cancellation landed
+            else:
+                self._remove_waiter(host, waiter)
+            raise
+
+    def _release(self, host: str) -> None:
+        self._active -= 1
+        self._running[host] -= 1
+        if not self._running[host]:
+            del self._running[host]
+        self._dispatch()
+
+    def _remove_waiter(self, host: str, waiter) -> None:
+        waiters = self._waiting.get(host)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiting[host]
+
+    def _dispatch(self) -> None:
+        """Start waiting jobs while there is capacity, one host at a time in rotation"""
+        while self._active < self.max_concurrency:
+            host = next(
+                (host for host in self._waiting if self._running.get(host, 0) < self.max_per_host),
+                None
+            )
+            if host is None:
+                return
+
+            waiters = self._waiting[host]
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiting.move_to_end(host)  # Other hosts go first next time
+            else:
+                del self._waiting[host]
+
+            if waiter.done():  # Cancelled while queued
+                continue
+            self._active += 1
+            self._running[host] = self._running.get(host, 0) + 1
+            waiter.set_result(None)
+
+    def metrics(self) -> dict:
+        """Queue depth and counters for /health"""
+        return {
+            "running": self._active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_per_host": self.max_per_host,
+            "max_queue": self.max_queue,
+            "running_by_host": dict(self._running),
+            "queued_by_host": {host: len(waiters) for host, waiters in self._waiting.items()},
+            "average_job_seconds": round(self._average_duration, 3) if self._average_duration else None,
+            **self.stats
+        }
+
+clone_scheduler = CloneScheduler(CLONE_MAX_CONCURRENCY, CLONE_MAX_PER_HOST, CLONE_MAX_QUEUE)
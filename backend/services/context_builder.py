@@ -0,0 +1,395 @@
+# backend/services/context_builder.py - TOKEN-BUDGETED PROMPT CONTEXT
+import os
+import re
+import math
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from .file_index import TreeView
+
+load_dotenv()
+
+try:
+    import tiktoken
+except ImportError:  # Installed with langchain-openai; fall back to an estimate without it
+    tiktoken = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "30000"))
+CONTEXT_MODEL = os.getenv("CONTEXT_TOKENIZER_MODEL", "gpt-4o")
+
+# First pass gives each file at most this much; leftover budget then extends the best files
+FILE_TOKEN_CAP = 1500
+FILE_MIN_TOKENS = 80
+OMITTED_MARKER_TOKENS = 16
+# Share of the file budget the tree may take (the rest goes to file contents)
+STRUCTURE_SHARE = 0.2
+README_SHARE = 0.1
+README_MAX_TOKENS = 2000
+
+PURPOSE_WEIGHTS = {
+    "api": 3.0,
+    "service": 3.0,
+    "data_model": 2.8,
+    "middleware": 2.5,
+    "database": 2.2,
+    "ui": 2.2,
+    "general": 2.0,
+    "dependencies": 1.8,
+    "utility": 1.6,
+    "configuration": 1.4,
+    "documentation": 0.8,
+    "testing": 0.5,
+}
+
+ENTRY_POINT_STEMS = {"main", "app", "index", "server", "application", "manage", "wsgi", "asgi", "cli", "__main__"}
+
+_WORD_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]{2,}')
+QUESTION_STOPWORDS = {
+    "the", "and", "for", "how", "what", "does", "this", "that", "with", "from", "show", "diagram",
+    "create", "generate", "make", "repo", "repository", "code", "are", "is", "can", "you", "all", "use"
+}
+
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.encoding_for_model(CONTEXT_MODEL)
+        except Exception:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """Token count for the chat model (≈ chars / 4 when tiktoken isn't available)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text that fits in max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    # No token spans more than a few chars in practice; don't encode what can't fit
+    tokens = encoding.encode(text[:max_tokens * 8], disallowed_special=())
+    if len(tokens) <= max_tokens and len(text) <= max_tokens * 8:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+# --- Ranking ---------------------------------------------------------------
+
+# (name, commit_sha, subdirectory) -> {path: referencing file count}; repo_data is immutable per commit
+_centrality_cache = OrderedDict()
+_CENTRALITY_CACHE_SIZE = 32
+
+def _stem(path: str) -> str:
+    return path.rsplit('/', 1)[-1].split('.')[0].lower()
+
+def compute_centrality(repo_data: dict) -> dict:
+    """How many other analyzed files mention each file's module name"""
+    key = (repo_data.get('name'), repo_data.get('commit_sha'), repo_data.get('subdirectory', ''))
+    if key[1] and key in _centrality_cache:
+        _centrality_cache.move_to_end(key)
+        return _centrality_cache[key]
+
+    file_contents = repo_data.get('file_contents', {})
+    words_by_file = {
+        path: {word.lower() for word in _WORD_RE.findall(entry.get('content', ''))}
+        for path, entry in file_contents.items() if isinstance(entry, dict)
+    }
+
+    centrality = {}
+    for path in file_contents:
+        stem = _stem(path)
+        if len(stem) < 3 or stem in ENTRY_POINT_STEMS:
+            centrality[path] = 0
+            continue
+        centrality[path] = sum(1 for other, words in words_by_file.items() if other != path and stem in words)
+
+    if key[1]:
+        _centrality_cache[key] = centrality
+        while len(_centrality_cache) > _CENTRALITY_CACHE_SIZE:
+            _centrality_cache.popitem(last=False)
+    return centrality
+
+def question_terms(question: str) -> set:
+    """Lowercased words from the question worth matching against files"""
+    return {word.lower() for word in _WORD_RE.findall(question or "")} - QUESTION_STOPWORDS
+
+def score_file(path: str, entry: dict, centrality: int, terms: set) -> float:
+    """Rank a file by purpose, centrality, size and relevance to the question"""
+    score = PURPOSE_WEIGHTS.get(entry.get('purpose', 'general'), 2.0)
+
+    if _stem(path) in ENTRY_POINT_STEMS:
+        score += 1.5
+    score += min(math.log2(1 + centrality), 3.0)
+
+    # Tiny files say little; huge ones are usually generated or data
+    size = entry.get('full_size', 0) or len(entry.get('content', ''))
+    if size < 200:
+        score -= 1.0
+    elif size > 100000:
+        score -= 1.0
+
+    # Prefer shallow files: deep nesting is usually implementation detail
+    score -= 0.15 * path.count('/')
+
+    if terms:
+        path_lower = path.lower()
+        path_hits = sum(1 for term in terms if term in path_lower)
+        content_lower = entry.get('content', '').lower()
+        content_hits = sum(1 for term in terms if term in content_lower)
+        score += 3.0 * path_hits + 0.5 * content_hits
+
+    return score
+
+def rank_files(repo_data: dict, question: str = "") -> list:
+    """file_contents paths, most useful first"""
+    file_contents = repo_data.get('file_contents', {})
+    centrality = compute_centrality(repo_data)
+    terms = question_terms(question)
+
+    scored = []
+    for path, entry in file_contents.items():
+        if not isinstance(entry, dict):
+            entry = {"content": str(entry)}
+        scored.append((score_file(path, entry, centrality.get(path, 0), terms), path))
+
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [path for _, path in scored]
+
+# --- Rendering -------------------------------------------------------------
+
+def _render_tree(structure: dict, max_depth: int, indent: int = 0) -> list:
+    lines = []
+    prefix = "  " * indent
+    for name, info in structure.items():
+        if not isinstance(info, dict):
+            continue
+        if info.get("type") == "dir":
+            children = info.get("contents") or {}
+            if indent + 1 >= max_depth and children:
+                lines.append(f"{prefix}📁 {name}/ ({_count_files(children)} files)")
+            else:
+                lines.append(f"{prefix}📁 {name}/")
+                lines.extend(_render_tree(children, max_depth, indent + 1))
+        else:
+            purpose = info.get("purpose", "")
+            size = info.get("size", 0)
+            ext = info.get("extension", "")
+            details = f"{purpose}, {size}B" if size >= 0 else purpose  # -1: not fetched by a partial clone
+            lines.append(f"{prefix}📄 {name} [{ext}] ({details})")
+    return lines
+
+def _count_files(structure: dict) -> int:
+    if isinstance(structure, TreeView):
+        return structure.file_count()
+    total = 0
+    for info in structure.values():
+        if isinstance(info, dict) and info.get("type") == "dir":
+            total += _count_files(info.get("contents") or {})
+        else:
+            total += 1
+    return total
+
+def _tree_depth(structure: dict) -> int:
+    if isinstance(structure, TreeView):
+        return structure.max_depth()
+    return 1 + max(
+        (_tree_depth(info.get("contents") or {})
+         for info in structure.values()
+         if isinstance(info, dict) and info.get("type") == "dir"),
+        default=0
+    )
+
+def format_structure_within(structure: dict, max_tokens: int) -> str:
+    """
+    File tree that fits in max_tokens
+    Deep folders are collapsed to "(N files)" level by level until it fits.
+    """
+    if max_tokens <= 0 or not structure:
+        return ""
+
+    for depth in range(_tree_depth(structure), 0, -1):
+        text = "\n".join(_render_tree(structure, depth))
+        if count_tokens(text) <= max_tokens:
+            return text
+
+    # Even the top level is too big: keep what fits
+    marker = "\n... (tree truncated)"
+    return truncate_to_tokens(text, max_tokens - count_tokens(marker)) + marker
+
+def _file_header(path: str, entry: dict) -> str:
+    return (
+        f"\n{'='*60}\n"
+        f"FILE: {path}\n"
+        f"Type: {entry.get('extension', '')} | Purpose: {entry.get('purpose', '')} | "
+        f"Size: {entry.get('full_size', 0)}B\n"
+        f"{'='*60}\n"
+    )
+
+def format_contents_within(repo_data: dict, max_tokens: int, question: str = "") -> str:
+    """
+    File contents that fit in max_tokens, best-ranked files first
+    Every file that makes the cut gets up to FILE_TOKEN_CAP tokens; spare budget
+    then extends the truncated ones in rank order.
+    """
+    file_contents = repo_data.get('file_contents', {})
+    remaining = max_tokens - OMITTED_MARKER_TOKENS
+    chosen = []  # [path, header, shown_content, shown_tokens, full_tokens, content]
+
+    for path in rank_files(repo_data, question):
+        entry = file_contents[path]
+        if not isinstance(entry, dict):
+            entry = {"content": str(entry)}
+
+        header = _file_header(path, entry)
+        header_tokens = count_tokens(header)
+        if remaining - header_tokens < FILE_MIN_TOKENS:
+            continue  # A later, smaller file may still fit
+
+        content = entry.get('content', '')
+        allowance = min(FILE_TOKEN_CAP, remaining - header_tokens)
+        # Only estimate files that clearly won't fit; encoding 40KB files adds up
+        full_tokens = count_tokens(content) if len(content) <= allowance * 8 else math.ceil(len(content) / 4)
+        if full_tokens > allowance:
+            allowance -= OMITTED_MARKER_TOKENS
+            shown = truncate_to_tokens(content, allowance)
+            shown_tokens = allowance
+        else:
+            shown, shown_tokens = content, full_tokens
+
+        chosen.append([path, header, shown, shown_tokens, full_tokens, content])
+        remaining -= header_tokens + shown_tokens
+
+    # Second pass: spend what's left on the highest-ranked truncated files
+    for item in chosen:
+        if remaining <= 0:
+            break
+        _, _, _, shown_tokens, full_tokens, content = item
+        if shown_tokens >= full_tokens:
+            continue
+        extra = min(full_tokens - shown_tokens, remaining)
+        item[2] = truncate_to_tokens(content, shown_tokens + extra)
+        item[3] = shown_tokens + extra
+        remaining -= extra
+
+    parts = []
+    for path, header, shown, shown_tokens, full_tokens, content in chosen:
+        parts.append(header + shown)
+        if shown != content:
+            parts.append(f"\n... (truncated, ~{full_tokens - shown_tokens} tokens omitted)")
+
+    omitted = len(file_contents) - len(chosen)
+    if omitted > 0:
+        parts.append(f"\n... ({omitted} lower-ranked files omitted)")
+
+    return "\n".join(parts)
+
+def format_chunks_within(chunks: list, max_tokens: int) -> str:
+    """
+    Retrieved (score, path, start_line, end_line, text) chunks that fit in max_tokens
+    Chunks are taken best first, then shown grouped by file in line order.
+    """
+    by_path = OrderedDict()
+    remaining = max_tokens
+
+    for _, path, start_line, end_line, text in chunks:
+        block = f"--- lines {start_line}-{end_line} ---\n{text}"
+        cost = count_tokens(block) + (0 if path in by_path else count_tokens(_file_header(path, {})))
+        if cost > remaining:
+            continue
+        by_path.setdefault(path, []).append((start_line, block))
+        remaining -= cost
+
+    parts = []
+    for path, blocks in by_path.items():
+        parts.append(f"\n{'='*60}\nFILE: {path}\n{'='*60}")
+        parts.extend(block for _, block in sorted(blocks))
+    return "\n".join(parts)
+
+def fit_file_context(repo_data: dict, token_budget: int, question: str = "", chunks: list = None) -> tuple:
+    """
+    Split a token budget between the file tree and file contents
+    With retrieved chunks, the contents are those chunks instead of ranked whole files.
+    Returns (structure_text, contents_text, tokens_used).
+    """
+    if token_budget <= 0:
+        return "", "", 0
+
+    structure_text = format_structure_within(
+        repo_data.get('file_structure', {}),
+        int(token_budget * STRUCTURE_SHARE)
+    )
+    structure_tokens = count_tokens(structure_text)
+
+    if chunks:
+        contents_text = format_chunks_within(chunks, token_budget - structure_tokens)
+    else:
+        contents_text = format_contents_within(repo_data, token_budget - structure_tokens, question)
+    return structure_text, contents_text, structure_tokens + count_tokens(contents_text)
+
+def fill_context_template(render, repo_data: dict, token_budget: int, question: str = "",
+                          reserved_tokens: int = 0, chunks: list = None) -> tuple:
+    """
+    Fill a prompt template's file tree and contents so the result fits token_budget
+    render(structure_text, contents_text) returns the full text; reserved_tokens
+    covers whatever else goes in the prompt (history, question). Returns (text, tokens).
+    """
+    file_budget = token_budget - reserved_tokens - count_tokens(render("", ""))
+
+    # Parts are counted separately, so the joined text can run a few tokens over
+    for _ in range(3):
+        structure_text, contents_text, _ = fit_file_context(repo_data, file_budget, question, chunks)
+        text = render(structure_text, contents_text)
+        tokens = count_tokens(text)
+        overshoot = tokens + reserved_tokens - token_budget
+        if overshoot <= 0 or file_budget <= 0:
+            break
+        file_budget -= overshoot
+
+    return text, tokens
+
+def build_repo_context(repo_data: dict, question: str = "", token_budget: int = None) -> tuple:
+    """
+    Prompt context for diagram generation, bounded by token_budget
+    Returns (context, tokens_used).
+    """
+    if token_budget is None:
+        token_budget = CONTEXT_TOKEN_BUDGET
+
+    languages = ', '.join(f"{k} ({v} files)" for k, v in list(repo_data.get('languages', {}).items())[:5])
+    dependencies = ', '.join(list(repo_data.get('dependencies', {}).keys())[:100])
+    readme = truncate_to_tokens(
+        repo_data.get('readme', ''),
+        min(README_MAX_TOKENS, int(token_budget * README_SHARE))
+    )
+
+    def render(structure_text: str, contents_text: str) -> str:
+        return f"""
+Repository: {repo_data.get('name', 'Unknown')}
+Description: {repo_data.get('description', 'No description')}
+Primary Language: {repo_data.get('language', 'Unknown')}
+All Languages: {languages}
+Stars: {repo_data.get('stars', 0)} | Forks: {repo_data.get('forks', 0)}
+
+COMPLETE FILE STRUCTURE:
+{structure_text}
+
+KEY FILE CONTENTS (most relevant files first):
+{contents_text}
+
+README:
+{readme}
+
+DEPENDENCIES:
+{dependencies}
+"""
+
+    return fill_context_template(render, repo_data, token_budget, question)
@@ -0,0 +1,271 @@
+# backend/services/diagram_ir.py - FLOWCHART GRAPH IR AND SIMPLIFICATION
+import os
+import re
+from collections import namedtuple, deque
+from dotenv import load_dotenv
+
+from mermaid_tools.parser import parse_mermaid, NODE_SHAPES, DIRECTIONS, Node, Link, Subgraph, End, Directive
+from mermaid_tools.repair import format_label
+
+load_dotenv()
+
+# Render budget: flowcharts above it are simplified before they reach the browser
+DIAGRAM_NODE_BUDGET = int(os.getenv("DIAGRAM_NODE_BUDGET", "60"))
+DIAGRAM_EDGE_BUDGET = int(os.getenv("DIAGRAM_EDGE_BUDGET", "120"))
+
+SHAPE_CLOSERS = {opener: closers[0] for opener, closers in NODE_SHAPES}
+COLLAPSED_SHAPE = "[["  # Subroutine box marks a collapsed subgraph
+
+GraphNode = namedtuple("GraphNode", ["id", "shape", "label", "css_class", "subgraph"])
+GraphEdge = namedtuple("GraphEdge", ["source", "target", "arrow", "label"])
+GraphSubgraph = namedtuple("GraphSubgraph", ["id", "title", "parent", "direction"])
+
+class DiagramGraph:
+    """
+    A flowchart as nodes, edges and nested subgraphs
+    A node belongs to the innermost subgraph it is first mentioned in; edges may also point
+    at a subgraph id, as Mermaid allows. classDef/class/style/click lines are kept as directives.
+    """
+
+    def __init__(self, direction: str = "TD"):
+        self.direction = direction
+        self.nodes = {}  # id -> GraphNode, in first-seen order
+        self.edges = []
+        self.subgraphs = {}  # id -> GraphSubgraph, in declaration order
+        self.directives = []  # (keyword, text)
+        self.edges_changed = False  # linkStyle indexes no longer apply
+
+    @classmethod
+    def from_diagram(cls, diagram) -> "DiagramGraph":
+        """Graph of a parsed flowchart (see mermaid_tools.parser.parse_mermaid)"""
+        words = (diagram.header or "").split()
+        graph = cls(words[1].rstrip(';') if len(words) > 1 and words[1].rstrip(';') in DIRECTIONS else "TD")
+        stack = []
+
+        for statement in diagram.statements:
+            current = stack[-1] if stack else None
+            if isinstance(statement, Subgraph):
+                graph.subgraphs[statement.id] = GraphSubgraph(statement.id, statement.title, current, None)
+                stack.append(statement.id)
+            elif isinstance(statement, End):
+                if stack:
+                    stack.pop()
+            elif isinstance(statement, Node):
+                graph._add_node(statement, current)
+            elif isinstance(statement, Link):
+                graph.edges.append(GraphEdge(statement.source, statement.target, statement.arrow, statement.label))
+            elif isinstance(statement, Directive):
+                if statement.keyword == 'direction' and current:
+                    graph.subgraphs[current] = graph.subgraphs[current]._replace(direction=statement.text)
+                else:
+                    graph.directives.append((statement.keyword, statement.text))
+
+        # Links to a subgraph id point at the subgraph, not at a node
+        for subgraph_id in graph.subgraphs:
+            graph.nodes.pop(subgraph_id, None)
+        return graph
+
+    def _add_node(self, statement: Node, subgraph: str) -> None:
+        node = self.nodes.get(statement.id)
+        if node is None:
+            self.nodes[statement.id] = GraphNode(statement.id, statement.shape, statement.label, statement.css_class, subgraph)
+            return
+        if statement.shape and not node.shape:
+            node = node._replace(shape=statement.shape, label=statement.label)
+        if statement.css_class:
+            node = node._replace(css_class=statement.css_class)
+        if node.subgraph is None and subgraph:
+            node = node._replace(subgraph=subgraph)
+        self.nodes[statement.id] = node
+
+    def child_subgraphs(self, subgraph_id: str) -> list:
+        return [sub.id for sub in self.subgraphs.values() if sub.parent == subgraph_id]
+
+    def to_mermaid(self) -> str:
+        lines = [f"flowchart {self.direction}"]
+        self._emit_scope(None, "    ", lines)
+
+        for edge in self.edges:
+            label = f"|{format_label(edge.label).replace('|', '/')}|" if edge.label else ""
+            lines.append(f"    {edge.source} {edge.arrow}{label} {edge.target}")
+
+        known = set(self.nodes) | set(self.subgraphs)
+        for keyword, text in self.directives:
+            if keyword == 'linkStyle' and self.edges_changed:
+                continue
+            if keyword in ('style', 'click') and text.split()[0] not in known:
+                continue
+            if keyword == 'class':
+                ids, _, css_class = text.rpartition(' ')
+                kept = [node_id for node_id in ids.split(',') if node_id.strip() in known]
+                if not kept:
+                    continue
+                text = f"{','.join(kept)} {css_class}"
+            lines.append(f"    {keyword} {text}")
+        return '\n'.join(lines)
+
+    def _emit_scope(self, subgraph_id: str, indent: str, lines: list) -> None:
+        for node in self.nodes.values():
+            if node.subgraph == subgraph_id:
+                lines.append(indent + format_graph_node(node))
+        for child in self.child_subgraphs(subgraph_id):
+            sub = self.subgraphs[child]
+            title = f" [{format_label(sub.title)}]" if sub.title and sub.title != sub.id else ""
+            lines.append(f"{indent}subgraph {sub.id}{title}")
+            if sub.direction:
+                lines.append(f"{indent}    direction {sub.direction}")
+            self._emit_scope(child, indent + "    ", lines)
+            lines.append(f"{indent}end")
+
+def format_graph_node(node: GraphNode) -> str:
+    text = node.id
+    if node.shape:
+        text += node.shape + format_label(node.label or "") + SHAPE_CLOSERS[node.shape]
+    if node.css_class:
+        text += ':::' + node.css_class
+    return text
+
+def merge_parallel_edges(graph: DiagramGraph) -> int:
+    """Keep one edge per (source, target); labels are combined. Returns the number of edges removed"""
+    merged = {}
+    for edge in graph.edges:
+        key = (edge.source, edge.target)
+        if key not in merged:
+            merged[key] = (edge, [])
+        if edge.label and edge.label not in merged[key][1]:
+            merged[key][1].append(edge.label)
+
+    edges = []
+    for edge, labels in merged.values():
+        if len(labels) > 2:
+            label = f"{labels[0]} +{len(labels) - 1} more"
+        else:
+            label = ", ".join(labels) or None
+        edges.append(edge._replace(label=label))
+
+    removed = len(graph.edges) - len(edges)
+    if removed:
+        graph.edges = edges
+        graph.edges_changed = True
+    return removed
+
+def transitive_reduce(graph: DiagramGraph) -> int:
+    """
+    Drop unlabeled arrows A --> C when A still reaches C through other arrows (A --> B --> C)
+    Only one-way arrows count as paths. Edges are checked one at a time against the current
+    graph, so reachability is preserved even with cycles. Returns the number of edges removed.
+    """
+    directed = lambda edge: edge.arrow.endswith('>') and not edge.arrow.startswith('<') and edge.source != edge.target
+    successors = {}
+    for edge in graph.edges:
+        if directed(edge):
+            successors.setdefault(edge.source, []).append(edge.target)
+
+    kept = []
+    removed = 0
+    for edge in graph.edges:
+        if not edge.label and directed(edge) and _reachable_without(successors, edge.source, edge.target):
+            successors[edge.source].remove(edge.target)
+            removed += 1
+            continue
+        kept.append(edge)
+
+    if removed:
+        graph.edges = kept
+        graph.edges_changed = True
+    return removed
+
+def _reachable_without(successors: dict, source: str, target: str) -> bool:
+    """Whether target is reachable from source without the direct source -> target edge"""
+    seen = {source}
+    queue = deque(node for node in successors.get(source, []) if node != target)
+    seen.update(queue)
+    while queue:
+        node = queue.popleft()
+        for nxt in successors.get(node, []):
+            if nxt == target:
+                return True
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append(nxt)
+    return False
+
+def collapse_subgraph(graph: DiagramGraph, subgraph_id: str) -> str:
+    """Replace a subgraph without child subgraphs by one node; returns the new node id"""
+    sub = graph.subgraphs.pop(subgraph_id)
+    members = {node_id for node_id, node in graph.nodes.items() if node.subgraph == subgraph_id}
+
+    node_id = subgraph_id if re.fullmatch(r'[A-Za-z_][\w-]*', subgraph_id) else re.sub(r'\W+', '_', subgraph_id).strip('_') or 'group'
+    base, suffix = node_id, 2
+    while node_id in graph.nodes or (node_id in graph.subgraphs and node_id != subgraph_id):
+        node_id, suffix = f"{base}_{suffix}", suffix + 1
+
+    for member in members:
+        del graph.nodes[member]
+    title = (sub.title or sub.id).strip('"')
+    graph.nodes[node_id] = GraphNode(node_id, COLLAPSED_SHAPE, f"{title} ({len(members)} nodes)", None, sub.parent)
+
+    inside = members | {subgraph_id}
+    edges = []
+    for edge in graph.edges:
+        source = node_id if edge.source in inside else edge.source
+        target = node_id if edge.target in inside else edge.target
+        if source == target and (edge.source != edge.target or edge.source in inside):
+            continue  # Edge within the collapsed subgraph
+        edges.append(edge._replace(source=source, target=target))
+    graph.edges = edges
+    graph.edges_changed = True
+    return node_id
+
+def collapse_to_budget(graph: DiagramGraph, node_budget: int) -> list:
+    """
+    Collapse innermost subgraphs until the node count fits the budget
+    Each step collapses the smallest subgraph that reaches the budget on its own, or the
+    largest one if none does, so no more detail is lost than needed. Returns collapsed ids.
+    """
+    collapsed = []
+    while len(graph.nodes) > node_budget:
+        excess = len(graph.nodes) - node_budget
+        sizes = {}
+        for node in graph.nodes.values():
+            if node.subgraph is not None:
+                sizes[node.subgraph] = sizes.get(node.subgraph, 0) + 1
+        candidates = [
+            (size, subgraph_id) for subgraph_id, size in sizes.items()
+            if size > 1 and not graph.child_subgraphs(subgraph_id)
+        ]
+        if not candidates:
+            break
+        enough = [candidate for candidate in candidates if candidate[0] - 1 >= excess]
+        _, subgraph_id = min(enough) if enough else max(candidates)
+        collapse_subgraph(graph, subgraph_id)
+        collapsed.append(subgraph_id)
+
+    merge_parallel_edges(graph)
+    return collapsed
+
+def simplify_graph(graph: DiagramGraph, node_budget: int, edge_budget: int) -> dict:
+    """Fit a graph to the render budget; returns what changed"""
+    stats = {"nodes_before": len(graph.nodes), "edges_before": len(graph.edges)}
+    stats["merged_edges"] = merge_parallel_edges(graph)
+    stats["collapsed_subgraphs"] = collapse_to_budget(graph, node_budget) if len(graph.nodes) > node_budget else []
+    stats["reduced_edges"] = transitive_reduce(graph) if len(graph.edges) > edge_budget else 0
+    stats["nodes_after"] = len(graph.nodes)
+    stats["edges_after"] = len(graph.edges)
+    return stats
+
+def simplify_mermaid(mermaid_code: str, node_budget: int = DIAGRAM_NODE_BUDGET, edge_budget: int = DIAGRAM_EDGE_BUDGET) -> tuple:
+    """
+    (code, stats) with flowcharts over the node/edge budget simplified; stats is None when the
+    diagram is returned unchanged (within budget, not a flowchart, or not parseable)
+    """
+    diagram = parse_mermaid(mermaid_code)
+    if diagram.kind != 'flowchart' or diagram.errors:
+        return mermaid_code, None
+
+    graph = DiagramGraph.from_diagram(diagram)
+    if len(graph.nodes) <= node_budget and len(graph.edges) <= edge_budget:
+        return mermaid_code, None
+
+    stats = simplify_graph(graph, node_budget, edge_budget)
+    return graph.to_mermaid(), stats
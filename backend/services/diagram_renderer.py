@@ -0,0 +1,244 @@
+# backend/services/diagram_renderer.py - PLUGGABLE MERMAID RENDERING
+import os
+import json
+import zlib
+import base64
+import shlex
+import shutil
+import asyncio
+import itertools
+import httpx
+from dotenv import load_dotenv
+load_dotenv()
+
+# auto: local worker pool, falling back to mermaid.ink | local | remote | stub (offline, for tests)
+DIAGRAM_RENDERER = os.getenv("DIAGRAM_RENDERER", "auto").lower()
+MERMAID_RENDERER_CMD = os.getenv(
+    "MERMAID_RENDERER_CMD",
+    "node " + os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "renderer", "mermaid_worker.mjs")
+)
+MERMAID_RENDERER_WORKERS = int(os.getenv("MERMAID_RENDERER_WORKERS", "2"))
+MERMAID_RENDER_TIMEOUT = float(os.getenv("MERMAID_RENDER_TIMEOUT", "30"))
+MERMAID_INK_URL = os.getenv("MERMAID_INK_URL", "https://mermaid.ink")
+MERMAID_INK_MAX_CONNECTIONS = int(os.getenv("MERMAID_INK_MAX_CONNECTIONS", "10"))
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+class RendererError(Exception):
+    """Raised when a renderer backend cannot produce an image"""
+
+class RemoteRenderer:
+    """Render through mermaid.ink over one keep-alive connection pool (one round trip per export)"""
+    name = "remote"
+
+    def __init__(self, base_url: str = MERMAID_INK_URL, max_connections: int = MERMAID_INK_MAX_CONNECTIONS):
+        self.base_url = base_url.rstrip('/')
+        self.max_connections = max_connections
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=MERMAID_RENDER_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    async def render(self, mermaid_code: str, format_type: str, theme: str) -> bytes:
+        # pako-compressed state keeps large diagrams under URL length limits
+        state = json.dumps({"code": mermaid_code, "mermaid": {"theme": theme}})
+        encoded = base64.urlsafe_b64encode(zlib.compress(state.encode('utf-8'), 9)).decode('ascii')
+
+        if format_type == "svg":
+            path = f"/svg/pako:{encoded}"
+        else:
+            path = f"/img/pako:{encoded}?type=png"
+
+        print(f"📥 Fetching {format_type.upper()} from mermaid.ink...")
+        response = await self._get_client().get(path)
+
+        if response.status_code != 200:
+            raise RendererError(f"mermaid.ink returned {response.status_code}")
+        return response.content
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class StubRenderer:
+    """Offline renderer that returns a deterministic placeholder image"""
+    name = "stub"
+
+    # Smallest valid PNG (1x1 transparent pixel)
+    PNG_PIXEL = base64.b64decode(
+        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+    )
+
+    async def render(self, mermaid_code: str, format_type: str, theme: str) -> bytes:
+        if format_type == "svg":
+            first_line = mermaid_code.strip().split('\n')[0][:80]
+            escaped = first_line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            return (
+                '<svg xmlns="http://www.w3.org/2000/svg" width="320" height="40">'
+                f'<text x="10" y="25">{escaped}</text></svg>'
+            ).encode('utf-8')
+        return self.PNG_PIXEL
+
+    async def close(self) -> None:
+        pass
+
+class LocalRendererPool:
+    """
+    Pool of long-lived headless renderer processes fed JSON lines over stdin
+    Protocol: the worker prints {"ready": true} once, then answers each
+    {"id", "code", "format", "theme"} request with {"id", "ok", "data" (base64) | "error"}.
+    """
+    name = "local"
+
+    def __init__(self, command: str, size: int):
+        self.command = shlex.split(command, posix=os.name != 'nt')
+        self.size = max(1, size)
+        self._idle = asyncio.Queue()
+        self._workers = []
+        self._started = False
+        self._broken = False
+        self._start_lock = asyncio.Lock()
+        self._ids = itertools.count()
+
+    def is_available(self) -> bool:
+        return not self._broken and bool(self.command) and shutil.which(self.command[0]) is not None
+
+    async def _spawn(self):
+        process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=64 * 1024 * 1024  # Rendered images come back as one base64 line
+        )
+        try:
+            ready = await asyncio.wait_for(process.stdout.readline(), MERMAID_RENDER_TIMEOUT)
+            if not json.loads(ready or b"{}").get("ready"):
+                raise RendererError("renderer worker did not start")
+        except Exception:
+            await self._stop(process)
+            raise
+        return process
+
+    @staticmethod
+    async def _stop(process) -> None:
+        """Kill a worker and reap it, closing its pipes while the event loop is still running"""
+        process.stdin.close()
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+
+    async def _ensure_started(self) -> None:
+        async with self._start_lock:
+            if self._started:
+                return
+            try:
+                for _ in range(self.size):
+                    worker = await self._spawn()
+                    self._workers.append(worker)
+                    self._idle.put_nowait(worker)
+            except Exception:
+                # e.g. mermaid-cli not installed: stop trying on every request
+                self._broken = True
+                await self.close()
+                raise
+            self._started = True
+            print(f"🖼️ Started {self.size} local Mermaid renderer workers")
+
+    async def render(self, mermaid_code: str, format_type: str, theme: str) -> bytes:
+        await self._ensure_started()
+        worker = await self._idle.get()
+        healthy = False
+
+        try:
+            if worker.returncode is not None:
+                worker = await self._respawn(worker)
+
+            request_id = next(self._ids)
+            request = {"id": request_id, "code": mermaid_code, "format": format_type, "theme": theme}
+            worker.stdin.write((json.dumps(request) + "\n").encode('utf-8'))
+            await worker.stdin.drain()
+
+            line = await asyncio.wait_for(worker.stdout.readline(), MERMAID_RENDER_TIMEOUT)
+            if not line:
+                raise RendererError("renderer worker exited")
+
+            reply = json.loads(line)
+            if reply.get("id") != request_id:
+                raise RendererError("renderer worker answered out of order")
+
+            # A bad diagram doesn't poison the worker
+            healthy = True
+            if not reply.get("ok"):
+                raise RendererError(reply.get("error", "render failed"))
+
+            return base64.b64decode(reply["data"])
+
+        finally:
+            if not healthy:
+                # Timed out, desynchronized or exited: stop it, the next request respawns it
+                await self._stop(worker)
+            self._idle.put_nowait(worker)
+
+    async def _respawn(self, worker):
+        await self._stop(worker)
+        replacement = await self._spawn()
+        self._workers = [replacement if w is worker else w for w in self._workers]
+        return replacement
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            await self._stop(worker)
+        self._workers = []
+        self._started = False
+        self._idle = asyncio.Queue()
+
+_renderers = {}
+
+def get_renderer(name: str):
+    """Get (and lazily create) a renderer backend by name"""
+    if name not in _renderers:
+        if name == "local":
+            _renderers[name] = LocalRendererPool(MERMAID_RENDERER_CMD, MERMAID_RENDERER_WORKERS)
+        elif name == "stub":
+            _renderers[name] = StubRenderer()
+        else:
+            _renderers[name] = RemoteRenderer()
+    return _renderers[name]
+
+async def render_diagram(mermaid_code: str, format_type: str = "png", theme: str = "default") -> tuple:
+    """
+    Render Mermaid code to PNG/SVG bytes with the configured backend
+    Returns (content, media_type); in auto mode local failures fall back to mermaid.ink.
+    """
+    format_type = "svg" if format_type == "svg" else "png"
+    media_type = MEDIA_TYPES[format_type]
+
+    if DIAGRAM_RENDERER in ("remote", "stub", "local"):
+        content = await get_renderer(DIAGRAM_RENDERER).render(mermaid_code, format_type, theme)
+        return content, media_type
+
+    local = get_renderer("local")
+    if local.is_available():
+        try:
+            return await local.render(mermaid_code, format_type, theme), media_type
+        except Exception as e:
+            print(f"⚠️ Local renderer failed, falling back to mermaid.ink: {e}")
+
+    content = await get_renderer("remote").render(mermaid_code, format_type, theme)
+    return content, media_type
+
+async def close_renderers() -> None:
+    """Stop renderer worker processes and close the mermaid.ink pool"""
+    for renderer in _renderers.values():
+        await renderer.close()
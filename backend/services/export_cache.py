@@ -0,0 +1,40 @@
+# backend/services/export_cache.py - CONTENT-ADDRESSED RENDERED DIAGRAM CACHE
+import os
+import hashlib
+from dotenv import load_dotenv
+
+from .tiered_cache import TieredCache
+
+load_dotenv()
+
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(os.getcwd(), "repo_cache", "exports"))
+EXPORT_CACHE_MEMORY_BYTES = int(os.getenv("EXPORT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))  # 64MB
+EXPORT_CACHE_DISK_BYTES = int(os.getenv("EXPORT_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))  # 512MB
+
+# Rendered output only depends on the key, so entries never expire
+export_cache = TieredCache(
+    "export",
+    EXPORT_CACHE_DIR,
+    memory_max_bytes=EXPORT_CACHE_MEMORY_BYTES,
+    disk_max_bytes=EXPORT_CACHE_DISK_BYTES
+)
+
+def normalize_mermaid_code(mermaid_code: str) -> str:
+    """
+    Drop differences that don't change the rendered diagram (blank lines, trailing space, line endings)
+    Leading indentation is kept: mindmaps use it for hierarchy.
+    """
+    lines = mermaid_code.strip().replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines if line.strip())
+
+def get_export_key(mermaid_code: str, format_type: str, theme: str) -> str:
+    """sha256 over (normalized code, format, theme); also used as the ETag"""
+    payload = f"{format_type}\0{theme}\0{normalize_mermaid_code(mermaid_code)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,165 @@
+# backend/services/file_classifier.py - COMPILED FILE PURPOSE RULES
+import os
+import re
+import json
+from functools import lru_cache
+from dotenv import load_dotenv
+load_dotenv()
+
+# JSON file with extra rules, e.g.
+# {"mode": "prepend", "rules": [{"purpose": "api", "contains": ["rpc"], "scope": "path"}]}
+FILE_CLASSIFIER_RULES = os.getenv("FILE_CLASSIFIER_RULES", "")
+
+# Checked in order; the first matching rule wins. Substrings match the lowercased file name.
+DEFAULT_RULES = [
+    {"purpose": "testing", "contains": ["test", "spec", ".test.", "_test", "test_"]},
+    {"purpose": "configuration", "contains": ["config", "setup", ".env", "settings", "conf"]},
+    {"purpose": "data_model", "contains": ["model", "schema", "entity", "dto"]},
+    {"purpose": "api", "contains": ["route", "endpoint", "api", "controller", "handler"]},
+    {"purpose": "ui", "contains": ["component", "view", "page", "screen", "template"]},
+    {"purpose": "utility", "contains": ["util", "helper", "tool", "common"]},
+    {"purpose": "service", "contains": ["service", "provider", "manager", "factory"]},
+    {"purpose": "middleware", "contains": ["middleware", "interceptor", "filter"]},
+    {"purpose": "database", "contains": ["migration", "seed", "database", "db", ".sql"]},
+    {"purpose": "dependencies", "names": ["package.json", "requirements.txt", "Cargo.toml", "go.mod", "pom.xml", "build.gradle"]},
+    {"purpose": "documentation", "contains": ["readme", "doc", "docs", ".md"]},
+]
+
+DEFAULT_PURPOSE = "general"
+
+class FileClassifier:
+    """
+    Classify files by purpose with the rule keywords compiled into one trie regex per scope
+    One findall pass finds the keyword hits (or proves there are none, the
+    common case). Hits can't overlap, so rules earlier than the best hit are
+    then confirmed with plain substring checks; the result is exactly what
+    trying the rules one after another gives.
+
+    Rule keys: "purpose", plus any of "contains" (substrings), "regex" (lowercase
+    patterns without named groups) and "names" (exact file names, case-sensitive).
+    "scope" is "name" (default) or "path" (the lowercased repo-relative path).
+    """
+
+    def __init__(self, rules: list):
+        self.rules = rules
+        self.purposes = [rule["purpose"] for rule in rules]
+        self.exact_names = {}
+        for index, rule in enumerate(rules):
+            for name in rule.get("names", []):
+                self.exact_names.setdefault(name, index)
+
+        self.name_matcher = self._compile(rules, "name")
+        self.path_matcher = self._compile(rules, "path")
+
+        # Most repos repeat a few names (index.js, __init__.py) many times
+        self._classify_name = lru_cache(maxsize=65536)(self._rule_for_name)
+
+    def _compile(self, rules: list, scope: str):
+        """(keyword pattern, keyword -> rule index, [(rule index, substrings, regex)]) for one scope"""
+        keyword_rule = {}
+        checks = []
+        for index, rule in enumerate(rules):
+            if rule.get("scope", "name") != scope:
+                continue
+            substrings = [s.lower() for s in rule.get("contains", []) if s]
+            patterns = rule.get("regex", [])
+            for keyword in substrings:
+                keyword_rule.setdefault(keyword, index)
+            if substrings or patterns:
+                checks.append((index, substrings, re.compile('|'.join(patterns)) if patterns else None))
+        if not checks:
+            return None
+        pattern = re.compile(_trie_pattern(keyword_rule)) if keyword_rule else None
+        return pattern, keyword_rule, checks
+
+    @staticmethod
+    def _first_rule(matcher, text: str) -> int:
+        pattern, keyword_rule, checks = matcher
+        hits = pattern.findall(text) if pattern is not None else []
+        best = min(keyword_rule[hit] for hit in hits) if hits else None
+
+        # findall can't overlap matches, so confirm no earlier rule hides under a hit
+        for index, substrings, regex in checks:
+            if best is not None and index >= best:
+                break
+            if (hits and any(s in text for s in substrings)) or (regex is not None and regex.search(text)):
+                return index
+        return best
+
+    def _rule_for_name(self, filename: str) -> int:
+        best = self.exact_names.get(filename)
+        if self.name_matcher is not None:
+            found = self._first_rule(self.name_matcher, filename.lower())
+            if found is not None and (best is None or found < best):
+                best = found
+        return best
+
+    def classify(self, filename: str, filepath: str = "") -> str:
+        """Purpose label of one file"""
+        best = self._classify_name(filename)
+        if self.path_matcher is not None and filepath:
+            found = self._first_rule(self.path_matcher, filepath.lower())
+            if found is not None and (best is None or found < best):
+                best = found
+        return DEFAULT_PURPOSE if best is None else self.purposes[best]
+
+    def classify_batch(self, files) -> list:
+        """Purpose labels for (filename, filepath) pairs, in order"""
+        classify = self.classify
+        return [classify(filename, filepath) for filename, filepath in files]
+
+def _trie_pattern(keywords) -> str:
+    """
+    Regex matching any of the keywords, factored into a character trie
+    (e.g. "co(?:mmon|nf(?:ig)?)") so the engine tests one branch per character
+    instead of every keyword at every position. Longest keyword wins at a position.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+def load_rules(config_path: str = FILE_CLASSIFIER_RULES) -> list:
+    """Default rules combined with the optional JSON rule file"""
+    if not config_path:
+        return DEFAULT_RULES
+
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        custom = config.get("rules", [])
+        for rule in custom:
+            if not rule.get("purpose"):
+                raise ValueError(f"rule without a purpose: {rule}")
+            for pattern in rule.get("regex", []):
+                re.compile(pattern)
+    except Exception as e:
+        print(f"⚠️ Ignoring file classifier rules from {config_path}: {e}")
+        return DEFAULT_RULES
+
+    mode = config.get("mode", "prepend")
+    if mode == "replace":
+        return custom
+    if mode == "append":
+        return DEFAULT_RULES + custom
+    return custom + DEFAULT_RULES
+
+_classifier = None
+
+def get_classifier() -> FileClassifier:
+    """Process-wide classifier, compiled on first use"""
+    global _classifier
+    if _classifier is None:
+        _classifier = FileClassifier(load_rules())
+    return _classifier
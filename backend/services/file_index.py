@@ -0,0 +1,300 @@
+# backend/services/file_index.py - COLUMNAR FILE TREE
+from array import array
+from collections.abc import Mapping
+
+# Purpose code marking a directory node
+DIR_CODE = 255
+
+# Marker key of the serialized form; can't collide with a file name
+FORMAT_KEY = "/format"
+FORMAT_VERSION = "file_index/v1"
+
+class FileIndex:
+    """
+    Repository file tree stored as parallel arrays instead of nested dicts
+    Nodes are kept in depth-first pre-order, so a directory's subtree is the
+    contiguous node range [node + 1, subtree_end[node]). Names and purposes are
+    interned: each node only stores small integer codes.
+    """
+
+    def __init__(self):
+        self.segments = []        # interned path segments
+        self.purposes = []        # interned purpose labels
+        self.segment = array('I')  # node -> segment id
+        self.parent = array('i')   # node -> parent node (-1 at the root)
+        self.size = array('q')     # node -> file size (0 for directories, -1 if unknown)
+        self.purpose = array('B')  # node -> purpose id, DIR_CODE for directories
+        self.subtree_end = array('I')
+        self._segment_ids = {}
+        self._purpose_ids = {}
+
+    # --- Building ----------------------------------------------------------
+
+    @classmethod
+    def from_files(cls, files) -> "FileIndex":
+        """Build from (rel_path, size, purpose) tuples; directories come from the paths"""
+        root = {}
+        for rel_path, size, purpose in files:
+            parts = rel_path.split('/')
+            level = root
+            for part in parts[:-1]:
+                child = level.get(part)
+                if not isinstance(child, dict):
+                    child = level[part] = {}
+                level = child
+            level[parts[-1]] = (size, purpose)
+
+        index = cls()
+        index._append_children(root, -1)
+        # Lookup tables are only needed while interning
+        index._segment_ids = index._purpose_ids = None
+        return index
+
+    @classmethod
+    def from_tree(cls, structure: Mapping) -> "FileIndex":
+        """Build from the legacy nested-dict file tree"""
+        if isinstance(structure, TreeView):
+            return structure.index
+
+        files = []
+        stack = [iter(structure.values())]
+        while stack:
+            info = next(stack[-1], None)
+            if info is None:
+                stack.pop()
+            elif isinstance(info, Mapping) and info.get("type") == "dir":
+                stack.append(iter((info.get("contents") or {}).values()))
+            elif isinstance(info, Mapping) and info.get("path"):
+                files.append((info["path"], info.get("size", 0), info.get("purpose", "general")))
+        return cls.from_files(files)
+
+    def _intern(self, table: list, ids: dict, value: str) -> int:
+        code = ids.get(value)
+        if code is None:
+            code = ids[value] = len(table)
+            table.append(value)
+        return code
+
+    def _append_node(self, name: str, parent: int, size: int, purpose_code: int) -> int:
+        node = len(self.segment)
+        self.segment.append(self._intern(self.segments, self._segment_ids, name))
+        self.parent.append(parent)
+        self.size.append(size)
+        self.purpose.append(purpose_code)
+        self.subtree_end.append(node + 1)
+        return node
+
+    def _append_children(self, level: dict, parent: int) -> None:
+        # Explicit stack: monorepos can nest deeper than the recursion limit likes
+        stack = [(iter(level.items()), parent)]
+        while stack:
+            entry = next(stack[-1][0], None)
+            if entry is None:
+                _, finished = stack.pop()
+                if finished >= 0:
+                    self.subtree_end[finished] = len(self.segment)
+                continue
+
+            name, value = entry
+            parent = stack[-1][1]
+            if isinstance(value, dict):
+                if value:  # Empty directories aren't part of the tree
+                    node = self._append_node(name, parent, 0, DIR_CODE)
+                    stack.append((iter(value.items()), node))
+            else:
+                size, purpose = value
+                purpose_code = self._intern(self.purposes, self._purpose_ids, purpose)
+                self._append_node(name, parent, size, purpose_code)
+
+    # --- Queries -----------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.segment)
+
+    def name(self, node: int) -> str:
+        return self.segments[self.segment[node]]
+
+    def is_dir(self, node: int) -> bool:
+        return self.purpose[node] == DIR_CODE
+
+    def path(self, node: int) -> str:
+        parts = []
+        while node >= 0:
+            parts.append(self.segments[self.segment[node]])
+            node = self.parent[node]
+        return '/'.join(reversed(parts))
+
+    def children(self, node: int = -1):
+        """Direct children of a directory node (-1 for the root), in order"""
+        child = node + 1
+        end = self.subtree_end[node] if node >= 0 else len(self.segment)
+        while child < end:
+            yield child
+            child = self.subtree_end[child]
+
+    def find(self, rel_path: str) -> int:
+        """Node of a path, or -1 if absent ("" is the root)"""
+        node = -1
+        rel_path = rel_path.strip('/')
+        if not rel_path:
+            return node
+
+        for part in rel_path.split('/'):
+            for child in self.children(node):
+                if self.segments[self.segment[child]] == part:
+                    node = child
+                    break
+            else:
+                return -1
+        return node
+
+    def iter_nodes(self, prefix: str = ""):
+        """(node, path, depth) for every node under a directory prefix, in tree order"""
+        top = self.find(prefix)
+        if prefix.strip('/') and top < 0:
+            return iter(())
+        if top >= 0 and not self.is_dir(top):
+            path = self.path(top)
+            return iter([(top, path, path.count('/'))])
+        return self._iter_subtree(top)
+
+    def _iter_subtree(self, top: int):
+        # The subtree is a contiguous slice, so this never looks outside it
+        start = top + 1
+        end = self.subtree_end[top] if top >= 0 else len(self.segment)
+        base = self.path(top) + '/' if top >= 0 else ""
+        base_depth = base.count('/')
+
+        # Directory paths on the current branch, popped as their subtrees end
+        stack = []
+        for node in range(start, end):
+            while stack and node >= stack[-1][0]:
+                stack.pop()
+            path = (stack[-1][1] if stack else base) + self.segments[self.segment[node]]
+            yield node, path, base_depth + len(stack)
+            if self.purpose[node] == DIR_CODE:
+                stack.append((self.subtree_end[node], path + '/'))
+
+    def iter_files(self, prefix: str = ""):
+        """(path, size, purpose) of every file under a directory prefix"""
+        for node, path, _ in self.iter_nodes(prefix):
+            if self.purpose[node] != DIR_CODE:
+                yield path, self.size[node], self.purposes[self.purpose[node]]
+
+    def iter_dirs(self, prefix: str = ""):
+        """Paths of every directory under a directory prefix"""
+        for node, path, _ in self.iter_nodes(prefix):
+            if self.purpose[node] == DIR_CODE:
+                yield path
+
+    def file_count(self, node: int = -1) -> int:
+        """Files anywhere under a directory node"""
+        end = self.subtree_end[node] if node >= 0 else len(self.segment)
+        return sum(1 for n in range(node + 1, end) if self.purpose[n] != DIR_CODE)
+
+    def max_depth(self, node: int = -1) -> int:
+        """Levels in a directory node's subtree (1 = only files directly in it)"""
+        base = self.path(node).count('/') + 1 if node >= 0 else 0
+        return 1 + max((depth - base for _, _, depth in self._iter_subtree(node)), default=-1)
+
+    def view(self) -> "TreeView":
+        """Dict-compatible view of the whole tree"""
+        return TreeView(self, -1)
+
+    # --- Serialization -----------------------------------------------------
+
+    def to_json(self) -> dict:
+        return {
+            FORMAT_KEY: FORMAT_VERSION,
+            "segments": self.segments,
+            "purposes": self.purposes,
+            "segment": self.segment.tolist(),
+            "parent": self.parent.tolist(),
+            "size": self.size.tolist(),
+            "purpose": self.purpose.tolist(),
+            "subtree_end": self.subtree_end.tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "FileIndex":
+        index = cls()
+        index.segments = list(data["segments"])
+        index.purposes = list(data["purposes"])
+        index.segment = array('I', data["segment"])
+        index.parent = array('i', data["parent"])
+        index.size = array('q', data["size"])
+        index.purpose = array('B', data["purpose"])
+        index.subtree_end = array('I', data["subtree_end"])
+        return index
+
+class TreeView(Mapping):
+    """
+    Read-only view of a FileIndex directory shaped like the old nested dict:
+    name -> {"type": "dir", "path", "contents"} or
+    name -> {"type": "file", "path", "size", "extension", "purpose"}.
+    Entries are built on access; nothing is stored per file.
+    """
+
+    def __init__(self, index: FileIndex, node: int):
+        self.index = index
+        self.node = node
+
+    def _entry(self, node: int) -> dict:
+        index = self.index
+        name = index.name(node)
+        if index.is_dir(node):
+            return {"type": "dir", "path": index.path(node), "contents": TreeView(index, node)}
+        return {
+            "type": "file",
+            "path": index.path(node),
+            "size": index.size[node],
+            "extension": name.split(".")[-1] if "." in name else "none",
+            "purpose": index.purposes[index.purpose[node]]
+        }
+
+    def __getitem__(self, name: str) -> dict:
+        for child in self.index.children(self.node):
+            if self.index.name(child) == name:
+                return self._entry(child)
+        raise KeyError(name)
+
+    def __iter__(self):
+        return (self.index.name(child) for child in self.index.children(self.node))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.index.children(self.node))
+
+    def items(self):
+        # Avoids the per-key child lookup Mapping.items() would do
+        return [(self.index.name(child), self._entry(child)) for child in self.index.children(self.node)]
+
+    def values(self):
+        return [entry for _, entry in self.items()]
+
+    def file_count(self) -> int:
+        return self.index.file_count(self.node)
+
+    def max_depth(self) -> int:
+        return self.index.max_depth(self.node)
+
+    def to_json(self) -> dict:
+        if self.node >= 0:
+            return dict(self.items())  # Nested views serialize through the same hook
+        return self.index.to_json()
+
+    def __repr__(self) -> str:
+        return f"TreeView({self.index.path(self.node) if self.node >= 0 else '/'}, {len(self)} entries)"
+
+def get_file_index(file_structure) -> FileIndex:
+    """FileIndex behind any stored form of file_structure (view, serialized or legacy dict)"""
+    if isinstance(file_structure, TreeView):
+        return file_structure.index
+    if isinstance(file_structure, Mapping) and file_structure.get(FORMAT_KEY) == FORMAT_VERSION:
+        return FileIndex.from_json(file_structure)
+    return FileIndex.from_tree(file_structure or {})
+
+def to_jsonable(obj):
+    """json.dump default= hook for FileIndex-backed trees"""
+    if isinstance(obj, (FileIndex, TreeView)):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
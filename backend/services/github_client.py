@@ -0,0 +1,187 @@
+# backend/services/github_client.py - POOLED GITHUB API CLIENT
+import os
+import time
+import hashlib
+from collections import OrderedDict
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GITHUB_API_TIMEOUT = float(os.getenv("GITHUB_API_TIMEOUT", "10"))
+GITHUB_API_MAX_CONNECTIONS = int(os.getenv("GITHUB_API_MAX_CONNECTIONS", "20"))
+GITHUB_ETAG_CACHE_SIZE = int(os.getenv("GITHUB_ETAG_CACHE_SIZE", "1024"))
+
+# Backoff after a rate-limit response that doesn't say when to come back
+RATE_LIMIT_BACKOFF_SECONDS = 60
+RATE_LIMIT_MAX_BACKOFF_SECONDS = 900
+
+def _token_key(token: str) -> str:
+    """Rate limits and cached responses are per token; never keep the token itself"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:16] if token else "anonymous"
+
+class GitHubClient:
+    """
+    GitHub REST client sharing one keep-alive connection pool across requests
+    - GETs are conditional: the last ETag per (path, token) is sent as If-None-Match and
+      a 304 (which doesn't count against the rate limit) reuses the cached body
+    - X-RateLimit-* / Retry-After headers are tracked per token; while a token is
+      limited, calls are skipped (cached body or None) instead of being sent
+    """
+
+    def __init__(self, base_url: str, timeout: float, max_connections: int, cache_size: int):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache_size = cache_size
+
+        self._client = None
+        self._responses = OrderedDict()  # (path, token key) -> (etag, body), least recently used first
+        self._limits = {}  # token key -> {"remaining", "reset", "blocked_until", "strikes"}
+        self.stats = {"requests": 0, "not_modified": 0, "skipped_rate_limited": 0, "rate_limited": 0, "errors": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                headers={"Accept": "application/vnd.github.v3+json", "User-Agent": "RepoVision-AI"}
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _blocked_for(self, token_key: str) -> float:
+        """Seconds this token must still wait before calling the API (0 = go ahead)"""
+        limit = self._limits.get(token_key)
+        if not limit:
+            return 0.0
+        return max(0.0, limit.get("blocked_until", 0.0) - time.time())
+
+    def _track_rate_limit(self, token_key: str, response: httpx.Response) -> None:
+        headers = response.headers
+        limit = self._limits.setdefault(token_key, {"strikes": 0})
+        now = time.time()
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is not None and remaining.isdigit():
+            limit["remaining"] = int(remaining)
+        if reset is not None and reset.isdigit():
+            limit["reset"] = int(reset)
+
+        limited = response.status_code == 429 or (response.status_code == 403 and (
+            limit.get("remaining") == 0 or "Retry-After" in headers or "rate limit" in response.text.lower()
+        ))
+
+        if limited:
+            self.stats["rate_limited"] += 1
+            retry_after = headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                blocked_until = now + int(retry_after)
+            elif limit.get("remaining") == 0 and limit.get("reset", 0) > now:
+                blocked_until = limit["reset"]
+            else:
+                # Secondary limits may come without a hint: back off exponentially
+                blocked_until = now + min(RATE_LIMIT_BACKOFF_SECONDS * 2 ** limit["strikes"], RATE_LIMIT_MAX_BACKOFF_SECONDS)
+            limit["strikes"] += 1
+            limit["blocked_until"] = blocked_until
+            print(f"⚠️ GitHub API rate limited; pausing metadata calls for {int(blocked_until - now)}s")
+        elif limit.get("remaining") == 0 and limit.get("reset", 0) > now:
+            # Last call of the window: don't send more until it resets
+            limit["blocked_until"] = limit["reset"]
+        elif response.status_code < 400:
+            limit["strikes"] = 0
+
+    def _remember(self, key: tuple, etag: str, body) -> None:
+        self._responses[key] = (etag, body)
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.cache_size:
+            self._responses.popitem(last=False)
+
+    async def get_json(self, path: str, token: str = None, remember: bool = True):
+        """
+        Conditional GET of an API path; returns the JSON body, or None if unavailable
+        Falls back to the last cached body on errors and while rate limited.
+        remember=False skips caching the body (large responses of immutable objects).
+        """
+        token_key = _token_key(token)
+        key = (path, token_key)
+        cached = self._responses.get(key)
+
+        if self._blocked_for(token_key) > 0:
+            self.stats["skipped_rate_limited"] += 1
+            return cached[1] if cached else None
+
+        headers = {}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        if cached:
+            headers["If-None-Match"] = cached[0]
+
+        self.stats["requests"] += 1
+        try:
+            response = await self._get_client().get(path, headers=headers)
+            self._track_rate_limit(token_key, response)
+            body = response.json() if response.status_code == 200 else None
+        except Exception as e:
+            # Metadata is optional: network or decoding trouble must not fail an analysis
+            self.stats["errors"] += 1
+            print(f"⚠️ GitHub API request failed: {e}")
+            return cached[1] if cached else None
+
+        if response.status_code == 304 and cached:
+            self.stats["not_modified"] += 1
+            self._responses.move_to_end(key)
+            return cached[1]
+
+        if response.status_code == 200:
+            etag = response.headers.get("ETag")
+            if etag and remember:
+                self._remember(key, etag, body)
+            return body
+
+        if response.status_code in (403, 429) and cached:
+            return cached[1]
+        return None
+
+    async def get_repo(self, owner: str, repo_name: str, token: str = None) -> dict:
+        """Repository metadata (description, stars, topics, ...); empty if unavailable"""
+        return await self.get_json(f"/repos/{owner}/{repo_name}", token) or {}
+
+    async def get_blob_sizes(self, owner: str, repo_name: str, tree_ish: str, token: str = None) -> dict:
+        """
+        {blob sha: size} of every file under a commit or tree, without downloading any blob
+        One recursive trees request; GitHub truncates very large trees, which then yield
+        the sizes it did list. Empty if unavailable.
+        """
+        body = await self.get_json(f"/repos/{owner}/{repo_name}/git/trees/{tree_ish}?recursive=1", token, remember=False)
+        if not isinstance(body, dict):
+            return {}
+        if body.get("truncated"):
+            print(f"⚠️ GitHub truncated the tree of {owner}/{repo_name}; some blob sizes stay unknown")
+        return {
+            entry["sha"]: entry["size"]
+            for entry in body.get("tree", [])
+            if entry.get("type") == "blob" and isinstance(entry.get("size"), int)
+        }
+
+    def metrics(self) -> dict:
+        """Counters and the tightest rate-limit window for /health"""
+        known = [limit for limit in self._limits.values() if "remaining" in limit]
+        return {
+            **self.stats,
+            "cached_responses": len(self._responses),
+            "lowest_remaining": min((limit["remaining"] for limit in known), default=None),
+            "rate_limited_tokens": sum(1 for token_key in self._limits if self._blocked_for(token_key) > 0)
+        }
+
+github_client = GitHubClient(GITHUB_API_URL, GITHUB_API_TIMEOUT, GITHUB_API_MAX_CONNECTIONS, GITHUB_ETAG_CACHE_SIZE)
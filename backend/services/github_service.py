@@ -1,12 +1,35 @@
 # backend/services/github_service.py - AUTHENTICATION FIXED + DETAILED ANALYSIS
 import os
-import requests
-import tempfile
+import time
+import asyncio
 import shutil
 import subprocess
-import sys
+import re
+import codecs
+import itertools
+import weakref
 from pathlib import Path
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from .snapshot_cache import load_snapshot, load_latest_snapshot, save_snapshot
+from .file_index import FileIndex, get_file_index
+from .file_classifier import get_classifier
+from .clone_scheduler import clone_scheduler, get_remote_host
+from .github_client import github_client
+
+load_dotenv()
+
+MIRROR_DIR = os.getenv("REPO_MIRROR_DIR", os.path.join(os.getcwd(), "repo_cache", "mirrors"))
+INCREMENTAL_MAX_CHANGED_PATHS = int(os.getenv("INCREMENTAL_MAX_CHANGED_PATHS", "500"))
+# New mirrors are partial clones (--filter=blob:none): blobs are fetched only for files that get read
+PARTIAL_CLONE = os.getenv("PARTIAL_CLONE", "true").lower() in ("1", "true", "yes")
+
+# A mirror's lock lives only while some task holds or waits on it
+_mirror_locks = weakref.WeakValueDictionary()
 
 def parse_github_url(repo_url: str) -> tuple:
     """Parse GitHub URL to extract owner and repo name"""
@@ -28,49 +51,284 @@ def parse_github_url(repo_url: str) -> tuple:
     
     return parts[0], parts[1]
 
-def check_git_installed() -> bool:
+def normalize_subdirectory(subdirectory: str) -> str:
+    """Repo-relative directory scope without surrounding slashes ("" = whole repository)"""
+    if not subdirectory:
+        return ""
+    
+    parts = [part for part in subdirectory.strip().replace("\\", "/").split("/") if part and part != "."]
+    if ".." in parts:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid subdirectory: '{subdirectory}'\n\n"
+                   "Use a path inside the repository, e.g. packages/api"
+        )
+    return "/".join(parts)
+
+async def timed_stage(timings: dict, stage: str, awaitable):
+    """Await one pipeline stage and record its wall time (seconds) as timings[stage]"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = round(time.perf_counter() - started, 3)
+
+async def check_git_installed() -> bool:
     """Check if Git is installed and accessible"""
     try:
-        result = subprocess.run(
-            ["git", "--version"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
+        result = await run_git(["--version"], timeout=5)
         return result.returncode == 0
     except (FileNotFoundError, subprocess.TimeoutExpired):
         return False
 
-def get_safe_temp_dir() -> str:
-    """Get a safe temporary directory that works on all platforms"""
+def build_clone_url(repo_url: str, owner: str, repo_name: str, github_token: str = None) -> str:
+    """Build the URL passed to git, embedding the token for private repos"""
+    clone_url = repo_url
+    if not clone_url.startswith(("http://", "https://")):
+        clone_url = f"https://github.com/{owner}/{repo_name}"
+    
+    if github_token and "github.com" in clone_url:
+        # Remove any existing protocol
+        clone_url = clone_url.replace("https://", "").replace("http://", "")
+        # Add token in correct format: https://TOKEN@github.com/owner/repo
+        clone_url = f"https://{github_token}@{clone_url}"
+    
+    return clone_url
+
+def get_git_env() -> dict:
+    """Environment that prevents Git from prompting for credentials"""
+    env = os.environ.copy()
+    env['GIT_TERMINAL_PROMPT'] = '0'
+    env['GIT_ASKPASS'] = 'echo'  # Prevent password prompts
+    # Partial mirrors must not fetch missing blobs one by one behind our back
+    env['GIT_NO_LAZY_FETCH'] = '1'
+    return env
+
+async def resolve_remote_head(clone_url: str) -> str:
+    """
+    Resolve the commit SHA of the remote HEAD without cloning
+    Returns None if the remote cannot be queried (the clone reports the real error)
+    """
+    try:
+        result = await run_git(["ls-remote", clone_url, "HEAD"], timeout=30)
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+    
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    
+    return result.stdout.split()[0]
+
+async def run_git(args: list, timeout: int = 60, cwd: str = None,
+                  input_data: bytes = None, text: bool = True) -> subprocess.CompletedProcess:
+    """
+    Run a git command without blocking the event loop
+    Prompts are disabled; output is captured and decoded unless text=False.
+    """
+    cmd = ["git"] + args
+    
     try:
-        # Try to use a custom temp directory in the current directory
-        base_dir = os.path.join(os.getcwd(), "temp_repos")
-        os.makedirs(base_dir, exist_ok=True)
-        
-        # Create a unique subdirectory
-        import time
-        import random
-        unique_name = f"repo_{int(time.time() * 1000)}_{random.randint(1000, 9999)}"
-        temp_dir = os.path.join(base_dir, unique_name)
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        return temp_dir
-    except Exception as e:
-        # Fallback to system temp
-        print(f"⚠️ Using system temp directory: {e}")
-        return tempfile.mkdtemp(prefix="repovision_")
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=get_git_env()
+        )
+    except NotImplementedError:
+        # Selector event loops (uvicorn --reload on Windows) can't spawn subprocesses
+        result = await run_in_threadpool(
+            subprocess.run, cmd,
+            input=input_data, capture_output=True, timeout=timeout, cwd=cwd, env=get_git_env()
+        )
+        stdout, stderr, returncode = result.stdout, result.stderr, result.returncode
+    else:
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(input_data), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        returncode = process.returncode
+    
+    if text:
+        stdout = stdout.decode('utf-8', errors='replace')
+        stderr = stderr.decode('utf-8', errors='replace')
+    
+    return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+
+def raise_for_git_error(stderr: str, owner: str, repo_name: str):
+    """Translate a failed clone/fetch into a helpful HTTPException"""
+    error_msg = (stderr or "").lower()
+    
+    # Provide specific, helpful error messages
+    if "repository not found" in error_msg or "not found" in error_msg:
+        raise HTTPException(
+            status_code=404,
+            detail=f"❌ Repository '{owner}/{repo_name}' not found.\n\n"
+                   "Please check:\n"
+                   "1. Repository URL is correct\n"
+                   "2. Repository exists and hasn't been deleted\n"
+                   "3. For PRIVATE repos: Add your GitHub token in the sidebar\n\n"
+                   f"Tried to access: {owner}/{repo_name}"
+        )
+    elif "authentication" in error_msg or "permission denied" in error_msg or "could not read" in error_msg:
+        raise HTTPException(
+            status_code=401,
+            detail=f"🔒 Authentication failed for '{owner}/{repo_name}'.\n\n"
+                   "This is a PRIVATE repository. To access it:\n\n"
+                   "1. Go to: https://github.com/settings/tokens\n"
+                   "2. Click 'Generate new token (classic)'\n"
+                   "3. Give it a name like 'RepoVision AI'\n"
+                   "4. Check the 'repo' permission\n"
+                   "5. Generate and copy the token\n"
+                   "6. Paste it in the sidebar under 'GitHub Token'\n\n"
+                   "Note: Public repositories don't need authentication."
+        )
+    elif "could not resolve host" in error_msg:
+        raise HTTPException(
+            status_code=503,
+            detail="🌐 Network error: Cannot connect to GitHub.\n\n"
+                   "Please check:\n"
+                   "1. Your internet connection\n"
+                   "2. GitHub is not blocked by firewall\n"
+                   "3. Try accessing github.com in your browser"
+        )
+    elif "timeout" in error_msg or "timed out" in error_msg:
+        raise HTTPException(
+            status_code=408,
+            detail=f"⏱️ Clone operation timed out.\n\n"
+                   "This usually means:\n"
+                   "1. Repository is very large (>500MB)\n"
+                   "2. Slow internet connection\n"
+                   "3. Network issues\n\n"
+                   "Try a smaller repository first to test."
+        )
+    else:
+        # Show actual Git error
+        error_display = stderr[:500] if stderr else "Unknown error"
+        raise HTTPException(
+            status_code=500,
+            detail=f"❌ Git clone failed:\n\n{error_display}\n\n"
+                   "If you need help, check:\n"
+                   "1. Repository URL is correct\n"
+                   "2. Git is properly installed\n"
+                   "3. You have internet access"
+        )
+
+def get_mirror_path(owner: str, repo_name: str) -> str:
+    """Path of the bare mirror kept for a repository"""
+    safe = lambda value: re.sub(r'[^a-z0-9._-]', '_', value.lower())
+    return os.path.join(MIRROR_DIR, safe(owner), f"{safe(repo_name)}.git")
+
+def get_mirror_lock(mirror_path: str) -> asyncio.Lock:
+    """Serialize git operations on one mirror within this process"""
+    lock = _mirror_locks.get(mirror_path)
+    if lock is None:
+        lock = _mirror_locks[mirror_path] = asyncio.Lock()
+    return lock
+
+async def update_mirror(mirror_path: str, clone_url: str, owner: str, repo_name: str) -> str:
+    """
+    Create the bare mirror on first use, otherwise fetch the latest HEAD into it
+    Only the tip commit is fetched; objects already in the mirror are not re-sent.
+    Returns the SHA of the fetched HEAD.
+    """
+    try:
+        if os.path.isdir(mirror_path):
+            print(f"🔄 Fetching latest commit into mirror...")
+            # Partial mirrors keep fetching commits and trees only
+            blob_filter = ["--filter=blob:none"] if await is_partial_mirror(mirror_path) else []
+            # Fetch via the (possibly tokenized) URL so the token is never stored in the mirror
+            result = await run_git(
+                ["--git-dir", mirror_path, "fetch", "--depth", "1", *blob_filter, clone_url, "HEAD"],
+                timeout=180
+            )
+            if result.returncode != 0:
+                raise_for_git_error(result.stderr, owner, repo_name)
+            
+            commit_sha = (await run_git(["--git-dir", mirror_path, "rev-parse", "FETCH_HEAD"])).stdout.strip()
+            await run_git(["--git-dir", mirror_path, "update-ref", "HEAD", commit_sha])
+        else:
+            print(f"⏳ Cloning repository...")
+            os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+            result = await run_git(
+                [
+                    "clone", "--bare",
+                    "--depth", "1",  # Shallow clone for speed
+                    "--single-branch",  # Only main branch
+                    *(["--filter=blob:none"] if PARTIAL_CLONE else []),  # Commits and trees only
+                    clone_url,
+                    mirror_path
+                ],
+                timeout=180  # 3 minute timeout
+            )
+            if result.returncode != 0:
+                await run_in_threadpool(shutil.rmtree, mirror_path, True)
+                raise_for_git_error(result.stderr, owner, repo_name)
+            
+            await run_git(["--git-dir", mirror_path, "remote", "set-url", "origin",
+                           f"https://github.com/{owner}/{repo_name}"])
+            commit_sha = (await run_git(["--git-dir", mirror_path, "rev-parse", "HEAD"])).stdout.strip()
+    
+    except subprocess.TimeoutExpired:
+        raise HTTPException(
+            status_code=408,
+            detail=f"⏱️ Clone timeout after 3 minutes.\n\n"
+                   f"Repository '{owner}/{repo_name}' is too large or connection is slow.\n\n"
+                   "Suggestions:\n"
+                   "1. Try a smaller repository\n"
+                   "2. Check your internet speed\n"
+                   "3. Repository might be >500MB"
+        )
+    
+    print(f"✅ Repository fetched successfully! ({commit_sha[:12]})")
+    return commit_sha
 
-def clone_and_analyze_repo(repo_url: str, github_token: str = None) -> dict:
+async def is_partial_mirror(mirror_path: str) -> bool:
+    """Whether the mirror was cloned with a blob filter (blobs have to be fetched on demand)"""
+    result = await run_git(["--git-dir", mirror_path, "config", "--get", "remote.origin.promisor"])
+    return result.stdout.strip() == "true"
+
+async def fetch_blobs(mirror_path: str, clone_url: str, oids: list) -> None:
+    """Fetch specific blobs into a partial mirror in one round trip"""
+    if not oids:
+        return
+    
+    # Same request git itself makes for missing objects, but batched and through the tokenized URL
+    result = await run_git(
+        [
+            "--git-dir", mirror_path,
+            "-c", "fetch.negotiationAlgorithm=noop",
+            "fetch", "--filter=blob:none", "--no-tags", "--no-write-fetch-head",
+            "--recurse-submodules=no", "--stdin", clone_url
+        ],
+        timeout=180,
+        input_data="".join(f"{oid}\n" for oid in oids).encode('utf-8')
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Blob fetch failed: {result.stderr[:500]}")
+
+async def clone_and_analyze_repo(repo_url: str, github_token: str = None, commit_sha: str = None,
+                                 subdirectory: str = None) -> dict:
     """
-    Clone repository to temp directory, analyze it, then delete
+    Fetch the repository into its mirror and analyze it straight from the git objects
     ✅ FIXED: Proper authentication for public and private repos
     ✅ ENHANCED: Detailed file analysis for comprehensive diagrams
+    ⚡ CACHED: Analysis is snapshotted per commit, repeat requests skip the clone
+    ⚡ INCREMENTAL: A bare mirror is kept per repo; new commits only re-analyze changed files
+    ⚡ PARTIAL: Partial mirrors only fetch the blobs the analysis reads
+    ⚡ NO CHECKOUT: Trees and blobs are read with ls-tree / cat-file; nothing is written to disk
+    ⚡ PIPELINED: API metadata is fetched while the mirror updates; analyzers run as concurrent stages
+    With a subdirectory, only that part of the repository is analyzed (as if it were the root).
+    The result carries "timings": wall seconds per stage, plus "total".
     """
-    temp_dir = None
+    started = time.perf_counter()
+    timings = {}
     
     # Check if Git is installed
-    if not check_git_installed():
+    if not await check_git_installed():
         raise HTTPException(
             status_code=500,
             detail="⚠️ Git is not installed on this system.\n\n"
@@ -93,139 +351,48 @@ def clone_and_analyze_repo(repo_url: str, github_token: str = None) -> dict:
                        "Expected format: https://github.com/owner/repository"
             )
         
-        # Create temp directory
-        try:
-            temp_dir = get_safe_temp_dir()
-            print(f"📁 Temp directory: {temp_dir}")
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to create temporary directory: {str(e)}"
-            )
-        
-        # Prepare clone URL with authentication
-        clone_url = repo_url
-        if not clone_url.startswith(("http://", "https://")):
-            clone_url = f"https://github.com/{owner}/{repo_name}"
-        
         # ✅ FIXED: Proper token authentication
+        clone_url = build_clone_url(repo_url, owner, repo_name, github_token)
         if github_token and "github.com" in clone_url:
-            # Remove any existing protocol
-            clone_url = clone_url.replace("https://", "").replace("http://", "")
-            # Add token in correct format: https://TOKEN@github.com/owner/repo
-            clone_url = f"https://{github_token}@{clone_url}"
             print(f"🔒 Using authenticated access (token provided)")
         else:
             print(f"🌐 Using public access (no token)")
         
-        # Clone the repository
-        print(f"⏳ Cloning repository...")
-        
-        is_windows = sys.platform.startswith('win')
+        subdirectory = normalize_subdirectory(subdirectory)
+        if subdirectory:
+            print(f"📌 Scope: {subdirectory}/")
         
-        # Set environment to prevent Git from prompting for credentials
-        env = os.environ.copy()
-        env['GIT_TERMINAL_PROMPT'] = '0'
-        env['GIT_ASKPASS'] = 'echo'  # Prevent password prompts
+        # ⚡ Snapshot cache: resolve HEAD cheaply and skip clone + walk on a hit
+        if not commit_sha:
+            commit_sha = await timed_stage(timings, "resolve_head", resolve_remote_head(clone_url))
+        cached = await timed_stage(
+            timings, "snapshot_load",
+            run_in_threadpool(load_snapshot, owner, repo_name, commit_sha, subdirectory)
+        )
+        if cached is not None:
+            print(f"⚡ Snapshot cache hit for {owner}/{repo_name}@{commit_sha[:12]}")
+            timings["total"] = round(time.perf_counter() - started, 3)
+            return {**cached, "timings": timings}
         
-        clone_cmd = [
-            "git", "clone",
-            "--depth", "1",  # Shallow clone for speed
-            "--single-branch",  # Only main branch
-            clone_url,
-            temp_dir
-        ]
+        mirror_path = get_mirror_path(owner, repo_name)
         
-        try:
-            result = subprocess.run(
-                clone_cmd,
-                capture_output=True,
-                text=True,
-                timeout=180,  # 3 minute timeout
-                env=env,
-                shell=is_windows  # Use shell on Windows for compatibility
-            )
-            
-            if result.returncode != 0:
-                error_msg = result.stderr.lower()
-                
-                # Provide specific, helpful error messages
-                if "repository not found" in error_msg or "not found" in error_msg:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"❌ Repository '{owner}/{repo_name}' not found.\n\n"
-                               "Please check:\n"
-                               "1. Repository URL is correct\n"
-                               "2. Repository exists and hasn't been deleted\n"
-                               "3. For PRIVATE repos: Add your GitHub token in the sidebar\n\n"
-                               f"Tried to access: {owner}/{repo_name}"
-                    )
-                elif "authentication" in error_msg or "permission denied" in error_msg or "could not read" in error_msg:
-                    raise HTTPException(
-                        status_code=401,
-                        detail=f"🔒 Authentication failed for '{owner}/{repo_name}'.\n\n"
-                               "This is a PRIVATE repository. To access it:\n\n"
-                               "1. Go to: https://github.com/settings/tokens\n"
-                               "2. Click 'Generate new token (classic)'\n"
-                               "3. Give it a name like 'RepoVision AI'\n"
-                               "4. Check the 'repo' permission\n"
-                               "5. Generate and copy the token\n"
-                               "6. Paste it in the sidebar under 'GitHub Token'\n\n"
-                               "Note: Public repositories don't need authentication."
-                    )
-                elif "could not resolve host" in error_msg:
-                    raise HTTPException(
-                        status_code=503,
-                        detail="🌐 Network error: Cannot connect to GitHub.\n\n"
-                               "Please check:\n"
-                               "1. Your internet connection\n"
-                               "2. GitHub is not blocked by firewall\n"
-                               "3. Try accessing github.com in your browser"
-                    )
-                elif "timeout" in error_msg or "timed out" in error_msg:
-                    raise HTTPException(
-                        status_code=408,
-                        detail=f"⏱️ Clone operation timed out.\n\n"
-                               "This usually means:\n"
-                               "1. Repository is very large (>500MB)\n"
-                               "2. Slow internet connection\n"
-                               "3. Network issues\n\n"
-                               "Try a smaller repository first to test."
-                    )
-                else:
-                    # Show actual Git error
-                    error_display = result.stderr[:500] if result.stderr else "Unknown error"
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"❌ Git clone failed:\n\n{error_display}\n\n"
-                               "If you need help, check:\n"
-                               "1. Repository URL is correct\n"
-                               "2. Git is properly installed\n"
-                               "3. You have internet access"
-                    )
-            
-            print(f"✅ Repository cloned successfully!")
-            
-        except subprocess.TimeoutExpired:
-            raise HTTPException(
-                status_code=408,
-                detail=f"⏱️ Clone timeout after 3 minutes.\n\n"
-                       f"Repository '{owner}/{repo_name}' is too large or connection is slow.\n\n"
-                       "Suggestions:\n"
-                       "1. Try a smaller repository\n"
-                       "2. Check your internet speed\n"
-                       "3. Repository might be >500MB"
-            )
+        # ⚡ Bounded pool: identical requests share one run, bursts queue or get a 429
+        # (keyed by the clone URL so requests with different credentials never share a result)
+        repo_data = await clone_scheduler.run(
+            (clone_url, subdirectory, commit_sha),
+            get_remote_host(clone_url),
+            lambda: fetch_and_analyze(mirror_path, clone_url, owner, repo_name, repo_url, subdirectory, github_token)
+        )
         
-        # Analyze the cloned repository
-        print(f"🔍 Analyzing repository structure...")
-        repo_data = analyze_local_repo(temp_dir, repo_url)
+        # Stage times of the (possibly shared) run, plus this request's own waits
+        timings = {**repo_data.get("timings", {}), **timings, "total": round(time.perf_counter() - started, 3)}
         
         print(f"✨ Analysis complete!")
         print(f"   - Files analyzed: {repo_data['total_files_analyzed']}")
         print(f"   - Languages found: {len(repo_data.get('languages', {}))}")
+        print(f"   - Stages: {', '.join(f'{stage} {seconds}s' for stage, seconds in timings.items())}")
         
-        return repo_data
+        return {**repo_data, "timings": timings}
         
     except HTTPException:
         # Re-raise HTTP exceptions with our clear error messages
@@ -238,271 +405,434 @@ def clone_and_analyze_repo(repo_url: str, github_token: str = None) -> dict:
             status_code=500,
             detail=f"Failed to process repository: {str(e)}"
         )
+
+async def fetch_and_analyze(mirror_path: str, clone_url: str, owner: str, repo_name: str, repo_url: str,
+                            subdirectory: str = "", github_token: str = None) -> dict:
+    """
+    Update the mirror, then analyze its new HEAD (from a snapshot, incrementally or in full)
+    The GitHub API metadata request runs alongside the mirror update instead of after it.
+    """
+    timings = {}
+    metadata = asyncio.ensure_future(
+        timed_stage(timings, "metadata", fetch_repo_metadata(owner, repo_name, github_token))
+    )
+    
+    try:
+        async with get_mirror_lock(mirror_path):
+            commit_sha = await timed_stage(timings, "mirror_update", update_mirror(mirror_path, clone_url, owner, repo_name))
+            
+            # HEAD may have been unresolvable before the fetch
+            cached = await run_in_threadpool(load_snapshot, owner, repo_name, commit_sha, subdirectory)
+            if cached is not None:
+                return {**cached, "timings": timings}
+            
+            # Patch the most recent snapshot if this repo (and scope) was analyzed before
+            repo_data = None
+            previous = await run_in_threadpool(load_latest_snapshot, owner, repo_name, subdirectory)
+            if previous is not None:
+                repo_data = await timed_stage(timings, "incremental_update", update_analysis_incrementally(
+                    mirror_path, previous, commit_sha, clone_url=clone_url, subdirectory=subdirectory,
+                    repo_url=repo_url, github_token=github_token
+                ))
+                if repo_data is not None:
+                    # Keep the snapshot's metadata if the API has nothing (offline, rate limited)
+                    repo_info = await metadata
+                    if repo_info:
+                        repo_data.update(repo_metadata_fields(repo_info, repo_data["name"], repo_data["languages"]))
+            
+            if repo_data is None:
+                print(f"🔍 Analyzing repository structure...")
+                repo_data = await analyze_mirror_commit(
+                    mirror_path, clone_url, commit_sha, repo_url, subdirectory, github_token,
+                    metadata=metadata, timings=timings
+                )
+                repo_data["commit_sha"] = commit_sha
+                repo_data["subdirectory"] = subdirectory
     finally:
-        # Cleanup: Always delete temp directory
-        if temp_dir and os.path.exists(temp_dir):
-            try:
-                # On Windows, handle read-only files
-                if sys.platform.startswith('win'):
-                    for root, dirs, files in os.walk(temp_dir):
-                        for d in dirs:
-                            try:
-                                os.chmod(os.path.join(root, d), 0o777)
-                            except:
-                                pass
-                        for f in files:
-                            try:
-                                os.chmod(os.path.join(root, f), 0o777)
-                            except:
-                                pass
-                
-                shutil.rmtree(temp_dir, ignore_errors=True)
-                print(f"🗑️ Cleaned up temp directory")
-            except Exception as e:
-                print(f"⚠️ Warning: Could not fully clean temp directory: {e}")
-
-def analyze_local_repo(repo_path: str, repo_url: str) -> dict:
+        # Not needed after a snapshot hit, and not worth finishing after a failure
+        metadata.cancel()
+    
+    await timed_stage(
+        timings, "snapshot_save",
+        run_in_threadpool(save_snapshot, owner, repo_name, commit_sha, repo_data, subdirectory)
+    )
+    return {**repo_data, "timings": timings}
+
+# Directories skipped by the repository scan (tree, reads and language counts alike)
+SCAN_SKIP_DIRS = {
+    '.git', 'node_modules', '__pycache__', '.next', 'dist', 'build',
+    'coverage', '.venv', 'venv', 'env', '.idea', '.vscode', 'target',
+    '.pytest_cache', '.mypy_cache', '__pypackages__', 'eggs', '.eggs',
+    'vendor', 'bower_components', '.bundle'
+}
+
+# Hidden entries that are still scanned
+SCAN_HIDDEN_ALLOWED = {'.env', '.gitignore', '.env.example', '.github'}
+
+# Deepest directory level shown in the file tree
+TREE_MAX_DEPTH = 6
+
+CODE_EXTENSIONS = {
+    'py', 'js', 'jsx', 'ts', 'tsx', 'java', 'go', 'rs', 'cpp', 'c', 'h',
+    'rb', 'php', 'swift', 'kt', 'kts', 'scala', 'sh', 'bash', 'yml', 'yaml', 
+    'json', 'xml', 'md', 'txt', 'toml', 'ini', 'cfg', 'env', 'sql', 'graphql',
+    'vue', 'svelte', 'css', 'scss', 'sass', 'html', 'htm'
+}
+
+IMPORTANT_FILENAMES = [
+    "package.json", "requirements.txt", "Dockerfile", "README.md",
+    "docker-compose.yml", "Makefile", ".env.example", "pyproject.toml",
+    "go.mod", "Cargo.toml", "pom.xml", "build.gradle", "tsconfig.json"
+]
+
+MAX_READ_FILE_SIZE = 400000  # 400KB
+MAX_CONTENT_CHARS = 40000  # First 40KB (increased from 20KB)
+BINARY_SNIFF_BYTES = 8192
+READ_WORKERS = int(os.getenv("READ_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+READ_BATCH_SIZE = 64  # Files read per thread pool task
+
+LANGUAGE_EXTENSIONS = {
+    'Python': ['.py', '.pyw'],
+    'JavaScript': ['.js', '.jsx', '.mjs'],
+    'TypeScript': ['.ts', '.tsx'],
+    'Java': ['.java'],
+    'Go': ['.go'],
+    'Rust': ['.rs'],
+    'C++': ['.cpp', '.cc', '.cxx', '.hpp'],
+    'C': ['.c', '.h'],
+    'Ruby': ['.rb'],
+    'PHP': ['.php'],
+    'Swift': ['.swift'],
+    'Kotlin': ['.kt', '.kts'],
+    'Scala': ['.scala'],
+    'HTML': ['.html', '.htm'],
+    'CSS': ['.css', '.scss', '.sass', '.less'],
+    'Shell': ['.sh', '.bash'],
+    'SQL': ['.sql'],
+    'Vue': ['.vue'],
+    'Svelte': ['.svelte']
+}
+
+README_FILES = ["README.md", "README.txt", "README.rst", "README", "readme.md", "Readme.md"]
+
+DEPENDENCY_FILES = {
+    "package.json": "npm",
+    "yarn.lock": "yarn",
+    "requirements.txt": "pip",
+    "Pipfile": "pipenv",
+    "pyproject.toml": "poetry",
+    "Cargo.toml": "cargo",
+    "go.mod": "go",
+    "pom.xml": "maven",
+    "build.gradle": "gradle",
+    "build.gradle.kts": "gradle",
+    "composer.json": "composer",
+    "Gemfile": "bundler"
+}
+
+async def analyze_local_repo(repo_path: str, repo_url: str, records: list = None, github_token: str = None) -> dict:
     """
     Analyze locally cloned repository
     ✅ ENHANCED: Read more files for detailed diagrams
+    ⚡ ASYNC: Disk walks run in the threadpool, metadata over an async HTTP client
+    ⚡ CONCURRENT: The metadata request and every analyzer after the scan run side by side
+    Pass scan_repository records to skip the disk scan.
     """
     owner, repo_name = parse_github_url(repo_url)
-    
-    # Try to get repo info from GitHub API (for metadata)
-    api_url = f"https://api.github.com/repos/{owner}/{repo_name}"
-    headers = {"Accept": "application/vnd.github.v3+json"}
-    github_token = os.getenv("GITHUB_TOKEN")
-    if github_token:
-        headers["Authorization"] = f"Bearer {github_token}"
+    metadata = asyncio.ensure_future(fetch_repo_metadata(owner, repo_name, github_token))
     
     try:
-        repo_response = requests.get(api_url, headers=headers, timeout=10)
-        repo_info = repo_response.json() if repo_response.status_code == 200 else {}
-    except Exception as e:
-        print(f"⚠️ Could not fetch GitHub API metadata: {e}")
-        repo_info = {}
-    
-    print("📂 Building file tree...")
-    file_structure = build_file_tree_from_disk(repo_path)
+        # One walk of the checkout feeds every stage below
+        if records is None:
+            records = await run_in_threadpool(scan_repository, repo_path)
+        
+        print("📄 Reading important files and building the file tree...")
+        file_structure, file_contents, readme_content, languages, dependencies = await asyncio.gather(
+            run_in_threadpool(build_file_tree_from_disk, repo_path, TREE_MAX_DEPTH, records),
+            run_in_threadpool(read_important_files, repo_path, 200, records),
+            run_in_threadpool(read_readme_from_disk, repo_path, records),
+            run_in_threadpool(detect_languages, repo_path, records),
+            run_in_threadpool(analyze_dependencies_from_disk, repo_path, records)
+        )
+        print(f"✅ Read {len(file_contents)} files")
+        
+        repo_info = await metadata
+    finally:
+        metadata.cancel()
     
-    print("📄 Reading important files for detailed analysis...")
-    file_contents = read_important_files(repo_path)
+    return build_repo_data(repo_info, repo_name, languages, file_structure, file_contents, dependencies, readme_content)
+
+async def analyze_mirror_commit(mirror_path: str, clone_url: str, commit_sha: str, repo_url: str,
+                                subdirectory: str = "", github_token: str = None,
+                                metadata: asyncio.Future = None, timings: dict = None) -> dict:
+    """
+    Analyze a commit straight from the mirror's object database, without checking it out
+    Same result as analyze_local_repo on a checkout: the tree comes from `git ls-tree`,
+    file contents from `git cat-file --batch`. Blobs a partial mirror lacks are fetched as needed;
+    their sizes come from the GitHub trees API first, so oversized files aren't downloaded.
+    Pass metadata (a task fetching the API metadata) to start that request earlier;
+    stage wall times are recorded into timings.
+    """
+    owner, repo_name = parse_github_url(repo_url)
+    timings = {} if timings is None else timings
+    own_metadata = metadata is None
+    if own_metadata:
+        metadata = asyncio.ensure_future(
+            timed_stage(timings, "metadata", fetch_repo_metadata(owner, repo_name, github_token))
+        )
     
-    print(f"✅ Read {len(file_contents)} files")
+    api_sizes = None
+    try:
+        if await is_partial_mirror(mirror_path):
+            api_sizes = asyncio.ensure_future(
+                timed_stage(timings, "blob_sizes", fetch_blob_sizes(owner, repo_name, commit_sha, github_token))
+            )
+        records, oids = await timed_stage(timings, "list_tree", list_tree_records(mirror_path, commit_sha, subdirectory))
+        known_sizes = await api_sizes if api_sizes is not None else {}
+        
+        # The stages only share the tree listing; on a partial mirror each fetches the blobs it reads
+        print("📄 Reading important files from git objects...")
+        (file_contents, fetched_sizes), root_files, languages = await asyncio.gather(
+            timed_stage(timings, "read_files", read_important_blobs(
+                mirror_path, clone_url, commit_sha, records, oids, subdirectory=subdirectory, known_sizes=known_sizes
+            )),
+            timed_stage(timings, "read_root_files", read_root_blobs(
+                mirror_path, clone_url, commit_sha, records, oids, subdirectory
+            )),
+            timed_stage(timings, "languages", run_in_threadpool(detect_languages, None, records))
+        )
+        print(f"✅ Read {len(file_contents)} files")
+        
+        # Sizes of blobs fetched just now are known too, as are those the trees API reported
+        records = [
+            record._replace(size=fetched_sizes[record.rel_path]) if record.rel_path in fetched_sizes else record
+            for record in records
+        ]
+        records = apply_blob_sizes(records, oids, known_sizes)
+        
+        print("📂 Building file tree...")
+        file_structure = await timed_stage(
+            timings, "file_tree", run_in_threadpool(build_file_tree_from_disk, None, TREE_MAX_DEPTH, records)
+        )
+        
+        repo_info = await metadata
+    finally:
+        if own_metadata:
+            metadata.cancel()
+        if api_sizes is not None:
+            api_sizes.cancel()
     
-    readme_content = read_readme_from_disk(repo_path)
-    languages = detect_languages(repo_path)
-    dependencies = analyze_dependencies_from_disk(repo_path)
+    readme_content = next((root_files[name] for name in README_FILES if name in root_files), "")
+    dependencies = {
+        package_manager: root_files[dep_file][:10000]  # First 10KB
+        for dep_file, package_manager in DEPENDENCY_FILES.items()
+        if dep_file in root_files
+    }
     
+    return build_repo_data(repo_info, repo_name, languages, file_structure, file_contents, dependencies, readme_content)
+
+async def fetch_repo_metadata(owner: str, repo_name: str, github_token: str = None) -> dict:
+    """
+    Repository info from the GitHub API (description, stars, ...); empty if unavailable
+    Uses the request's token, falling back to GITHUB_TOKEN from the environment.
+    """
+    return await github_client.get_repo(owner, repo_name, github_token or os.getenv("GITHUB_TOKEN"))
+
+async def fetch_blob_sizes(owner: str, repo_name: str, commit_sha: str, github_token: str = None) -> dict:
+    """{blob oid: size} at a commit from the GitHub trees API (same token fallback as the metadata)"""
+    return await github_client.get_blob_sizes(owner, repo_name, commit_sha, github_token or os.getenv("GITHUB_TOKEN"))
+
+def apply_blob_sizes(records: list, oids: dict, sizes: dict) -> list:
+    """Fill in the unknown (-1) sizes of records whose blob is in sizes"""
+    return [
+        record._replace(size=sizes[oids[record.rel_path]])
+        if record.size < 0 and oids.get(record.rel_path) in sizes else record
+        for record in records
+    ]
+
+def build_repo_data(repo_info: dict, repo_name: str, languages: dict, file_structure, file_contents: dict,
+                    dependencies: dict, readme_content: str) -> dict:
+    """The analysis result shared by /chat and /generate-*"""
     return {
-        "name": repo_info.get("name", repo_name),
-        "description": repo_info.get("description", ""),
-        "language": repo_info.get("language", detect_primary_language(languages)),
+        **repo_metadata_fields(repo_info, repo_name, languages),
         "languages": languages,
         "file_structure": file_structure,
         "file_contents": file_contents,
         "dependencies": dependencies,
         "readme": readme_content,
+        "total_files_analyzed": len(file_contents)
+    }
+
+def repo_metadata_fields(repo_info: dict, repo_name: str, languages: dict) -> dict:
+    """The parts of the analysis result that come from the GitHub API"""
+    return {
+        "name": repo_info.get("name", repo_name),
+        "description": repo_info.get("description", ""),
+        "language": repo_info.get("language", detect_primary_language(languages)),
         "stars": repo_info.get("stargazers_count", 0),
         "forks": repo_info.get("forks_count", 0),
         "open_issues": repo_info.get("open_issues_count", 0),
-        "topics": repo_info.get("topics", []),
-        "total_files_analyzed": len(file_contents)
+        "topics": repo_info.get("topics", [])
     }
 
-def build_file_tree_from_disk(repo_path: str, max_depth: int = 6) -> dict:
+# (path relative to the repo root, file name, size in bytes, directory depth)
+FileRecord = namedtuple("FileRecord", ["rel_path", "name", "size", "depth"])
+
+def is_scanned_dir(name: str) -> bool:
+    return name not in SCAN_SKIP_DIRS and (not name.startswith('.') or name in SCAN_HIDDEN_ALLOWED)
+
+def is_scanned_file(name: str) -> bool:
+    return not name.startswith('.') or name in SCAN_HIDDEN_ALLOWED
+
+def scan_repository(repo_path: str) -> list:
     """
-    Build file tree from local repository
-    ✅ ENHANCED: Increased depth for better analysis
+    Walk the checkout once with os.scandir and return a FileRecord per file
+    Each directory's files come before its subdirectories. Symlinked
+    directories are not followed.
     """
+    records = []
+    # (absolute dir, relative prefix, depth); popped in reverse so siblings keep their order
+    stack = [(repo_path, "", 0)]
     
-    skip_dirs = {
-        '.git', 'node_modules', '__pycache__', '.next', 'dist', 'build',
-        'coverage', '.venv', 'venv', 'env', '.idea', '.vscode', 'target',
-        '.pytest_cache', '.mypy_cache', '__pypackages__', 'eggs', '.eggs',
-        'vendor', 'bower_components', '.bundle'
-    }
-    
-    def build_tree(path: str, depth: int = 0) -> dict:
-        if depth > max_depth:
-            return {}
+    while stack:
+        dir_path, prefix, depth = stack.pop()
+        subdirs = []
         
-        tree = {}
         try:
-            items = os.listdir(path)
-        except PermissionError:
-            return {}
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    try:
+                        if entry.is_dir():
+                            if is_scanned_dir(name) and not entry.is_symlink():
+                                subdirs.append((entry.path, f"{prefix}{name}/", depth + 1))
+                        elif is_scanned_file(name):
+                            records.append(FileRecord(f"{prefix}{name}", name, entry.stat().st_size, depth))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
         
-        for item in items:
-            # Skip hidden files except important ones
-            if item.startswith('.') and item not in ['.env', '.gitignore', '.env.example', '.github']:
-                continue
-            
-            item_path = os.path.join(path, item)
-            
-            try:
-                if os.path.isdir(item_path):
-                    if item not in skip_dirs:
-                        subtree = build_tree(item_path, depth + 1)
-                        if subtree:  # Only add if has contents
-                            tree[item] = {
-                                "type": "dir",
-                                "path": os.path.relpath(item_path, repo_path).replace('\\', '/'),
-                                "contents": subtree
-                            }
-                else:
-                    size = os.path.getsize(item_path)
-                    extension = item.split(".")[-1] if "." in item else "none"
-                    purpose = classify_file_purpose(item, os.path.relpath(item_path, repo_path))
-                    
-                    tree[item] = {
-                        "type": "file",
-                        "path": os.path.relpath(item_path, repo_path).replace('\\', '/'),
-                        "size": size,
-                        "extension": extension,
-                        "purpose": purpose
-                    }
-            except (PermissionError, OSError) as e:
-                continue
-        
-        return tree
+        stack.extend(reversed(subdirs))
     
-    return build_tree(repo_path)
+    return records
 
-def classify_file_purpose(filename: str, filepath: str) -> str:
-    """Classify file purpose for better diagram organization"""
-    name_lower = filename.lower()
-    path_lower = filepath.lower()
-    
-    # Test files
-    if any(x in name_lower for x in ["test", "spec", ".test.", "_test", "test_"]):
-        return "testing"
-    
-    # Config files
-    if any(x in name_lower for x in ["config", "setup", ".env", "settings", "conf"]):
-        return "configuration"
-    
-    # Data models
-    if any(x in name_lower for x in ["model", "schema", "entity", "dto"]):
-        return "data_model"
-    
-    # API/Routes
-    if any(x in name_lower for x in ["route", "endpoint", "api", "controller", "handler"]):
-        return "api"
-    
-    # UI Components
-    if any(x in name_lower for x in ["component", "view", "page", "screen", "template"]):
-        return "ui"
-    
-    # Utilities
-    if any(x in name_lower for x in ["util", "helper", "tool", "common"]):
-        return "utility"
-    
-    # Services
-    if any(x in name_lower for x in ["service", "provider", "manager", "factory"]):
-        return "service"
-    
-    # Middleware
-    if any(x in name_lower for x in ["middleware", "interceptor", "filter"]):
-        return "middleware"
-    
-    # Database
-    if any(x in name_lower for x in ["migration", "seed", "database", "db", ".sql"]):
-        return "database"
-    
-    # Dependencies
-    if filename in ["package.json", "requirements.txt", "Cargo.toml", "go.mod", "pom.xml", "build.gradle"]:
-        return "dependencies"
+def build_file_tree_from_disk(repo_path: str, max_depth: int = TREE_MAX_DEPTH, records: list = None) -> dict:
+    """
+    Build file tree from local repository
+    ✅ ENHANCED: Increased depth for better analysis
+    ⚡ Built from scan_repository records; pass them in to avoid walking again
+    Returns a dict-compatible view over a columnar FileIndex.
+    """
+    if records is None:
+        records = scan_repository(repo_path)
     
-    # Documentation
-    if any(x in name_lower for x in ["readme", "doc", "docs", ".md"]):
-        return "documentation"
+    records = [record for record in records if record.depth <= max_depth]
+    purposes = get_classifier().classify_batch((record.name, record.rel_path) for record in records)
     
-    return "general"
+    index = FileIndex.from_files(
+        (record.rel_path, record.size, purpose) for record, purpose in zip(records, purposes)
+    )
+    return index.view()
 
-def read_important_files(repo_path: str, max_files: int = 200) -> dict:
+def classify_file_purpose(filename: str, filepath: str) -> str:
+    """Classify file purpose for better diagram organization (rules live in file_classifier)"""
+    return get_classifier().classify(filename, filepath)
+
+def read_important_files(repo_path: str, max_files: int = 200, records: list = None) -> dict:
     """
     Read important files from repository
     ✅ ENHANCED: Increased limits for detailed diagram generation
     - More files: 100 → 200
     - More content: 20KB → 40KB per file
     - Larger file size: 200KB → 400KB
+    ⚡ PARALLEL: Reads run on a bounded thread pool and stop at MAX_CONTENT_CHARS
     """
-    important_files = {}
+    if records is None:
+        records = scan_repository(repo_path)
     
-    code_extensions = {
-        'py', 'js', 'jsx', 'ts', 'tsx', 'java', 'go', 'rs', 'cpp', 'c', 'h',
-        'rb', 'php', 'swift', 'kt', 'kts', 'scala', 'sh', 'bash', 'yml', 'yaml', 
-        'json', 'xml', 'md', 'txt', 'toml', 'ini', 'cfg', 'env', 'sql', 'graphql',
-        'vue', 'svelte', 'css', 'scss', 'sass', 'html', 'htm'
-    }
+    candidates = (
+        (record.name, record.rel_path, os.path.join(repo_path, record.rel_path), record.size)
+        for record in records
+        if should_read_file(record.name, record.size)
+    )
     
-    skip_dirs = {
-        '.git', 'node_modules', '__pycache__', '.next', 'dist', 'build',
-        'coverage', '.venv', 'venv', 'env', '.idea', '.vscode', 'target',
-        '.pytest_cache', '.mypy_cache', '__pypackages__', 'vendor'
-    }
-    
-    file_count = 0
+    return read_candidate_files(candidates, max_files)
+
+def read_candidate_files(candidates, max_files: int) -> dict:
+    """
+    Read (filename, rel_path, file_path, size) candidates in parallel
+    Keeps the first max_files readable text files, in candidate order; candidates
+    may be a lazy iterable and are only consumed as far as needed.
+    """
+    important_files = {}
+    candidates = iter(candidates)
     
-    for root, dirs, files in os.walk(repo_path):
-        # Remove skip directories from traversal
-        dirs[:] = [d for d in dirs if d not in skip_dirs and not d.startswith('.')]
-        
-        for file in files:
-            if file_count >= max_files:
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        # Binary or unreadable files don't count, so read in windows until max_files are in
+        while len(important_files) < max_files:
+            window = list(itertools.islice(candidates, max_files - len(important_files)))
+            if not window:
                 break
             
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, repo_path).replace('\\', '/')
-            
-            extension = file.split(".")[-1] if "." in file else ""
-            
-            try:
-                size = os.path.getsize(file_path)
-            except OSError:
-                continue
-            
-            # Read if: code file or important config, and under 400KB
-            should_read = (
-                extension in code_extensions or 
-                file in [
-                    "package.json", "requirements.txt", "Dockerfile", "README.md",
-                    "docker-compose.yml", "Makefile", ".env.example", "pyproject.toml",
-                    "go.mod", "Cargo.toml", "pom.xml", "build.gradle", "tsconfig.json"
-                ]
-            )
-            
-            if should_read and size < 400000:  # 400KB limit
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                    
-                    purpose = classify_file_purpose(file, rel_path)
-                    
-                    important_files[rel_path] = {
-                        "content": content[:40000],  # First 40KB (increased from 20KB)
-                        "size": size,
-                        "extension": extension,
-                        "purpose": purpose,
-                        "full_size": len(content)
-                    }
-                    
-                    file_count += 1
-                    
-                except Exception as e:
-                    continue
-        
-        if file_count >= max_files:
-            break
+            # Batches keep the per-task executor overhead below the cost of a small read
+            batches = [window[i:i + READ_BATCH_SIZE] for i in range(0, len(window), READ_BATCH_SIZE)]
+            heads = executor.map(lambda batch: [read_file_head(candidate[2]) for candidate in batch], batches)
+            for (file, rel_path, _, size), content in zip(window, itertools.chain.from_iterable(heads)):
+                if content is not None:
+                    important_files[rel_path] = build_content_entry(file, rel_path, content, size, full_size=size)
     
     return important_files
 
-def read_readme_from_disk(repo_path: str) -> str:
+def read_file_head(file_path: str) -> str:
+    """
+    First MAX_CONTENT_CHARS characters of a text file, or None for binary/unreadable files
+    Only reads as many bytes as it needs instead of the whole file.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(MAX_CONTENT_CHARS)
+            if is_binary(head):
+                return None
+            
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            content = decoder.decode(head)
+            # Multi-byte text decodes to fewer chars than bytes read; top up
+            while len(content) < MAX_CONTENT_CHARS:
+                more = f.read(MAX_CONTENT_CHARS - len(content))
+                if not more:
+                    break
+                content += decoder.decode(more)
+            return content[:MAX_CONTENT_CHARS]
+    except OSError:
+        return None
+
+def is_binary(head: bytes) -> bool:
+    """Binary sniffing: text files don't contain NUL bytes"""
+    return b'\0' in head[:BINARY_SNIFF_BYTES]
+
+def should_read_file(filename: str, size: int) -> bool:
+    """Read if: code file or important config, and under 400KB"""
+    extension = filename.split(".")[-1] if "." in filename else ""
+    return (extension in CODE_EXTENSIONS or filename in IMPORTANT_FILENAMES) and size < MAX_READ_FILE_SIZE
+
+def build_content_entry(filename: str, rel_path: str, content: str, size: int, full_size: int = None) -> dict:
+    """File entry as stored in file_contents"""
+    return {
+        "content": content[:MAX_CONTENT_CHARS],
+        "size": size,
+        "extension": filename.split(".")[-1] if "." in filename else "",
+        "purpose": classify_file_purpose(filename, rel_path),
+        "full_size": len(content) if full_size is None else full_size
+    }
+
+def read_readme_from_disk(repo_path: str, records: list = None) -> str:
     """Read README file from repository"""
-    readme_files = ["README.md", "README.txt", "README.rst", "README", "readme.md", "Readme.md"]
+    root_files = _root_file_names(records)
     
-    for readme_name in readme_files:
+    for readme_name in README_FILES:
+        if root_files is not None and readme_name not in root_files:
+            continue
         readme_path = os.path.join(repo_path, readme_name)
         if os.path.exists(readme_path):
             try:
@@ -513,71 +843,41 @@ def read_readme_from_disk(repo_path: str) -> str:
     
     return ""
 
-def detect_languages(repo_path: str) -> dict:
+def detect_languages(repo_path: str, records: list = None) -> dict:
     """Detect programming languages in repository"""
-    languages = {}
+    if records is None:
+        records = scan_repository(repo_path)
     
-    language_extensions = {
-        'Python': ['.py', '.pyw'],
-        'JavaScript': ['.js', '.jsx', '.mjs'],
-        'TypeScript': ['.ts', '.tsx'],
-        'Java': ['.java'],
-        'Go': ['.go'],
-        'Rust': ['.rs'],
-        'C++': ['.cpp', '.cc', '.cxx', '.hpp'],
-        'C': ['.c', '.h'],
-        'Ruby': ['.rb'],
-        'PHP': ['.php'],
-        'Swift': ['.swift'],
-        'Kotlin': ['.kt', '.kts'],
-        'Scala': ['.scala'],
-        'HTML': ['.html', '.htm'],
-        'CSS': ['.css', '.scss', '.sass', '.less'],
-        'Shell': ['.sh', '.bash'],
-        'SQL': ['.sql'],
-        'Vue': ['.vue'],
-        'Svelte': ['.svelte']
-    }
-    
-    skip_dirs = {'.git', 'node_modules', '__pycache__', 'venv', '.venv', 'vendor'}
-    
-    for root, dirs, files in os.walk(repo_path):
-        dirs[:] = [d for d in dirs if d not in skip_dirs]
-        
-        for file in files:
-            ext = os.path.splitext(file)[1]
-            for lang, exts in language_extensions.items():
-                if ext in exts:
-                    languages[lang] = languages.get(lang, 0) + 1
+    languages = {}
+    for record in records:
+        lang = detect_file_language(record.name)
+        if lang:
+            languages[lang] = languages.get(lang, 0) + 1
     
     return languages
 
+def detect_file_language(filename: str) -> str:
+    """Language of a single file by extension, or None"""
+    ext = os.path.splitext(filename)[1]
+    for lang, exts in LANGUAGE_EXTENSIONS.items():
+        if ext in exts:
+            return lang
+    return None
+
 def detect_primary_language(languages: dict) -> str:
     """Detect primary language from language counts"""
     if not languages:
         return "Unknown"
     return max(languages, key=languages.get)
 
-def analyze_dependencies_from_disk(repo_path: str) -> dict:
+def analyze_dependencies_from_disk(repo_path: str, records: list = None) -> dict:
     """Analyze dependencies from dependency files"""
     dependencies = {}
+    root_files = _root_file_names(records)
     
-    dependency_files = {
-        "package.json": "npm",
-        "yarn.lock": "yarn",
-        "requirements.txt": "pip",
-        "Pipfile": "pipenv",
-        "pyproject.toml": "poetry",
-        "Cargo.toml": "cargo",
-        "go.mod": "go",
-        "pom.xml": "maven",
-        "build.gradle": "gradle",
-        "build.gradle.kts": "gradle",
-        "composer.json": "composer",
-        "Gemfile": "bundler"
-    }
-    
-    for dep_file, package_manager in dependency_files.items():
+    for dep_file, package_manager in DEPENDENCY_FILES.items():
+        if root_files is not None and dep_file not in root_files:
+            continue
         file_path = os.path.join(repo_path, dep_file)
         if os.path.exists(file_path):
             try:
@@ -589,6 +889,347 @@ def analyze_dependencies_from_disk(repo_path: str) -> dict:
     
     return dependencies
 
+def _root_file_names(records: list) -> set:
+    """Names of files at the repo root, or None when there are no scan records"""
+    if records is None:
+        return None
+    return {record.name for record in records if record.depth == 0}
+
+def _scan_order_key(rel_path: str) -> list:
+    """Sort key giving scan_repository's order: a directory's files, then its subdirectories"""
+    parts = rel_path.split('/')
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+async def list_tree_records(mirror_path: str, commit_sha: str, subdirectory: str = "") -> tuple:
+    """
+    FileRecords of a commit (or a subdirectory of it) listed from the mirror's trees, without a checkout
+    Same inclusion rules and order as scan_repository, paths relative to the subdirectory.
+    Returns (records, {rel_path: blob oid}). Sizes are -1 for blobs a partial mirror doesn't have.
+    """
+    partial = await is_partial_mirror(mirror_path)
+    tree_ish = f"{commit_sha}:{subdirectory}" if subdirectory else commit_sha
+    
+    # `ls-tree -l` reads sizes from the blobs themselves, which a partial mirror mostly lacks
+    result = await run_git(
+        ["--git-dir", mirror_path, "ls-tree", "-r", "-z", *([] if partial else ["-l"]), tree_ish],
+        timeout=120
+    )
+    if result.returncode != 0:
+        if subdirectory:
+            raise HTTPException(
+                status_code=404,
+                detail=f"❌ Directory '{subdirectory}' not found in the repository at {commit_sha[:12]}."
+            )
+        raise RuntimeError(f"git ls-tree failed: {result.stderr[:500]}")
+    
+    entries = {}
+    for entry in result.stdout.split("\0"):
+        if not entry:
+            continue
+        meta, rel_path = entry.split("\t", 1)
+        fields = meta.split()
+        # Submodules show up as "commit" entries
+        if fields[1] == "blob" and _in_scan_scope(rel_path):
+            size = int(fields[3]) if len(fields) > 3 and fields[3].isdigit() else -1
+            entries[rel_path] = (fields[2], size)
+    
+    if partial:
+        present = await present_objects(mirror_path, tree_ish)
+        sizes = await blob_sizes(mirror_path, [oid for oid, _ in entries.values() if oid in present])
+        entries = {path: (oid, sizes.get(oid, -1)) for path, (oid, _) in entries.items()}
+    
+    records = [
+        FileRecord(rel_path, rel_path.split('/')[-1], size, rel_path.count('/'))
+        for rel_path, (_, size) in sorted(entries.items(), key=lambda item: _scan_order_key(item[0]))
+    ]
+    return records, {path: oid for path, (oid, _) in entries.items()}
+
+async def present_objects(mirror_path: str, tree_ish: str) -> set:
+    """Oids of the objects under a tree that are already in the (partial) mirror"""
+    result = await run_git(
+        ["--git-dir", mirror_path, "rev-list", "--objects", "--missing=print", tree_ish],
+        timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"git rev-list failed: {result.stderr[:500]}")
+    
+    # Missing objects are printed as "?<oid>"
+    return {line.split(" ", 1)[0] for line in result.stdout.splitlines() if line and not line.startswith("?")}
+
+async def blob_sizes(mirror_path: str, oids: list) -> dict:
+    """{oid: size} of blobs present in the mirror, from one `git cat-file --batch-check`"""
+    if not oids:
+        return {}
+    
+    result = await run_git(
+        ["--git-dir", mirror_path, "cat-file", "--batch-check", "--buffer"],
+        timeout=120,
+        input_data="".join(f"{oid}\n" for oid in oids).encode('utf-8')
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"git cat-file failed: {result.stderr[:500]}")
+    
+    sizes = {}
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if len(fields) == 3 and fields[1] == "blob":
+            sizes[fields[0]] = int(fields[2])
+    return sizes
+
+async def fetch_root_blobs(mirror_path: str, clone_url: str, commit_sha: str, names: list, subdirectory: str = "") -> None:
+    """Fetch whichever of the given top-level files exist at a commit into a partial mirror"""
+    tree_ish = f"{commit_sha}:{subdirectory}" if subdirectory else commit_sha
+    result = await run_git(
+        ["--git-dir", mirror_path, "--literal-pathspecs", "ls-tree", "-z", tree_ish, "--", *names],
+        timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"git ls-tree failed: {result.stderr[:500]}")
+    
+    oids = [entry.split()[2] for entry in result.stdout.split("\0") if entry and entry.split()[1] == "blob"]
+    await fetch_blobs(mirror_path, clone_url, oids)
+
+async def read_important_blobs(mirror_path: str, clone_url: str, commit_sha: str, records: list, oids: dict,
+                               max_files: int = 200, subdirectory: str = "", known_sizes: dict = None) -> tuple:
+    """
+    read_important_files over git objects: same candidates, order and limits, read with cat-file
+    Reads go in the same windows, so a partial mirror only fetches the windows it needs.
+    known_sizes ({oid: size}, from the trees API) lets a partial mirror skip oversized blobs
+    it lacks without fetching them. A blob of still unknown size (API unavailable or tree
+    truncated) is fetched, and dropped afterwards if it turns out too large.
+    Returns (file_contents, {rel_path: size} of the blobs fetched along the way).
+    """
+    important_files = {}
+    fetched_sizes = {}
+    known_sizes = known_sizes or {}
+    candidates = [
+        record for record in records
+        if should_read_file(record.name, record.size if record.size >= 0 else known_sizes.get(oids[record.rel_path], 0))
+    ]
+    
+    start = 0
+    while start < len(candidates) and len(important_files) < max_files:
+        window = candidates[start:start + max_files - len(important_files)]
+        start += len(window)
+        
+        await fetch_blobs(mirror_path, clone_url, list({oids[record.rel_path] for record in window if record.size < 0}))
+        blobs = await read_blobs(mirror_path, commit_sha, [record.rel_path for record in window], subdirectory)
+        
+        for record in window:
+            if record.rel_path not in blobs:
+                continue
+            size, data = blobs[record.rel_path]
+            if record.size < 0:
+                fetched_sizes[record.rel_path] = size
+            if size < MAX_READ_FILE_SIZE and not is_binary(data):
+                content = data[:MAX_CONTENT_CHARS * 4].decode('utf-8', errors='ignore')
+                important_files[record.rel_path] = build_content_entry(
+                    record.name, record.rel_path, content, size, full_size=size
+                )
+    
+    return important_files, fetched_sizes
+
+async def read_root_blobs(mirror_path: str, clone_url: str, commit_sha: str, records: list, oids: dict,
+                          subdirectory: str = "") -> dict:
+    """{name: text} of the README and dependency files at the (scoped) root"""
+    wanted = set(README_FILES) | set(DEPENDENCY_FILES)
+    root = [record for record in records if record.depth == 0 and record.name in wanted]
+    
+    await fetch_blobs(mirror_path, clone_url, list({oids[record.rel_path] for record in root if record.size < 0}))
+    blobs = await read_blobs(mirror_path, commit_sha, [record.rel_path for record in root], subdirectory)
+    return {path: data.decode('utf-8', errors='ignore') for path, (_, data) in blobs.items()}
+
+async def read_blobs(mirror_path: str, commit_sha: str, paths: list, subdirectory: str = "") -> dict:
+    """
+    Read file blobs at a commit straight from the mirror with one `git cat-file --batch`
+    Paths are relative to subdirectory. Returns {path: (size, bytes)}; missing paths and
+    non-blob objects are left out. On a partial mirror the blobs must have been fetched.
+    """
+    if not paths:
+        return {}
+    
+    prefix = f"{subdirectory}/" if subdirectory else ""
+    request = "".join(f"{commit_sha}:{prefix}{path}\n" for path in paths).encode('utf-8')
+    result = await run_git(
+        ["--git-dir", mirror_path, "cat-file", "--batch"],
+        timeout=120,
+        input_data=request,
+        text=False
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"git cat-file failed: {result.stderr[:500].decode('utf-8', errors='replace')}")
+    
+    output = result.stdout
+    blobs = {}
+    pos = 0
+    
+    for path in paths:
+        newline = output.index(b"\n", pos)
+        header = output[pos:newline].split(b" ")
+        pos = newline + 1
+        
+        # "<oid> <type> <size>" is followed by the object body; "<name> missing" is not
+        if len(header) == 3 and header[2].isdigit():
+            size = int(header[2])
+            if header[1] == b"blob":
+                blobs[path] = (size, output[pos:pos + size])
+            pos += size + 1
+    
+    return blobs
+
+async def get_changed_paths(mirror_path: str, old_sha: str, new_sha: str, subdirectory: str = "") -> list:
+    """
+    List (status, path, new blob oid) of files changed between two commits; None if the old commit is gone
+    Submodules aren't files: one replacing a file counts as a deletion, and the reverse as an addition.
+    With a subdirectory, only changes under it are listed, relative to it.
+    """
+    if (await run_git(["--git-dir", mirror_path, "cat-file", "-e", f"{old_sha}^{{commit}}"])).returncode != 0:
+        return None
+    
+    relative = [f"--relative={subdirectory}/"] if subdirectory else []
+    result = await run_git(
+        ["--git-dir", mirror_path, "diff-tree", "-r", "--no-renames", "--raw", "-z", *relative, old_sha, new_sha],
+        timeout=120
+    )
+    if result.returncode != 0:
+        return None
+    
+    # ":<old mode> <new mode> <old oid> <new oid> <status>" NUL "<path>" NUL
+    fields = result.stdout.split("\0")
+    changes = []
+    for i in range(0, len(fields) - 1, 2):
+        old_mode, new_mode, _, new_oid, status = fields[i].lstrip(":").split()[:5]
+        was_file = old_mode not in ("000000", "160000")
+        is_file = new_mode not in ("000000", "160000")
+        if not was_file and not is_file:
+            continue
+        if not is_file:
+            status = "D"
+        elif not was_file:
+            status = "A"
+        changes.append((status, fields[i + 1], new_oid))
+    return changes
+
+def _in_scan_scope(rel_path: str) -> bool:
+    """Same inclusion rules as scan_repository"""
+    parts = rel_path.split('/')
+    return all(is_scanned_dir(part) for part in parts[:-1]) and is_scanned_file(parts[-1])
+
+def _in_file_tree(rel_path: str, max_depth: int = TREE_MAX_DEPTH) -> bool:
+    """Same inclusion rules as build_file_tree_from_disk"""
+    return rel_path.count('/') <= max_depth and _in_scan_scope(rel_path)
+
+def _is_read_candidate(rel_path: str) -> bool:
+    """Whether read_important_files could read the path, judging by its name alone"""
+    return _in_scan_scope(rel_path) and should_read_file(rel_path.split('/')[-1], 0)
+
+async def update_analysis_incrementally(mirror_path: str, previous: dict, new_sha: str, max_files: int = 200,
+                                        clone_url: str = None, subdirectory: str = "",
+                                        repo_url: str = None, github_token: str = None) -> dict:
+    """
+    Derive the analysis of new_sha from a previous snapshot of the same repo (and scope)
+    Only changed paths are re-read, re-classified and re-counted; the file index is rebuilt
+    from the previous one's files plus the changes. On a partial mirror only the changed
+    blobs that get read are fetched (from clone_url); with repo_url, sizes from the trees
+    API keep oversized ones from being fetched at all.
+    Returns None when a full analysis is needed instead.
+    """
+    old_sha = previous.get("commit_sha")
+    if not old_sha or old_sha == new_sha:
+        return None
+    
+    try:
+        changes = await get_changed_paths(mirror_path, old_sha, new_sha, subdirectory)
+        if changes is None or len(changes) > INCREMENTAL_MAX_CHANGED_PATHS:
+            return None
+        
+        print(f"♻️ Incremental update {old_sha[:12]} → {new_sha[:12]} ({len(changes)} changed paths)")
+        
+        # Snapshots are shared: copy the containers that get patched (entries are replaced, never mutated)
+        repo_data = dict(previous)
+        file_contents = repo_data["file_contents"] = dict(previous["file_contents"])
+        languages = repo_data["languages"] = dict(previous["languages"])
+        tree_files = {
+            path: (size, purpose)
+            for path, size, purpose in get_file_index(previous["file_structure"]).iter_files()
+        }
+        
+        touched = [(path, oid) for status, path, oid in changes if status != "D"]
+        api_sizes = {}
+        partial = await is_partial_mirror(mirror_path)
+        if partial:
+            # Files that are never read keep an unknown size instead of costing a fetch
+            touched = [(path, oid) for path, oid in touched if _is_read_candidate(path)]
+            if touched and repo_url:
+                api_sizes = await fetch_blob_sizes(*parse_github_url(repo_url), new_sha, github_token)
+                touched = [(path, oid) for path, oid in touched if api_sizes.get(oid, 0) < MAX_READ_FILE_SIZE]
+            await fetch_blobs(mirror_path, clone_url, list({oid for _, oid in touched}))
+        blobs = await read_blobs(mirror_path, new_sha, [path for path, _ in touched], subdirectory)
+        
+        for status, rel_path, oid in changes:
+            filename = rel_path.split('/')[-1]
+            
+            if status == "D":
+                tree_files.pop(rel_path, None)
+                file_contents.pop(rel_path, None)
+                if _in_scan_scope(rel_path):
+                    lang = detect_file_language(filename)
+                    if lang and languages.get(lang):
+                        languages[lang] -= 1
+                        if not languages[lang]:
+                            del languages[lang]
+                continue
+            
+            size, data = blobs.get(rel_path, (api_sizes.get(oid, -1), None))
+            
+            if _in_file_tree(rel_path):
+                tree_files[rel_path] = (size, classify_file_purpose(filename, rel_path))
+            
+            if _in_scan_scope(rel_path):
+                if data is not None and should_read_file(filename, size) and not is_binary(data):
+                    if rel_path in file_contents or len(file_contents) < max_files:
+                        content = data[:MAX_CONTENT_CHARS * 4].decode('utf-8', errors='ignore')
+                        file_contents[rel_path] = build_content_entry(filename, rel_path, content, size, full_size=size)
+                else:
+                    file_contents.pop(rel_path, None)
+            
+            if status == "A" and _in_scan_scope(rel_path):
+                lang = detect_file_language(filename)
+                if lang:
+                    languages[lang] = languages.get(lang, 0) + 1
+        
+        changed = {path for _, path, _ in changes}
+        
+        if partial and changed & (set(README_FILES) | set(DEPENDENCY_FILES)):
+            await fetch_root_blobs(mirror_path, clone_url, new_sha, list(README_FILES) + list(DEPENDENCY_FILES), subdirectory)
+        
+        if changed & set(README_FILES):
+            readmes = await read_blobs(mirror_path, new_sha, README_FILES, subdirectory)
+            repo_data["readme"] = next(
+                (readmes[name][1].decode('utf-8', errors='ignore') for name in README_FILES if name in readmes),
+                ""
+            )
+        
+        if changed & set(DEPENDENCY_FILES):
+            dep_blobs = await read_blobs(mirror_path, new_sha, list(DEPENDENCY_FILES), subdirectory)
+            dependencies = {}
+            for dep_file, package_manager in DEPENDENCY_FILES.items():
+                if dep_file in dep_blobs:
+                    dependencies[package_manager] = dep_blobs[dep_file][1].decode('utf-8', errors='ignore')[:10000]
+            repo_data["dependencies"] = dependencies
+        
+        repo_data["file_structure"] = FileIndex.from_files(
+            (path, size, purpose) for path, (size, purpose) in tree_files.items()
+        ).view()
+        repo_data["commit_sha"] = new_sha
+        repo_data["subdirectory"] = subdirectory
+        repo_data["total_files_analyzed"] = len(file_contents)
+        return repo_data
+    
+    except Exception as e:
+        print(f"⚠️ Incremental update failed, falling back to full analysis: {e}")
+        return None
+
 def format_file_structure(structure: dict, indent: int = 0, max_items: int = 150) -> str:
     """
     Format file structure for display
@@ -612,7 +1253,8 @@ def format_file_structure(structure: dict, indent: int = 0, max_items: int = 150
                 purpose = info.get("purpose", "")
                 size = info.get("size", 0)
                 ext = info.get("extension", "")
-                result.append(f"{prefix}📄 {name} [{ext}] ({purpose}, {size}B)")
+                details = f"{purpose}, {size}B" if size >= 0 else purpose  # -1: never fetched
+                result.append(f"{prefix}📄 {name} [{ext}] ({details})")
         count += 1
     
     return "\n".join(result)
@@ -647,6 +1289,6 @@ def format_file_contents(contents: dict, max_files: int = 60) -> str:
     return "\n".join(result)
 
 # Keep old function name for backward compatibility
-def fetch_github_repo_structure(repo_url: str, deep_fetch: bool = True, github_token: str = None) -> dict:
+async def fetch_github_repo_structure(repo_url: str, deep_fetch: bool = True, github_token: str = None) -> dict:
     """Main entry point - uses git clone for comprehensive analysis"""
-    return clone_and_analyze_repo(repo_url, github_token)
\ No newline at end of file
+    return await clone_and_analyze_repo(repo_url, github_token)
\ No newline at end of file
@@ -0,0 +1,320 @@
+# backend/services/import_graph.py - IMPORT GRAPH DIAGRAMS WITHOUT AN LLM CALL
+import re
+import sys
+import posixpath
+from collections import Counter
+
+from .diagram_ir import (
+    DiagramGraph, GraphNode, GraphEdge, GraphSubgraph, simplify_graph,
+    DIAGRAM_NODE_BUDGET, DIAGRAM_EDGE_BUDGET
+)
+
+PYTHON_EXTENSIONS = {'py'}
+JS_EXTENSIONS = {'js', 'jsx', 'ts', 'tsx', 'mjs', 'cjs'}
+GO_EXTENSIONS = {'go'}
+# Tried in order after a relative JS/TS specifier
+JS_RESOLVE_SUFFIXES = (
+    '', '.ts', '.tsx', '.js', '.jsx', '.mjs', '.cjs',
+    '/index.ts', '/index.tsx', '/index.js', '/index.jsx'
+)
+NODE_BUILTINS = {
+    'assert', 'buffer', 'child_process', 'crypto', 'events', 'fs', 'http', 'https', 'net',
+    'os', 'path', 'process', 'querystring', 'stream', 'url', 'util', 'worker_threads', 'zlib'
+}
+PYTHON_STDLIB = set(getattr(sys, 'stdlib_module_names', sys.builtin_module_names))
+# Folders besides the repo root and the importer's own ancestors that absolute imports start from
+PYTHON_SOURCE_ROOTS = {'src', 'lib'}
+# Most-imported third-party packages shown; the rest are left out
+MAX_EXTERNAL_PACKAGES = 12
+# Folder subgraph ids all start with dir_, so no folder (not even external/) can take this one
+EXTERNAL_SUBGRAPH_ID = 'external'
+
+PY_IMPORT_RE = re.compile(
+    r'^[ \t]*(?:from[ \t]+(?P<module>\.*[\w.]*)[ \t]+import[ \t]+(?P<names>\([^)]*\)|[^\n#;]+)'
+    r'|import[ \t]+(?P<modules>[^\n#;]+))',
+    re.M
+)
+JS_IMPORT_RE = re.compile(
+    r'''(?:\bimport\s+(?:type\s+)?(?:[\w*{}\s,$]+?\s+from\s+)?|\bexport\s+[\w*{}\s,$]+?\s+from\s+|\brequire\s*\(\s*|\bimport\s*\(\s*)'''
+    r'''['"](?P<spec>[^'"\n]+)['"]'''
+)
+GO_IMPORT_RE = re.compile(r'^import\s*(?:\((?P<block>[^)]*)\)|(?:[\w.]+\s+)?"(?P<path>[^"]+)")', re.M)
+GO_BLOCK_PATH_RE = re.compile(r'"([^"]+)"')
+GO_MODULE_RE = re.compile(r'^module\s+(\S+)', re.M)
+
+def _extension(path: str) -> str:
+    return path.rsplit('.', 1)[-1] if '.' in posixpath.basename(path) else ''
+
+class NodeIds:
+    """Mermaid ids for paths; paths that only differ in punctuation (a-b.py, a_b.py) get a numeric suffix"""
+
+    def __init__(self):
+        self.ids = {}  # (prefix, path) -> id
+        self.used = set()
+
+    def get(self, prefix: str, path: str) -> str:
+        key = (prefix, path)
+        if key not in self.ids:
+            base = node_id = prefix + re.sub(r'\W', '_', path)
+            suffix = 2
+            while node_id in self.used:
+                node_id, suffix = f"{base}_{suffix}", suffix + 1
+            self.ids[key] = node_id
+            self.used.add(node_id)
+        return self.ids[key]
+
+def _python_root(path: str, module: str) -> str:
+    """Folder a file sits in when imported as the dotted module (app/utils/x.py as utils.x -> app)"""
+    parts = path[:-3].split('/')
+    if parts[-1] == '__init__':
+        parts = parts[:-1]
+    return '/'.join(parts[:len(parts) - len(module.split('.'))])
+
+def _is_source_root(root: str, importer: str) -> bool:
+    return not root or root in PYTHON_SOURCE_ROOTS or importer.startswith(root + '/')
+
+class ImportResolver:
+    """Maps import statements of one repository snapshot to repository files or external packages"""
+
+    def __init__(self, paths):
+        self.paths = set(paths)
+        self.python_modules = {}  # dotted module suffix -> [paths]
+        self.go_packages = {}  # directory -> [paths]
+        self.go_modules = {}  # module path -> directory of its go.mod
+
+        for path in sorted(self.paths):
+            extension = _extension(path)
+            if extension in PYTHON_EXTENSIONS:
+                parts = path[:-3].split('/')
+                if parts[-1] == '__init__':
+                    parts = parts[:-1]
+                for start in range(len(parts)):
+                    self.python_modules.setdefault('.'.join(parts[start:]), []).append(path)
+            elif extension in GO_EXTENSIONS and not path.endswith('_test.go'):
+                self.go_packages.setdefault(posixpath.dirname(path), []).append(path)
+
+    def add_go_mod(self, path: str, content: str) -> None:
+        match = GO_MODULE_RE.search(content)
+        if match:
+            self.go_modules[match.group(1)] = posixpath.dirname(path)
+
+    def _closest(self, candidates: list, importer: str) -> str:
+        """Candidate sharing the longest directory prefix with the importer"""
+        importer_dir = posixpath.dirname(importer).split('/')
+        def shared(path):
+            count = 0
+            for a, b in zip(importer_dir, posixpath.dirname(path).split('/')):
+                if a != b:
+                    break
+                count += 1
+            return count
+        return max(candidates, key=lambda path: (shared(path), -len(path)))
+
+    # Each resolver returns (internal paths, external package names)
+
+    def python(self, importer: str, content: str) -> tuple:
+        internal, external = set(), set()
+        for match in PY_IMPORT_RE.finditer(content):
+            if match.group('modules'):
+                for module in match.group('modules').split(','):
+                    module = module.strip().split(' as ')[0].strip()
+                    if module:
+                        self._python_module(importer, module, [], internal, external)
+            else:
+                names = [name.strip().split(' as ')[0].strip() for name in match.group('names').strip('()').split(',')]
+                self._python_module(importer, match.group('module'), [name for name in names if name and name != '*'], internal, external)
+        internal.discard(importer)
+        return internal, external
+
+    def _python_module(self, importer: str, module: str, names: list, internal: set, external: set) -> None:
+        """Resolve `import module` / `from module import names`; names that are submodules count as their own files"""
+        level = len(module) - len(module.lstrip('.'))
+        module = module[level:]
+        if level:
+            base = posixpath.dirname(importer)
+            for _ in range(level - 1):
+                base = posixpath.dirname(base)
+            package = posixpath.join(base, *module.split('.')) if module else base
+            submodules = [self._python_file(posixpath.join(package, name)) for name in names]
+            internal.update(path for path in submodules if path)
+            if not names or not all(submodules):
+                path = self._python_file(package)
+                if path:
+                    internal.add(path)
+            return
+
+        parts = module.split('.')
+        if not parts[0] or parts[0] in PYTHON_STDLIB:
+            return
+        submodules = [self._python_candidates(f"{module}.{name}", importer) for name in names]
+        internal.update(self._closest(candidates, importer) for candidates in submodules if candidates)
+        if names and all(submodules):
+            return
+        for end in range(len(parts), 0, -1):
+            candidates = self._python_candidates('.'.join(parts[:end]), importer)
+            if candidates:
+                internal.add(self._closest(candidates, importer))
+                return
+        external.add(parts[0])
+
+    def _python_candidates(self, module: str, importer: str) -> list:
+        """
+        Files an absolute import of module can refer to from importer
+        The module's top-level package has to sit at a source root: the repo root,
+        src/ or lib/, or a folder above the importer (scripts/requests.py is not `requests`).
+        """
+        return [
+            path for path in self.python_modules.get(module, [])
+            if _is_source_root(_python_root(path, module), importer)
+        ]
+
+    def _python_file(self, module_path: str) -> str:
+        for path in (module_path + '.py', module_path + '/__init__.py'):
+            if path in self.paths:
+                return path
+        return None
+
+    def javascript(self, importer: str, content: str) -> tuple:
+        internal, external = set(), set()
+        for match in JS_IMPORT_RE.finditer(content):
+            spec = match.group('spec')
+            if spec.startswith(('.', '@/', '~/')):
+                if spec.startswith('.'):
+                    base = posixpath.normpath(posixpath.join(posixpath.dirname(importer), spec))
+                else:  # Common bundler alias for the importer's src/ folder
+                    root = importer[:importer.rindex('src/') + 4] if 'src/' in importer else ''
+                    base = posixpath.normpath(root + spec[2:])
+                for suffix in JS_RESOLVE_SUFFIXES:
+                    if base + suffix in self.paths:
+                        internal.add(base + suffix)
+                        break
+                continue
+            if spec.startswith('node:') or spec.split('/')[0] in NODE_BUILTINS:
+                continue
+            parts = spec.split('/')
+            external.add('/'.join(parts[:2]) if spec.startswith('@') else parts[0])
+        internal.discard(importer)
+        return internal, external
+
+    def go(self, importer: str, content: str) -> tuple:
+        """Go imports packages: internal targets are package directories"""
+        internal, external = set(), set()
+        imports = []
+        for match in GO_IMPORT_RE.finditer(content):
+            if match.group('block') is not None:
+                imports.extend(GO_BLOCK_PATH_RE.findall(match.group('block')))
+            else:
+                imports.append(match.group('path'))
+
+        for path in imports:
+            for module, module_dir in self.go_modules.items():
+                if path == module or path.startswith(module + '/'):
+                    package_dir = posixpath.join(module_dir, path[len(module) + 1:]).strip('/')
+                    if package_dir in self.go_packages and package_dir != posixpath.dirname(importer):
+                        internal.add(package_dir)
+                    break
+            else:
+                if '.' in path.split('/')[0]:  # Standard library paths have no domain
+                    external.add('/'.join(path.split('/')[:3]))
+        return internal, external
+
+def build_import_graph(file_contents: dict) -> tuple:
+    """
+    (DiagramGraph, stats) of the imports between analyzed files
+    Folders become subgraphs (nested under the closest folder that also has files in the
+    graph); Go imports point at package folders; the most used third-party packages are
+    shown in an External subgraph.
+    """
+    resolver = ImportResolver(file_contents)
+    for path, entry in file_contents.items():
+        if posixpath.basename(path) == 'go.mod':
+            resolver.add_go_mod(path, entry.get('content', ''))
+
+    file_edges = []  # (source path, target path)
+    package_edges = []  # (source path, Go package directory)
+    external_edges = []  # (source path, package name)
+    for path, entry in sorted(file_contents.items()):
+        extension = _extension(path)
+        content = entry.get('content', '') if isinstance(entry, dict) else ''
+        if extension in PYTHON_EXTENSIONS:
+            internal, external = resolver.python(path, content)
+        elif extension in JS_EXTENSIONS:
+            internal, external = resolver.javascript(path, content)
+        elif extension in GO_EXTENSIONS:
+            internal, external = resolver.go(path, content)
+            package_edges.extend((path, target) for target in sorted(internal))
+            internal = set()
+        else:
+            continue
+        file_edges.extend((path, target) for target in sorted(internal))
+        external_edges.extend((path, package) for package in sorted(external))
+
+    usage = Counter(package for _, package in external_edges)
+    shown_packages = {package for package, _ in usage.most_common(MAX_EXTERNAL_PACKAGES)}
+    external_edges = [(path, package) for path, package in external_edges if package in shown_packages]
+
+    graph = DiagramGraph("LR")
+    ids = NodeIds()
+    folders = set()
+    external_ids = set()
+    def add_file(path):
+        node_id = ids.get('f_', path)
+        if node_id not in graph.nodes:
+            graph.nodes[node_id] = GraphNode(node_id, '[', posixpath.basename(path), None, posixpath.dirname(path))
+            folders.add(posixpath.dirname(path))
+        return node_id
+    def add_package(package_dir):
+        node_id = ids.get('pkg_', package_dir)
+        if node_id not in graph.nodes:
+            label = f"{posixpath.basename(package_dir) or 'main'} (package)"
+            graph.nodes[node_id] = GraphNode(node_id, '(', label, None, package_dir)
+            folders.add(package_dir)
+        return node_id
+
+    for source, target in file_edges:
+        graph.edges.append(GraphEdge(add_file(source), add_file(target), '-->', None))
+    for source, package_dir in package_edges:
+        graph.edges.append(GraphEdge(add_file(source), add_package(package_dir), '-->', None))
+    for source, package in external_edges:
+        package_id = ids.get('ext_', package)
+        if package_id not in graph.nodes:
+            graph.nodes[package_id] = GraphNode(package_id, '{{', package, None, None)
+            external_ids.add(package_id)
+        graph.edges.append(GraphEdge(add_file(source), package_id, '-.->', None))
+
+    # Folders as subgraphs; nodes were keyed by folder path until the subgraph ids exist
+    for folder in sorted(folders):
+        if not folder:
+            continue
+        parent = posixpath.dirname(folder)
+        while parent and parent not in folders:
+            parent = posixpath.dirname(parent)
+        title = folder[len(parent) + 1:] if parent else folder
+        graph.subgraphs[ids.get('dir_', folder)] = GraphSubgraph(
+            ids.get('dir_', folder), title, ids.get('dir_', parent) if parent else None, None
+        )
+    if shown_packages:
+        graph.subgraphs[EXTERNAL_SUBGRAPH_ID] = GraphSubgraph(EXTERNAL_SUBGRAPH_ID, 'External packages', None, None)
+    for node_id, node in graph.nodes.items():
+        if node_id in external_ids:
+            graph.nodes[node_id] = node._replace(subgraph=EXTERNAL_SUBGRAPH_ID)
+        elif node.subgraph:
+            graph.nodes[node_id] = node._replace(subgraph=ids.get('dir_', node.subgraph))
+        else:
+            graph.nodes[node_id] = node._replace(subgraph=None)
+
+    stats = {
+        "files": sum(1 for node_id in graph.nodes if node_id.startswith('f_')),
+        "internal_edges": len(file_edges) + len(package_edges),
+        "external_packages": len(shown_packages)
+    }
+    return graph, stats
+
+def generate_import_diagram(repo_data: dict) -> tuple:
+    """(Mermaid flowchart, stats) of the repository's import graph, fitted to the render budget"""
+    graph, stats = build_import_graph(repo_data.get('file_contents', {}))
+    if not graph.edges:
+        raise ValueError("No imports between Python, JavaScript/TypeScript or Go files were found")
+    if len(graph.nodes) > DIAGRAM_NODE_BUDGET or len(graph.edges) > DIAGRAM_EDGE_BUDGET:
+        stats["simplified"] = simplify_graph(graph, DIAGRAM_NODE_BUDGET, DIAGRAM_EDGE_BUDGET)
+    return graph.to_mermaid(), stats
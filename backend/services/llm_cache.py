@@ -0,0 +1,48 @@
+# backend/services/llm_cache.py - PROMPT-ADDRESSED LLM RESPONSE CACHE
+import os
+import json
+import hashlib
+from dotenv import load_dotenv
+
+from .tiered_cache import TieredCache
+
+load_dotenv()
+
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(os.getcwd(), "repo_cache", "llm"))
+LLM_CACHE_MEMORY_BYTES = int(os.getenv("LLM_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))  # 32MB
+LLM_CACHE_DISK_BYTES = int(os.getenv("LLM_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))  # 256MB
+# Prompts embed the repository content, so entries can't go stale; the TTL bounds how long an answer is replayed
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))  # 7 days
+
+llm_cache = TieredCache(
+    "llm",
+    LLM_CACHE_DIR,
+    memory_max_bytes=LLM_CACHE_MEMORY_BYTES,
+    disk_max_bytes=LLM_CACHE_DISK_BYTES,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS
+)
+
+def normalize_prompt(prompt: str) -> str:
+    """Drop whitespace differences the model doesn't care about (line endings, trailing space)"""
+    lines = prompt.strip().replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines)
+
+def get_llm_cache_key(llm, prompt: str) -> str:
+    """sha256 over (model, temperature, normalized prompt)"""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+    temperature = getattr(llm, "temperature", None)
+    payload = f"{model}\0{temperature}\0{normalize_prompt(prompt)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+async def get_cached_response(key: str) -> str:
+    """Cached completion text for a key, or None"""
+    value = await llm_cache.aget(key)
+    if value is None:
+        return None
+    try:
+        return json.loads(value)["content"]
+    except (ValueError, KeyError):
+        return None
+
+async def put_cached_response(key: str, content: str) -> None:
+    await llm_cache.aput(key, json.dumps({"content": content}).encode('utf-8'))
@@ -0,0 +1,156 @@
+# backend/services/llm_clients.py - SHARED LLM CLIENTS WITH POOLED CONNECTIONS
+import os
+import time
+from collections import deque
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import BaseCallbackHandler
+
+load_dotenv()
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.05"))  # Very low for consistency
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+# Model per route; each falls back to LLM_MODEL
+ROUTE_MODELS = {
+    "chat": os.getenv("LLM_MODEL_CHAT") or LLM_MODEL,
+    "diagram": os.getenv("LLM_MODEL_DIAGRAM") or LLM_MODEL,
+    "custom_diagram": os.getenv("LLM_MODEL_CUSTOM_DIAGRAM") or LLM_MODEL,
+    # Snippet-only Mermaid syntax fixes; a small model is usually enough
+    "repair": os.getenv("LLM_MODEL_REPAIR") or LLM_MODEL
+}
+
+# Recent call latencies kept per model for the /health percentiles
+LATENCY_WINDOW = 200
+
+class LatencyStats(BaseCallbackHandler):
+    """Callback handler timing every call of one model (total and, when streaming, first token)"""
+
+    run_inline = True  # Cheap bookkeeping; don't hop to an executor for it
+
+    def __init__(self):
+        self._started = {}  # run id -> start time
+        self._first_token = set()  # run ids that already produced a token
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.first_token_latencies = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {"calls": 0, "errors": 0, "in_flight": 0}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+        self.stats["calls"] += 1
+        self.stats["in_flight"] += 1
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id in self._started and run_id not in self._first_token:
+            self._first_token.add(run_id)
+            self.first_token_latencies.append(time.perf_counter() - self._started[run_id])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.stats["errors"] += 1
+        self._finish(run_id, failed=True)
+
+    def _finish(self, run_id, failed: bool = False) -> None:
+        started = self._started.pop(run_id, None)
+        self._first_token.discard(run_id)
+        if started is None:
+            return
+        self.stats["in_flight"] -= 1
+        if not failed:
+            self.latencies.append(time.perf_counter() - started)
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "latency_seconds": _summarize(self.latencies),
+            "first_token_seconds": _summarize(self.first_token_latencies)
+        }
+
+def _summarize(samples) -> dict:
+    """avg / p50 / p95 / max of recent samples, rounded to milliseconds"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "avg": round(sum(ordered) / len(ordered), 3),
+        "p50": round(pick(0.5), 3),
+        "p95": round(pick(0.95), 3),
+        "max": round(ordered[-1], 3)
+    }
+
+class LLMClientRegistry:
+    """
+    One ChatOpenAI per (model, temperature), all sharing one keep-alive HTTP pool
+    Clients for the configured routes are built at startup, so requests only look one up;
+    TLS handshakes to the API are paid once per pooled connection instead of once per request.
+    """
+
+    def __init__(self, route_models: dict, temperature: float, timeout: float, max_connections: int):
+        self.route_models = route_models
+        self.temperature = temperature
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        self._clients = {}  # (model, temperature) -> ChatOpenAI
+        self._stats = {}  # model -> LatencyStats
+        self._http_client = None
+        self._http_async_client = None
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    def start(self) -> None:
+        """Open the connection pools and build the clients every route uses"""
+        if self._http_async_client is None or self._http_async_client.is_closed:
+            self._http_async_client = httpx.AsyncClient(timeout=self.timeout, limits=self._limits())
+            self._http_client = httpx.Client(timeout=self.timeout, limits=self._limits())
+            self._clients.clear()  # Built on the closed pools
+        for route in self.route_models:
+            self.get(route)
+
+    async def aclose(self) -> None:
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_client.close()
+            self._http_async_client = self._http_client = None
+        self._clients.clear()
+
+    def get(self, route: str = "diagram", temperature: float = None) -> ChatOpenAI:
+        """The shared client for a route (routes without their own model use LLM_MODEL)"""
+        if self._http_async_client is None or self._http_async_client.is_closed:
+            self.start()
+
+        model = self.route_models.get(route, LLM_MODEL)
+        temperature = self.temperature if temperature is None else temperature
+        key = (model, temperature)
+        client = self._clients.get(key)
+        if client is None:
+            stats = self._stats.setdefault(model, LatencyStats())
+            client = self._clients[key] = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                openai_api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=self._http_client,
+                http_async_client=self._http_async_client,
+                max_retries=0,  # llm_gateway owns retries (with backoff shared across requests)
+                callbacks=[stats]
+            )
+            print(f"🤖 LLM client ready: {model} (temperature {temperature})")
+        return client
+
+    def metrics(self) -> dict:
+        """Per-route models and per-model call latency for /health"""
+        return {
+            "routes": dict(self.route_models),
+            "clients": len(self._clients),
+            "max_connections": self.max_connections,
+            "models": {model: stats.metrics() for model, stats in self._stats.items()}
+        }
+
+llm_clients = LLMClientRegistry(ROUTE_MODELS, LLM_TEMPERATURE, LLM_TIMEOUT, LLM_MAX_CONNECTIONS)
@@ -0,0 +1,232 @@
+# backend/services/llm_gateway.py - RATE-LIMITED, RETRYING, COALESCING LLM CALLS
+import os
+import time
+import math
+import random
+import asyncio
+import openai
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from .llm_cache import get_llm_cache_key
+
+load_dotenv()
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Provider budgets; 0 = not limited here
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+# Output tokens reserved per call until the real usage is known
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "1500"))
+# Longer expected waits for budget are answered with a 429 instead of queuing
+LLM_MAX_QUEUE_SECONDS = float(os.getenv("LLM_MAX_QUEUE_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+class TokenBucket:
+    """Budget of per_minute units refilling continuously; 0 means unlimited"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = max(0, per_minute)
+        self.level = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken (requests larger than the bucket wait for a full one)"""
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount: float) -> None:
+        if self.capacity:
+            self._refill()
+            self.level -= amount
+
+    def refund(self, amount: float) -> None:
+        """Give back (or, negative, charge) units once the real cost is known"""
+        if self.capacity:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+def estimate_tokens(prompt) -> int:
+    """Cheap prompt size estimate (≈ chars / 4); corrected by the reported usage afterwards"""
+    if isinstance(prompt, str):
+        return math.ceil(len(prompt) / 4)
+    return sum(math.ceil(len(message.content or "") / 4) for message in prompt)
+
+def _prompt_text(prompt) -> str:
+    if isinstance(prompt, str):
+        return prompt
+    return "\0".join(f"{message.type}:{message.content}" for message in prompt)
+
+def _retry_delay(error: Exception):
+    """Backoff hint for a retryable provider error: Retry-After seconds, 0 for none, None if not retryable"""
+    if isinstance(error, openai.APIConnectionError):  # Includes timeouts
+        return 0.0
+    status = getattr(error, "status_code", None)
+    if status == 429 or status == 408 or (status is not None and status >= 500):
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after", "") if response is not None else ""
+        try:
+            return float(retry_after)
+        except ValueError:
+            return 0.0
+    return None
+
+class LLMGateway:
+    """
+    Single path for LLM calls from /chat and /generate-*
+    - At most max_concurrency calls in flight; callers beyond that queue in order
+    - Requests-per-minute and tokens-per-minute token buckets pace calls before they are sent
+    - 429 / 5xx / connection errors are retried with full-jitter exponential backoff
+      (honouring Retry-After); once retries are exhausted the caller gets a 429/503
+    - Identical concurrent prompts for the same model and temperature share one call
+    """
+
+    def __init__(self, max_concurrency: int, rpm_limit: int, tpm_limit: int, max_retries: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.requests = TokenBucket(rpm_limit)
+        self.tokens = TokenBucket(tpm_limit)
+
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._pacing = asyncio.Lock()  # Callers wait for budget one at a time, in arrival order
+        self._inflight = {}  # prompt key -> task
+        self._waiting = 0
+        self._running = 0
+        self.stats = {
+            "calls": 0, "coalesced": 0, "retries": 0, "provider_rate_limited": 0,
+            "rejected": 0, "failed": 0, "throttled_seconds": 0.0
+        }
+
+    async def _reserve(self, tokens: int) -> None:
+        """Wait until both buckets can pay for one call of `tokens` tokens, then take it"""
+        async with self._pacing:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    return
+                if wait > LLM_MAX_QUEUE_SECONDS:
+                    self.stats["rejected"] += 1
+                    retry_after = math.ceil(wait)
+                    raise HTTPException(
+                        status_code=429,
+                        detail=f"⏳ The AI model is at its request budget right now.\n\n"
+                               f"Please retry in about {retry_after} seconds.",
+                        headers={"Retry-After": str(retry_after)}
+                    )
+                self.stats["throttled_seconds"] = round(self.stats["throttled_seconds"] + wait, 3)
+                await asyncio.sleep(wait)
+
+    async def _with_retries(self, call, tokens: int):
+        """Run call() within the budget, retrying transient provider failures"""
+        for attempt in range(self.max_retries + 1):
+            await self._reserve(tokens)
+            try:
+                return await call()
+            except Exception as e:
+                retry_after = _retry_delay(e)
+                if getattr(e, "status_code", None) == 429:
+                    self.stats["provider_rate_limited"] += 1
+                if retry_after is None:
+                    self.stats["failed"] += 1
+                    raise
+                if attempt == self.max_retries:
+                    self.stats["failed"] += 1
+                    status = 429 if getattr(e, "status_code", None) == 429 else 503
+                    delay = math.ceil(max(retry_after, LLM_BACKOFF_BASE_SECONDS))
+                    raise HTTPException(
+                        status_code=status,
+                        detail=f"⚠️ The AI model is unavailable right now ({e}).\n\n"
+                               f"Please retry in about {delay} seconds.",
+                        headers={"Retry-After": str(delay)}
+                    )
+                delay = max(retry_after, random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)))
+                self.stats["retries"] += 1
+                print(f"🔁 LLM call failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the max_concurrency call slots"""
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        self.stats["calls"] += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    async def _invoke(self, llm, prompt):
+        tokens = estimate_tokens(prompt) + LLM_EXPECTED_COMPLETION_TOKENS
+        async with self._slot():
+            response = await self._with_retries(lambda: llm.ainvoke(prompt), tokens)
+
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            self.tokens.refund(tokens - usage["total_tokens"])
+        return response
+
+    async def invoke(self, llm, prompt):
+        """llm.ainvoke(prompt) through the gateway; concurrent identical prompts share the response"""
+        key = get_llm_cache_key(llm, _prompt_text(prompt))
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            print("⏳ Joining an identical in-flight LLM call")
+        else:
+            task = asyncio.ensure_future(self._invoke(llm, prompt))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so a disconnecting client doesn't cancel the call other requests await
+        return await asyncio.shield(task)
+
+    async def stream(self, llm, messages):
+        """llm.astream(messages) through the gateway; retried only until the first chunk arrives"""
+        tokens = estimate_tokens(messages) + LLM_EXPECTED_COMPLETION_TOKENS
+        async with self._slot():
+            first = await self._with_retries(lambda: _first_chunk(llm, messages), tokens)
+            if first is None:
+                return
+            stream, chunk = first
+            yield chunk
+            async for chunk in stream:
+                yield chunk
+
+    def metrics(self) -> dict:
+        """Queue depth, budgets and counters for /health"""
+        return {
+            "running": self._running,
+            "queued": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "rpm_limit": self.requests.capacity or None,
+            "tpm_limit": self.tokens.capacity or None,
+            **self.stats
+        }
+
+async def _first_chunk(llm, messages):
+    """(stream, first chunk) of a fresh stream per attempt; None if the stream is empty"""
+    stream = llm.astream(messages)
+    try:
+        return stream, await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+llm_gateway = LLMGateway(LLM_MAX_CONCURRENCY, LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_MAX_RETRIES)
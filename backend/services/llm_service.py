@@ -1,18 +1,32 @@
 # backend/services/llm_service.py
-import os
-import re
 from dotenv import load_dotenv
 load_dotenv()
-from langchain_openai import ChatOpenAI
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from langchain.messages import HumanMessage, SystemMessage, AIMessage
-
-def get_llm():
-    """Initialize LLM with settings optimized for consistency"""
-    return ChatOpenAI(
-        model="gpt-4o",
-        temperature=0.05,  # Very low for consistency
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
+from .context_builder import CONTEXT_TOKEN_BUDGET, count_tokens, fill_context_template
+from .retrieval_index import retrieve_chunks
+from .file_index import get_file_index
+from .llm_clients import llm_clients
+from .llm_gateway import llm_gateway
+from mermaid_tools.parser import parse_mermaid
+from mermaid_tools.repair import repair_mermaid
+from .diagram_ir import simplify_mermaid
+from .prompt_templates import get_mermaid_fix_prompt
+
+# Snippet-only fix calls after local repair, before giving up with validation warnings
+MERMAID_FIX_ATTEMPTS = 2
+
+def get_llm(route: str = "diagram"):
+    """Shared LLM client for a route ("chat", "diagram", "custom_diagram", "repair"), low temperature for consistency"""
+    return llm_clients.get(route)
+
+async def invoke_llm(llm, prompt):
+    """
+    Call the model through the gateway (concurrency cap, RPM/TPM pacing, backoff on 429/5xx,
+    identical concurrent prompts coalesced). Raises HTTPException 429/503 once retries run out.
+    """
+    return await llm_gateway.invoke(llm, prompt)
 
 def validate_diagram_completeness(mermaid_code: str, repo_data: dict) -> tuple:
     """Validate that diagram is comprehensive enough"""
@@ -54,83 +68,42 @@ def validate_diagram_completeness(mermaid_code: str, repo_data: dict) -> tuple:
     return len(issues) == 0, issues
 
 def validate_mermaid_syntax(mermaid_code: str) -> tuple:
-    """Validate Mermaid syntax and return errors if any"""
-    errors = []
-    lines = mermaid_code.strip().split('\n')
-    
-    if not lines:
-        return False, ["Empty diagram code"]
-    
-    first_line = lines[0].strip()
-    valid_types = [
-        'sequenceDiagram', 'graph', 'flowchart', 'classDiagram',
-        'erDiagram', 'stateDiagram', 'journey', 'gantt', 'mindmap',
-        'pie', 'gitGraph'
-    ]
-    
-    if not any(first_line.startswith(t) for t in valid_types):
-        errors.append(f"Invalid diagram type: {first_line[:50]}")
-        return False, errors
-    
-    for i, line in enumerate(lines[1:], 1):
-        line = line.strip()
-        if not line or line.startswith('%%'):
-            continue
-        
-        if line.startswith('subgraph') or line == 'end':
-            continue
-        
-        if line.count('[') != line.count(']'):
-            errors.append(f"Line {i}: Unmatched brackets")
-        if line.count('(') != line.count(')'):
-            errors.append(f"Line {i}: Unmatched parentheses")
-        if line.count('{') != line.count('}'):
-            errors.append(f"Line {i}: Unmatched braces")
-    
-    return len(errors) == 0, errors
+    """Validate Mermaid syntax with the shared parser; errors are "Line N, col M: message" strings"""
+    diagram = parse_mermaid(mermaid_code)
+    return len(diagram.errors) == 0, [str(error) for error in diagram.errors]
 
 def fix_mermaid_syntax(mermaid_code: str) -> str:
-    """Auto-fix common Mermaid syntax errors"""
-    code = mermaid_code.strip()
-    
-    if code.startswith("```mermaid"):
-        code = code.replace("```mermaid", "").replace("```", "").strip()
-    elif code.startswith("```"):
-        code = code.replace("```", "").strip()
-    
-    lines = code.split('\n')
-    fixed_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        
-        if not line or line.startswith('%%'):
-            fixed_lines.append(line)
-            continue
+    """Auto-fix common Mermaid syntax errors locally (see mermaid_tools.repair)"""
+    result = repair_mermaid(mermaid_code)
+    if result.fixes:
+        print(f"🔧 Repaired Mermaid locally: {', '.join(result.fixes[:5])}")
+    return result.code
+
+async def repair_diagram(mermaid_code: str) -> tuple:
+    """
+    (code, is_valid, errors) for a generated diagram
+    Local repair first; only if errors remain, the model is asked to fix just the diagram text
+    (a few hundred tokens instead of regenerating with the whole repository context).
+    """
+    code = fix_mermaid_syntax(mermaid_code)
+    is_valid, errors = validate_mermaid_syntax(code)
+    
+    for attempt in range(MERMAID_FIX_ATTEMPTS):
+        if is_valid:
+            break
+        print(f"🩹 Asking the model to fix the diagram only (attempt {attempt + 1}/{MERMAID_FIX_ATTEMPTS}): {errors[:2]}")
+        response = await invoke_llm(get_llm("repair"), get_mermaid_fix_prompt(code, errors))
+        candidate = fix_mermaid_syntax(response.content)
+        candidate_valid, candidate_errors = validate_mermaid_syntax(candidate)
         
-        if line.startswith('subgraph') or line == 'end':
-            fixed_lines.append(line)
+        # A "fix" that drops most of the diagram is worse than a few warnings
+        if len(candidate.split('\n')) < len(code.split('\n')) // 2:
+            print("   ⚠️ Fixed diagram lost most of its lines, keeping the original")
             continue
-        
-        # Fix arrow syntax
-        line = re.sub(r'-{4,}>', '-->', line)
-        line = re.sub(r'\.{4,}>', '-..->', line)
-        line = line.replace('===>', '-->')
-        line = line.replace('....>', '-..->')
-        
-        # Fix node IDs with spaces - only before brackets
-        if '[' in line or '(' in line or '-->' in line or '-..->' in line:
-            parts = line.split('[', 1)
-            if len(parts) > 1:
-                before_bracket = parts[0]
-                before_bracket = re.sub(r'(\w+)\s+(\w+)(?=\s*$)', r'\1_\2', before_bracket)
-                line = before_bracket + '[' + parts[1]
-        
-        line = re.sub(r';+', ';', line)
-        
-        fixed_lines.append(line)
+        if candidate_valid or len(candidate_errors) < len(errors):
+            code, is_valid, errors = candidate, candidate_valid, candidate_errors
     
-    return '\n'.join(fixed_lines)
+    return code, is_valid, errors
 
 def extract_detailed_repo_components(repo_data: dict) -> dict:
     """Extract and categorize ALL components from repository"""
@@ -152,41 +125,33 @@ def extract_detailed_repo_components(repo_data: dict) -> dict:
         'all_files': []
     }
     
-    file_structure = repo_data.get('file_structure', {})
+    file_index = get_file_index(repo_data.get('file_structure', {}))
+    components['folders'].extend(file_index.iter_dirs())
     
-    def traverse_structure(obj, path=""):
-        if isinstance(obj, dict):
-            for key, value in obj.items():
-                current_path = f"{path}/{key}" if path else key
-                
-                if isinstance(value, dict):
-                    components['folders'].append(current_path)
-                    traverse_structure(value, current_path)
-                else:
-                    components['all_files'].append(current_path)
-                    
-                    if 'frontend' in current_path.lower() or 'client' in current_path.lower():
-                        components['frontend_files'].append(current_path)
-                    if 'backend' in current_path.lower() or 'server' in current_path.lower():
-                        components['backend_files'].append(current_path)
-                    if 'service' in current_path.lower():
-                        components['services'].append(current_path)
-                    if 'route' in current_path.lower() or 'router' in current_path.lower():
-                        components['routes'].append(current_path)
-                    if 'model' in current_path.lower() or 'schema' in current_path.lower():
-                        components['models'].append(current_path)
-                    if 'component' in current_path.lower():
-                        components['components'].append(current_path)
-                    if 'page' in current_path.lower() or 'view' in current_path.lower():
-                        components['pages'].append(current_path)
-                    if 'util' in current_path.lower() or 'helper' in current_path.lower():
-                        components['utils'].append(current_path)
-                    if current_path.endswith(('.json', '.yaml', '.yml', '.env', '.toml', '.ini')):
-                        components['config_files'].append(current_path)
-                    if 'database' in current_path.lower() or 'db' in current_path.lower() or current_path.endswith('.sql'):
-                        components['database_files'].append(current_path)
-    
-    traverse_structure(file_structure)
+    for current_path, _, _ in file_index.iter_files():
+        components['all_files'].append(current_path)
+        path_lower = current_path.lower()
+        
+        if 'frontend' in path_lower or 'client' in path_lower:
+            components['frontend_files'].append(current_path)
+        if 'backend' in path_lower or 'server' in path_lower:
+            components['backend_files'].append(current_path)
+        if 'service' in path_lower:
+            components['services'].append(current_path)
+        if 'route' in path_lower or 'router' in path_lower:
+            components['routes'].append(current_path)
+        if 'model' in path_lower or 'schema' in path_lower:
+            components['models'].append(current_path)
+        if 'component' in path_lower:
+            components['components'].append(current_path)
+        if 'page' in path_lower or 'view' in path_lower:
+            components['pages'].append(current_path)
+        if 'util' in path_lower or 'helper' in path_lower:
+            components['utils'].append(current_path)
+        if current_path.endswith(('.json', '.yaml', '.yml', '.env', '.toml', '.ini')):
+            components['config_files'].append(current_path)
+        if 'database' in path_lower or 'db' in path_lower or current_path.endswith('.sql'):
+            components['database_files'].append(current_path)
     
     # Extract dependencies
     file_contents = repo_data.get('file_contents', {})
@@ -201,19 +166,26 @@ def extract_detailed_repo_components(repo_data: dict) -> dict:
     
     return components
 
-def analyze_repo_with_chat(repo_data: dict, question: str, chat_history: list = None) -> dict:
-    """Analyze repository with ENFORCED comprehensive diagram generation"""
-    llm = get_llm()
-    
+def format_component_list(items: list, limit: int = 40) -> str:
+    """Bulleted list of component paths, capped so huge repos don't flood the prompt"""
+    lines = ['   - ' + item for item in items[:limit]]
+    if len(items) > limit:
+        lines.append(f"   ... ({len(items) - limit} more)")
+    return "\n".join(lines)
+
+def build_chat_messages(repo_data: dict, question: str, chat_history: list = None) -> tuple:
+    """
+    Build the chat prompt (system context + recent history + question) and the component index
+    The whole prompt is kept within CONTEXT_TOKEN_BUDGET; returns (messages, components, context_tokens).
+    """
     if chat_history is None:
         chat_history = []
     
-    from .github_service import format_file_structure, format_file_contents
-    
     components = extract_detailed_repo_components(repo_data)
     
-    # Build ultra-comprehensive context
-    context = f"""
+    # Build ultra-comprehensive context; the file tree and contents are filled in to the token budget
+    def render_context(file_structure_text: str, file_contents_text: str) -> str:
+        return f"""
 ==============================================================================
 REPOSITORY ANALYSIS - YOU MUST USE ALL THIS DATA TO CREATE COMPREHENSIVE DIAGRAMS
 ==============================================================================
@@ -226,52 +198,52 @@ Stars: {repo_data.get('stars', 0)} | Forks: {repo_data.get('forks', 0)}
 ==============================================================================
 COMPLETE FILE STRUCTURE (USE ALL OF THIS):
 ==============================================================================
-{format_file_structure(repo_data.get('file_structure', {}))}
+{file_structure_text}
 
 ==============================================================================
 CATEGORIZED COMPONENTS (INCLUDE ALL IN DIAGRAM):
 ==============================================================================
 
 📁 ALL FOLDERS ({len(components['folders'])} total):
-{chr(10).join('   - ' + f for f in components['folders'])}
+{format_component_list(components['folders'])}
 
 📄 ALL FILES ({len(components['all_files'])} total):
-{chr(10).join('   - ' + f for f in components['all_files'][:50])}
+{format_component_list(components['all_files'], limit=50)}
 
 🎨 FRONTEND FILES ({len(components['frontend_files'])}):
-{chr(10).join('   - ' + f for f in components['frontend_files'])}
+{format_component_list(components['frontend_files'])}
 
 ⚙️ BACKEND FILES ({len(components['backend_files'])}):
-{chr(10).join('   - ' + f for f in components['backend_files'])}
+{format_component_list(components['backend_files'])}
 
 🔧 SERVICES ({len(components['services'])}):
-{chr(10).join('   - ' + f for f in components['services'])}
+{format_component_list(components['services'])}
 
 🛣️ ROUTES/API ({len(components['routes'])}):
-{chr(10).join('   - ' + f for f in components['routes'])}
+{format_component_list(components['routes'])}
 
 📊 MODELS ({len(components['models'])}):
-{chr(10).join('   - ' + f for f in components['models'])}
+{format_component_list(components['models'])}
 
 🧩 COMPONENTS ({len(components['components'])}):
-{chr(10).join('   - ' + f for f in components['components'])}
+{format_component_list(components['components'])}
 
 📄 PAGES ({len(components['pages'])}):
-{chr(10).join('   - ' + f for f in components['pages'])}
+{format_component_list(components['pages'])}
 
 🛠️ UTILITIES ({len(components['utils'])}):
-{chr(10).join('   - ' + f for f in components['utils'])}
+{format_component_list(components['utils'])}
 
 ⚙️ CONFIG FILES ({len(components['config_files'])}):
-{chr(10).join('   - ' + f for f in components['config_files'])}
+{format_component_list(components['config_files'])}
 
 💾 DATABASE FILES ({len(components['database_files'])}):
-{chr(10).join('   - ' + f for f in components['database_files'])}
+{format_component_list(components['database_files'])}
 
 ==============================================================================
 FILE CONTENTS (ACTUAL CODE):
 ==============================================================================
-{format_file_contents(repo_data.get('file_contents', {}))}
+{file_contents_text}
 
 ==============================================================================
 MANDATORY DIAGRAM REQUIREMENTS - YOU MUST FOLLOW:
@@ -390,18 +362,34 @@ flowchart TB
 NOW CREATE YOUR COMPREHENSIVE DIAGRAM USING ALL THE DATA ABOVE!
 """
     
-    messages = [SystemMessage(content=context)]
-    
+    history = []
     for msg in chat_history[-10:]:
         role = msg.get('role', '')
         content = msg.get('content', '')
         
         if role == 'user':
-            messages.append(HumanMessage(content=content))
+            history.append(HumanMessage(content=content))
         elif role == 'assistant':
-            messages.append(AIMessage(content=content))
+            history.append(AIMessage(content=content))
+    
+    # Only the chunks relevant to this question; broad questions fall back to ranked whole files
+    chunks = retrieve_chunks(repo_data, question)
+    
+    # Whatever the template, history and question leave is spent on files
+    reserved_tokens = count_tokens(question) + sum(count_tokens(message.content) for message in history)
+    context, context_tokens = fill_context_template(
+        render_context, repo_data, CONTEXT_TOKEN_BUDGET, question, reserved_tokens, chunks
+    )
     
-    messages.append(HumanMessage(content=question))
+    messages = [SystemMessage(content=context)] + history + [HumanMessage(content=question)]
+    
+    return messages, components, context_tokens
+
+async def analyze_repo_with_chat(repo_data: dict, question: str, chat_history: list = None) -> dict:
+    """Analyze repository with ENFORCED comprehensive diagram generation"""
+    llm = get_llm("chat")
+    
+    messages, components, context_tokens = await run_in_threadpool(build_chat_messages, repo_data, question, chat_history)
     
     # Retry with enforcement
     max_retries = 3
@@ -411,37 +399,20 @@ NOW CREATE YOUR COMPREHENSIVE DIAGRAM USING ALL THE DATA ABOVE!
         try:
             print(f"\n🎨 Generating diagram (attempt {attempt + 1}/{max_retries})...")
             
-            response = llm.invoke(messages)
+            response = await invoke_llm(llm, messages)
             answer_text = response.content
             
             answer, mermaid_code, diagram_type = extract_diagram_from_response(answer_text)
             
             if mermaid_code:
-                mermaid_code = fix_mermaid_syntax(mermaid_code)
-                
-                # Validate syntax
-                is_valid_syntax, syntax_errors = validate_mermaid_syntax(mermaid_code)
+                # Syntax problems are repaired on the diagram alone; only incompleteness re-asks with full context
+                mermaid_code, is_valid_syntax, syntax_errors = await repair_diagram(mermaid_code)
+                if not is_valid_syntax:
+                    print(f"   ⚠️ Syntax warnings after repair: {syntax_errors[:3]}")
                 
                 # Validate completeness
                 is_complete, completeness_issues = validate_diagram_completeness(mermaid_code, repo_data)
                 
-                if not is_valid_syntax and attempt < max_retries - 1:
-                    print(f"   ❌ Syntax errors: {syntax_errors}")
-                    error_msg = f"""
-SYNTAX ERRORS FOUND: {', '.join(syntax_errors[:3])}
-
-FIX THESE ISSUES:
-1. Check node IDs - use underscores, no spaces
-2. Use only --> or -.-> or ==> for arrows
-3. Balance all brackets, parentheses, braces
-
-REGENERATE with correct syntax.
-"""
-                    messages.append(AIMessage(content=answer_text))
-                    messages.append(HumanMessage(content=error_msg))
-                    attempt += 1
-                    continue
-                
                 if not is_complete and attempt < max_retries - 1:
                     print(f"   ⚠️ Incompleteness issues: {completeness_issues}")
                     error_msg = f"""
@@ -462,6 +433,7 @@ REGENERATE with COMPREHENSIVE, detailed diagram including 30-50 components.
                     continue
                 
                 print(f"   ✅ Diagram validated successfully!")
+                mermaid_code = fit_diagram_to_budget(mermaid_code)
             
             follow_ups = generate_follow_up_questions(answer, mermaid_code is not None, diagram_type)
             
@@ -471,22 +443,23 @@ REGENERATE with COMPREHENSIVE, detailed diagram including 30-50 components.
                 "diagram_type": diagram_type,
                 "has_diagram": mermaid_code is not None,
                 "follow_up_questions": follow_ups,
-                "repo_name": repo_data.get('name', 'Unknown')
+                "repo_name": repo_data.get('name', 'Unknown'),
+                "context_tokens": context_tokens
             }
         
+        except HTTPException:
+            raise  # Model unavailable after the gateway's own retries
         except Exception as e:
+            # Regenerating only helps with bad answers (handled above), not with errors
             print(f"   ❌ Error: {str(e)}")
-            if attempt < max_retries - 1:
-                attempt += 1
-                continue
-            
             return {
                 "answer": f"Error: {str(e)}",
                 "mermaid_code": None,
                 "diagram_type": None,
                 "has_diagram": False,
                 "follow_up_questions": [],
-                "repo_name": repo_data.get('name', 'Unknown')
+                "repo_name": repo_data.get('name', 'Unknown'),
+                "context_tokens": context_tokens
             }
     
     return {
@@ -495,7 +468,86 @@ REGENERATE with COMPREHENSIVE, detailed diagram including 30-50 components.
         "diagram_type": None,
         "has_diagram": False,
         "follow_up_questions": [],
-        "repo_name": repo_data.get('name', 'Unknown')
+        "repo_name": repo_data.get('name', 'Unknown'),
+        "context_tokens": context_tokens
+    }
+
+async def stream_repo_chat(repo_data: dict, question: str, chat_history: list = None):
+    """
+    Stream a chat answer as (event, data) tuples
+    - "progress": the prompt is built and the model has been called
+    - "token": answer text as it arrives
+    - "diagram_start": the model opened a [DIAGRAM_START] block (diagram text is not streamed)
+    - "diagram": cleaned and validated Mermaid code, sent as soon as [DIAGRAM_END] arrives
+    - "done": the full ChatResponse payload
+    No regeneration retries here: tokens already sent can't be taken back.
+    """
+    llm = get_llm("chat")
+    messages, _, context_tokens = await run_in_threadpool(build_chat_messages, repo_data, question, chat_history)
+    yield "progress", {
+        "stage": "prompt_built",
+        "message": "🤖 Generating answer...",
+        "prompt_chars": sum(len(message.content) for message in messages),
+        "context_tokens": context_tokens
+    }
+    
+    start_marker, end_marker = "[DIAGRAM_START]", "[DIAGRAM_END]"
+    full_text = ""
+    pending = ""  # Answer text held back because it may be the start of a marker
+    diagram_start = -1
+    diagram = None
+    
+    async for chunk in llm_gateway.stream(llm, messages):
+        text = chunk.content or ""
+        full_text += text
+        
+        if diagram_start < 0:
+            pending += text
+            if start_marker in pending:
+                before = pending[:pending.index(start_marker)]
+                if before:
+                    yield "token", {"text": before}
+                pending = ""
+                diagram_start = full_text.index(start_marker)
+                yield "diagram_start", {}
+            else:
+                # Emit everything except a tail that could still grow into the marker
+                hold = 0
+                for size in range(min(len(start_marker) - 1, len(pending)), 0, -1):
+                    if start_marker.startswith(pending[-size:]):
+                        hold = size
+                        break
+                if len(pending) > hold:
+                    yield "token", {"text": pending[:len(pending) - hold]}
+                    pending = pending[len(pending) - hold:]
+        
+        if diagram_start >= 0 and diagram is None and end_marker in full_text[diagram_start:]:
+            _, mermaid_code, diagram_type = extract_diagram_from_response(full_text)
+            mermaid_code = fit_diagram_to_budget(mermaid_code) if mermaid_code else None
+            is_valid, errors = validate_mermaid_syntax(mermaid_code) if mermaid_code else (False, ["Empty diagram code"])
+            diagram = {
+                "mermaid_code": mermaid_code,
+                "diagram_type": diagram_type,
+                "valid": is_valid,
+                "errors": errors
+            }
+            yield "diagram", diagram
+    
+    if pending:
+        yield "token", {"text": pending}
+    
+    answer, mermaid_code, diagram_type = extract_diagram_from_response(full_text)
+    if diagram is not None:
+        mermaid_code = diagram["mermaid_code"]  # Already cleaned and simplified
+    
+    yield "done", {
+        "answer": answer,
+        "repo_name": repo_data.get('name', 'Unknown'),
+        "has_diagram": mermaid_code is not None,
+        "mermaid_code": mermaid_code,
+        "diagram_type": diagram_type,
+        "follow_up_questions": generate_follow_up_questions(answer, mermaid_code is not None, diagram_type),
+        "context_tokens": context_tokens
     }
 
 def clean_mermaid_code(mermaid_code: str) -> str:
@@ -506,6 +558,15 @@ def clean_mermaid_code(mermaid_code: str) -> str:
         print(f"Validation warnings: {', '.join(errors)}")
     return cleaned
 
+def fit_diagram_to_budget(mermaid_code: str) -> str:
+    """Simplify flowcharts over the render budget (see diagram_ir) so large repos still lay out quickly"""
+    simplified, stats = simplify_mermaid(mermaid_code)
+    if stats:
+        print(f"🪄 Simplified diagram: {stats['nodes_before']} → {stats['nodes_after']} nodes, "
+              f"{stats['edges_before']} → {stats['edges_after']} edges "
+              f"({len(stats['collapsed_subgraphs'])} subgraphs collapsed)")
+    return simplified
+
 def detect_diagram_type(mermaid_code: str) -> str:
     """Detect the type of Mermaid diagram"""
     code_lower = mermaid_code.lower().strip()
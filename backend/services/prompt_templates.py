@@ -638,4 +638,25 @@ QUALITY CHECKLIST:
 ☐ Showed all important connections
 
 NOW CREATE A COMPREHENSIVE, PRODUCTION-QUALITY DIAGRAM:
-"""
\ No newline at end of file
+"""
+
+def get_mermaid_fix_prompt(mermaid_code: str, errors: list) -> str:
+    """Small prompt to fix a diagram's syntax: only the diagram, no repository context"""
+    
+    error_list = "\n".join(f"- {error}" for error in errors[:10])
+    
+    return f"""Fix the syntax errors in this Mermaid diagram.
+
+Errors reported by the validator:
+{error_list}
+
+RULES:
+- Keep every node, edge, subgraph and label; change only what is needed to fix the errors
+- Node IDs: only letters, numbers, underscores (NO SPACES)
+- Arrows: only --> or -.-> or ==>
+- Labels containing brackets or parentheses go in double quotes: A["get_user(id)"]
+- Return ONLY the corrected Mermaid code, no markdown code blocks, no explanation
+
+Diagram:
+{mermaid_code}
+"""
@@ -0,0 +1,135 @@
+# backend/services/retrieval_index.py - BM25 RETRIEVAL OVER FILE CHUNKS
+import os
+import re
+import math
+import heapq
+import threading
+from collections import Counter, OrderedDict
+from dotenv import load_dotenv
+
+from .context_builder import QUESTION_STOPWORDS
+
+load_dotenv()
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "12"))
+RETRIEVAL_INDEX_CACHE_SIZE = int(os.getenv("RETRIEVAL_INDEX_CACHE_SIZE", "16"))
+
+CHUNK_MAX_LINES = 40
+CHUNK_MAX_CHARS = 2400
+# Path segments say a lot about what a chunk is; count them like repeated terms
+PATH_TERM_WEIGHT = 2
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_CAMEL_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+def tokenize(text: str) -> list:
+    """Lowercased identifiers plus their snake_case / camelCase parts"""
+    terms = []
+    for identifier in _IDENTIFIER_RE.findall(text):
+        lowered = identifier.lower()
+        if len(lowered) > 1:
+            terms.append(lowered)
+        parts = [part.lower() for piece in identifier.split('_') for part in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if len(part) > 1)
+    return terms
+
+def chunk_file(content: str) -> list:
+    """Split a file into (start_line, end_line, text) chunks of whole lines"""
+    chunks = []
+    lines = content.split('\n')
+    start = 0
+    current = []
+    size = 0
+
+    for number, line in enumerate(lines):
+        if len(line) > CHUNK_MAX_CHARS:
+            line = line[:CHUNK_MAX_CHARS]  # Minified code: one huge line
+        if current and (len(current) >= CHUNK_MAX_LINES or size + len(line) > CHUNK_MAX_CHARS):
+            chunks.append((start + 1, number, '\n'.join(current)))
+            start, current, size = number, [], 0
+        current.append(line)
+        size += len(line) + 1
+
+    if current and any(line.strip() for line in current):
+        chunks.append((start + 1, len(lines), '\n'.join(current)))
+    return chunks
+
+class RetrievalIndex:
+    """BM25 index over line chunks of a repository's file_contents"""
+
+    def __init__(self, file_contents: dict):
+        self.chunks = []  # (path, start_line, end_line, text)
+        self.lengths = []
+        self.postings = {}  # term -> [(chunk_id, term_frequency)]
+
+        for path, entry in file_contents.items():
+            content = entry.get('content', '') if isinstance(entry, dict) else str(entry)
+            path_terms = tokenize(path.replace('/', ' ').replace('.', ' '))
+
+            for start_line, end_line, text in chunk_file(content):
+                chunk_id = len(self.chunks)
+                self.chunks.append((path, start_line, end_line, text))
+
+                counts = Counter(tokenize(text))
+                for term in path_terms:
+                    counts[term] += PATH_TERM_WEIGHT
+                self.lengths.append(sum(counts.values()))
+
+                for term, frequency in counts.items():
+                    self.postings.setdefault(term, []).append((chunk_id, frequency))
+
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K) -> list:
+        """Best-matching chunks for a query as (score, path, start_line, end_line, text)"""
+        terms = {term for term in tokenize(query) if term not in QUESTION_STOPWORDS}
+        if not terms or not self.chunks:
+            return []
+
+        total = len(self.chunks)
+        scores = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / self.average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, *self.chunks[chunk_id]) for chunk_id, score in best]
+
+# (name, commit_sha, subdirectory) -> RetrievalIndex, least recently used first
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def get_retrieval_index(repo_data: dict) -> RetrievalIndex:
+    """Index for an analyzed snapshot, built once per commit"""
+    commit_sha = repo_data.get('commit_sha')
+    if not commit_sha:
+        return RetrievalIndex(repo_data.get('file_contents', {}))
+
+    key = (repo_data.get('name'), commit_sha, repo_data.get('subdirectory', ''))
+    # Held while building so concurrent turns on a new commit index it once
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+        index = RetrievalIndex(repo_data.get('file_contents', {}))
+        print(f"🔎 Indexed {len(index.chunks)} chunks for {repo_data.get('name', 'repository')}@{commit_sha[:12]}")
+
+        _indexes[key] = index
+        while len(_indexes) > RETRIEVAL_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+        return index
+
+def retrieve_chunks(repo_data: dict, question: str, top_k: int = RETRIEVAL_TOP_K) -> list:
+    """Top-k chunks relevant to a question (empty if nothing matches)"""
+    return get_retrieval_index(repo_data).search(question, top_k)
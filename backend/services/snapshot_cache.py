@@ -0,0 +1,153 @@
+# backend/services/snapshot_cache.py - ON-DISK ANALYSIS SNAPSHOTS
+import os
+import re
+import json
+import time
+import hashlib
+from dotenv import load_dotenv
+
+from .file_index import get_file_index, to_jsonable
+
+load_dotenv()
+
+SNAPSHOT_CACHE_DIR = os.getenv("SNAPSHOT_CACHE_DIR", os.path.join(os.getcwd(), "repo_cache", "snapshots"))
+SNAPSHOT_CACHE_MAX_BYTES = int(os.getenv("SNAPSHOT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # 512MB
+SNAPSHOT_CACHE_TTL_SECONDS = int(os.getenv("SNAPSHOT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))  # 7 days
+# Snapshot file times: mtime is when it was written (the TTL clock), atime when it was last used (LRU)
+
+def _safe_segment(value: str) -> str:
+    """Make an owner/repo name safe to use as a directory name"""
+    return re.sub(r'[^a-z0-9._-]', '_', value.lower())
+
+def get_snapshot_path(owner: str, repo_name: str, commit_sha: str, subdirectory: str = "") -> str:
+    """Path of the snapshot file for (owner, repo, commit[, subdirectory scope])"""
+    repo_dir = os.path.join(SNAPSHOT_CACHE_DIR, _safe_segment(owner), _safe_segment(repo_name))
+    if subdirectory:
+        # Scoped analyses get their own directory; the hash keeps "a/b" and "a_b" apart
+        digest = hashlib.sha1(subdirectory.encode('utf-8')).hexdigest()[:8]
+        repo_dir = os.path.join(repo_dir, f"@{_safe_segment(subdirectory)[:64]}-{digest}")
+    return os.path.join(repo_dir, f"{_safe_segment(commit_sha)}.json")
+
+def load_snapshot(owner: str, repo_name: str, commit_sha: str, subdirectory: str = "") -> dict:
+    """
+    Load a cached analysis for a commit
+    Returns None on miss, on expiry or if the file is unreadable
+    """
+    if not commit_sha:
+        return None
+
+    path = get_snapshot_path(owner, repo_name, commit_sha, subdirectory)
+    try:
+        written = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    if _is_expired(written):
+        _remove_quietly(path)
+        return None
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    except Exception as e:
+        print(f"⚠️ Discarding unreadable snapshot {path}: {e}")
+        _remove_quietly(path)
+        return None
+
+    # Mark as used for LRU eviction, keeping the write time
+    try:
+        os.utime(path, (time.time(), written))
+    except OSError:
+        pass
+
+    repo_data = payload.get("repo_data")
+    if isinstance(repo_data, dict) and "file_structure" in repo_data:
+        # Stored columnar (or as a nested dict by older versions); hand out the dict-compatible view
+        repo_data["file_structure"] = get_file_index(repo_data["file_structure"]).view()
+    return repo_data
+
+def load_latest_snapshot(owner: str, repo_name: str, subdirectory: str = "") -> dict:
+    """Most recently used snapshot of a repository and scope (any commit), or None"""
+    repo_dir = os.path.dirname(get_snapshot_path(owner, repo_name, "latest", subdirectory))
+    try:
+        names = [name for name in os.listdir(repo_dir) if name.endswith(".json")]
+    except OSError:
+        return None
+
+    candidates = []
+    for name in names:
+        try:
+            candidates.append((os.path.getatime(os.path.join(repo_dir, name)), name[:-len(".json")]))
+        except OSError:
+            continue
+
+    for _, commit_sha in sorted(candidates, reverse=True):
+        repo_data = load_snapshot(owner, repo_name, commit_sha, subdirectory)
+        if repo_data is not None:
+            return repo_data
+
+    return None
+
+def save_snapshot(owner: str, repo_name: str, commit_sha: str, repo_data: dict, subdirectory: str = "") -> None:
+    """Persist an analysis result and enforce the cache byte budget"""
+    if not commit_sha:
+        return
+
+    path = get_snapshot_path(owner, repo_name, commit_sha, subdirectory)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"cached_at": time.time(), "repo_data": repo_data}, f, default=to_jsonable)
+        # Atomic rename so concurrent readers never see a partial file
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️ Could not write snapshot cache: {e}")
+        _remove_quietly(tmp_path)
+        return
+
+    evict_snapshots()
+
+def evict_snapshots() -> None:
+    """Drop expired snapshots, then least recently used ones until under the byte budget"""
+    entries = []
+    now = time.time()
+
+    for root, dirs, files in os.walk(SNAPSHOT_CACHE_DIR):
+        for file in files:
+            if not file.endswith(".json"):
+                continue
+            path = os.path.join(root, file)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            if _is_expired(stat.st_mtime, now):
+                _remove_quietly(path)
+                continue
+
+            entries.append((stat.st_atime, stat.st_size, path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    if total_bytes <= SNAPSHOT_CACHE_MAX_BYTES:
+        return
+
+    # Least recently used first
+    for _, size, path in sorted(entries):
+        if total_bytes <= SNAPSHOT_CACHE_MAX_BYTES:
+            break
+        _remove_quietly(path)
+        total_bytes -= size
+        print(f"🗑️ Evicted snapshot {os.path.basename(path)}")
+
+def _is_expired(written: float, now: float = None) -> bool:
+    """Whether a snapshot written at `written` (its mtime) is past the TTL"""
+    return (time.time() if now is None else now) - written > SNAPSHOT_CACHE_TTL_SECONDS
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
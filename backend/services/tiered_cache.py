@@ -0,0 +1,148 @@
+# backend/services/tiered_cache.py - MEMORY + DISK BYTES CACHE
+import os
+import time
+import threading
+from collections import OrderedDict
+from fastapi.concurrency import run_in_threadpool
+
+class TieredCache:
+    """
+    Bytes cache with a size-bounded in-memory LRU in front of a size-bounded disk tier
+    Keys must be filesystem-safe (e.g. hex digests). Entries older than ttl_seconds
+    (None = never) are treated as misses. Disk entries are evicted oldest-written first.
+    """
+
+    def __init__(self, name: str, disk_dir: str, memory_max_bytes: int, disk_max_bytes: int,
+                 ttl_seconds: float = None):
+        self.name = name
+        self.disk_dir = disk_dir
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()  # key -> (stored_at, value)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def get_memory(self, key: str) -> bytes:
+        """Memory tier lookup only (never touches disk)"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[0]):
+                self._memory_bytes -= len(self._memory.pop(key)[1])
+                return None
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry[1]
+
+    def put_memory(self, key: str, value: bytes, stored_at: float = None) -> None:
+        if len(value) > self.memory_max_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= len(self._memory.pop(key)[1])
+            self._memory[key] = (stored_at or time.time(), value)
+            self._memory_bytes += len(value)
+            while self._memory_bytes > self.memory_max_bytes and self._memory:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def get(self, key: str) -> bytes:
+        """Look up memory, then disk (promoting disk hits into memory)"""
+        value = self.get_memory(key)
+        if value is not None:
+            return value
+
+        path = self._disk_path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if self._expired(stored_at):
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'rb') as f:
+                value = f.read()
+        except OSError:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self.stats["disk_hits"] += 1
+        self.put_memory(key, value, stored_at)
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        """Store in both tiers"""
+        self.put_memory(key, value)
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write {self.name} cache entry: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        # Sweeping the disk tier walks the directory, so don't do it on every write
+        self._disk_writes += 1
+        if self._disk_writes % 50 == 1:
+            self.evict_disk()
+
+    def evict_disk(self) -> None:
+        """Drop expired entries, then oldest entries until under the disk budget"""
+        entries = []
+        for root, dirs, files in os.walk(self.disk_dir):
+            for file in files:
+                if file.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if self._expired(stat.st_mtime):
+                    self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.disk_max_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+
+    async def aget(self, key: str) -> bytes:
+        """get() that keeps disk reads off the event loop"""
+        value = self.get_memory(key)
+        if value is not None:
+            return value
+        return await run_in_threadpool(self.get, key)
+
+    async def aput(self, key: str, value: bytes) -> None:
+        """put() that keeps disk writes off the event loop"""
+        await run_in_threadpool(self.put, key, value)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -2,58 +2,19 @@
 import streamlit as st
 import streamlit.components.v1 as components
 from utils.helpers import generate_key
-import re
+from mermaid_tools.parser import parse_mermaid
+from mermaid_tools.repair import repair_mermaid
 
 def validate_and_fix_mermaid_syntax(mermaid_code: str) -> tuple:
-    """Validate and fix common Mermaid syntax errors"""
-    errors = []
-    fixed_code = mermaid_code.strip()
-    
-    # Remove markdown code blocks
-    if fixed_code.startswith("```mermaid"):
-        fixed_code = fixed_code.replace("```mermaid", "").replace("```", "").strip()
-    elif fixed_code.startswith("```"):
-        fixed_code = fixed_code.replace("```", "").strip()
-    
+    """Repair and validate with the Mermaid repair engine and parser shared with the backend; returns (code, notes)"""
     # Remove [DIAGRAM_START] and [DIAGRAM_END] markers if present
-    fixed_code = fixed_code.replace("[DIAGRAM_START]", "").replace("[DIAGRAM_END]", "").strip()
-    
-    # Fix common syntax issues
-    lines = fixed_code.split('\n')
-    fixed_lines = []
-    
-    for line in lines:
-        original_line = line
-        line = line.strip()
-        
-        if not line or line.startswith('%%'):
-            fixed_lines.append(line)
-            continue
-        
-        if line.startswith('subgraph') or line == 'end':
-            fixed_lines.append(line)
-            continue
-        
-        # Fix arrow syntax
-        line = re.sub(r'-{3,}>', '-->', line)
-        line = re.sub(r'\.{3,}>', '-..->', line)
-        
-        # Fix node IDs with spaces - more conservative approach
-        if '-->' in line or '-..->' in line or '==>' in line:
-            parts = line.split('[', 1)
-            if len(parts) > 1:
-                before_bracket = parts[0]
-                before_bracket = re.sub(r'(\w+)\s+(\w+)(?=\s*$)', r'\1_\2', before_bracket)
-                line = before_bracket + '[' + parts[1]
-        
-        if line != original_line.strip():
-            errors.append(f"Fixed: {original_line.strip()[:50]}...")
-        
-        fixed_lines.append(line)
+    code = mermaid_code.replace("[DIAGRAM_START]", "").replace("[DIAGRAM_END]", "")
     
-    fixed_code = '\n'.join(fixed_lines)
+    result = repair_mermaid(code)
+    notes = [f"Fixed: {fix}" for fix in result.fixes]
+    notes += [f"⚠️ {error}" for error in parse_mermaid(result.code).errors]
     
-    return fixed_code, errors
+    return result.code, notes
 
 def render_mermaid(mermaid_code, height=800, unique_id=None, theme='dark'):
     """Render mermaid diagram with ZOOM, PAN, and FULLSCREEN controls"""
@@ -67,7 +28,10 @@ def render_mermaid(mermaid_code, height=800, unique_id=None, theme='dark'):
     if syntax_fixes:
         with st.expander("🔧 Auto-fixed Syntax Issues", expanded=False):
             for fix in syntax_fixes:
-                st.info(fix)
+                if fix.startswith("⚠️"):
+                    st.warning(fix)
+                else:
+                    st.info(fix)
     
     # Escape code for safe embedding
     safe_mermaid_code = fixed_code.replace('`', '\\`').replace('${', '\\${').replace('</script>', '<\\/script>')
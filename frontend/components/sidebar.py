@@ -61,6 +61,15 @@ def render_sidebar():
             else:
                 st.info("Public repos only")
         
+        # Monorepos: analyze only one directory
+        subdirectory = st.text_input(
+            "📁 Subdirectory (optional)",
+            value=st.session_state.get('subdirectory', ''),
+            placeholder="packages/api",
+            help="Only analyze this directory of the repository. Useful for large monorepos."
+        )
+        st.session_state.subdirectory = subdirectory.strip()
+        
         st.divider()
         
         # Theme Selection
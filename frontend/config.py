@@ -23,7 +23,8 @@ DIAGRAM_TYPES = [
     "state",
     "journey",
     "gantt",
-    "mindmap"
+    "mindmap",
+    "imports"
 ]
 
 # Diagram keywords for chat detection
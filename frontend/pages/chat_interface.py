@@ -2,6 +2,7 @@
 import streamlit as st
 import requests
 from components.mermaid_renderer import render_mermaid
+from utils.helpers import iter_sse_events
 from utils.state_manager import (
     add_to_diagram_history, 
     clear_chat_history,
@@ -206,22 +207,41 @@ def export_diagram_as_image(mermaid_code: str, format_type: str, idx: int):
     """Export diagram as PNG or SVG image"""
     
     api_endpoint = st.session_state.get('api_endpoint_current')
+    mermaid_theme = 'dark' if st.session_state.get('theme', 'Dark') == 'Dark' else 'default'
+    
+    # Images already exported this session, keyed by what was rendered: {key: (etag, content)}
+    if 'export_cache' not in st.session_state:
+        st.session_state.export_cache = {}
+    cache_key = (mermaid_code, format_type, mermaid_theme)
+    cached = st.session_state.export_cache.get(cache_key)
     
     with st.spinner(f"🎨 Generating {format_type.upper()} image..."):
         try:
+            headers = {"If-None-Match": cached[0]} if cached else {}
             response = requests.post(
                 f"{api_endpoint}/export-diagram",
                 json={
                     "mermaid_code": mermaid_code,
-                    "format": format_type
+                    "format": format_type,
+                    "theme": mermaid_theme
                 },
+                headers=headers,
                 timeout=45
             )
             
-            if response.status_code == 200:
+            if response.status_code == 304 and cached:
+                content = cached[1]
+            elif response.status_code == 200:
+                content = response.content
+                if response.headers.get("ETag"):
+                    st.session_state.export_cache[cache_key] = (response.headers["ETag"], content)
+            else:
+                content = None
+            
+            if content is not None:
                 st.download_button(
                     label=f"💾 Download {format_type.upper()}",
-                    data=response.content,
+                    data=content,
                     file_name=f"diagram_{idx}.{format_type}",
                     mime=f"image/{format_type}",
                     key=f"final_download_{format_type}_{idx}_{hash(mermaid_code)}"
@@ -276,68 +296,120 @@ def generate_suggestions(response_text, has_diagram):
     return suggestions[:3]
 
 def handle_chat_message(api_endpoint, repo_url, question):
-    """Handle sending a chat message with GitHub token support"""
+    """Handle sending a chat message with GitHub token support, streaming the answer as it arrives"""
     
-    with st.spinner("🤔 Thinking..."):
-        payload = {
-            "repo_url": repo_url,
-            "question": question,
-            "chat_history": st.session_state.chat_history[-5:]
-        }
+    payload = {
+        "repo_url": repo_url,
+        "question": question,
+        "chat_history": st.session_state.chat_history[-5:]
+    }
+    if st.session_state.get('subdirectory'):
+        payload["subdirectory"] = st.session_state.subdirectory
+    
+    headers = {}
+    if st.session_state.github_token:
+        headers["X-GitHub-Token"] = st.session_state.github_token
+    
+    status_placeholder = st.empty()
+    answer_placeholder = st.empty()
+    diagram_placeholder = st.empty()
+    status_placeholder.info("🤔 Thinking...")
+    
+    try:
+        # Read timeout applies between events, not to the whole answer; the server sends
+        # keepalives while it waits for the clone or the model
+        with requests.post(
+            f"{api_endpoint}/chat/stream",
+            json=payload,
+            headers=headers,
+            stream=True,
+            timeout=(10, 120)
+        ) as response:
+            
+            if response.status_code != 200:
+                status_placeholder.empty()
+                error_detail = response.json().get('detail', 'Unknown error')
+                show_chat_error(error_detail)
+                return
+            
+            answer = ""
+            data = None
+            
+            for event, event_data in iter_sse_events(response):
+                if event == "progress":
+                    status_placeholder.info(event_data.get("message", "🤔 Thinking..."))
+                elif event == "token":
+                    answer += event_data.get("text", "")
+                    answer_placeholder.markdown(answer + "▌")
+                elif event == "diagram_start":
+                    status_placeholder.info("📊 Drawing diagram...")
+                elif event == "diagram":
+                    # Shown while the rest of the answer streams; the chat history takes over after "done"
+                    if event_data.get("mermaid_code"):
+                        status_placeholder.info("✍️ Diagram ready, finishing the answer...")
+                        theme = st.session_state.get('theme', 'Dark')
+                        with diagram_placeholder.container():
+                            render_mermaid(
+                                event_data["mermaid_code"],
+                                height=600,
+                                unique_id="chat_streaming",
+                                theme='dark' if theme == 'Dark' else 'default'
+                            )
+                elif event == "error":
+                    status_placeholder.empty()
+                    diagram_placeholder.empty()
+                    show_chat_error(event_data.get("detail", "Unknown error"))
+                    return
+                elif event == "done":
+                    data = event_data
         
-        headers = {}
-        if st.session_state.github_token:
-            headers["X-GitHub-Token"] = st.session_state.github_token
+        status_placeholder.empty()
         
-        try:
-            response = requests.post(
-                f"{api_endpoint}/chat",
-                json=payload,
-                headers=headers,
-                timeout=120
-            )
+        if data is None:
+            st.error("❌ Error: The response stream ended unexpectedly. Please try again.")
+            return
+        
+        st.session_state.chat_history.append({
+            "role": "user",
+            "content": question
+        })
+        
+        assistant_msg = {
+            "role": "assistant",
+            "content": data["answer"]
+        }
+        
+        has_diagram = False
+        if data.get("has_diagram") and data.get("mermaid_code"):
+            assistant_msg["diagram"] = data["mermaid_code"]
+            has_diagram = True
             
-            if response.status_code == 200:
-                data = response.json()
-                answer = data["answer"]
-                
-                st.session_state.chat_history.append({
-                    "role": "user",
-                    "content": question
-                })
-                
-                assistant_msg = {
-                    "role": "assistant",
-                    "content": answer
-                }
-                
-                has_diagram = False
-                if data.get("has_diagram") and data.get("mermaid_code"):
-                    assistant_msg["diagram"] = data["mermaid_code"]
-                    has_diagram = True
-                    
-                    add_to_diagram_history(
-                        diagram_type=data.get("diagram_type", "custom"),
-                        code=data["mermaid_code"],
-                        repo_name=data.get("repo_name", "Unknown"),
-                        prompt=question
-                    )
-                
-                suggestions = generate_suggestions(answer, has_diagram)
-                assistant_msg["suggestions"] = suggestions
-                
-                st.session_state.chat_history.append(assistant_msg)
-                st.rerun()
-            else:
-                error_detail = response.json().get('detail', 'Unknown error')
-                if "rate limit" in error_detail.lower():
-                    st.error("⚠️ GitHub API rate limit exceeded. Please add a GitHub token in the sidebar for private repos.")
-                else:
-                    st.error(f"❌ Error: {error_detail}")
+            add_to_diagram_history(
+                diagram_type=data.get("diagram_type", "custom"),
+                code=data["mermaid_code"],
+                repo_name=data.get("repo_name", "Unknown"),
+                prompt=question
+            )
         
-        except requests.exceptions.Timeout:
-            st.error("⏱️ Request timed out. Please try a more specific question.")
-        except requests.exceptions.ConnectionError:
-            st.error(f"🔌 Cannot connect to API. Ensure FastAPI server is running on {api_endpoint}")
-        except Exception as e:
-            st.error(f"❌ Error: {str(e)}")
\ No newline at end of file
+        suggestions = generate_suggestions(data["answer"], has_diagram)
+        assistant_msg["suggestions"] = suggestions
+        
+        st.session_state.chat_history.append(assistant_msg)
+        st.rerun()
+    
+    except requests.exceptions.Timeout:
+        status_placeholder.empty()
+        st.error("⏱️ Request timed out. Please try a more specific question.")
+    except requests.exceptions.ConnectionError:
+        status_placeholder.empty()
+        st.error(f"🔌 Cannot connect to API. Ensure FastAPI server is running on {api_endpoint}")
+    except Exception as e:
+        status_placeholder.empty()
+        st.error(f"❌ Error: {str(e)}")
+
+def show_chat_error(error_detail):
+    """Show an API error from the chat endpoint"""
+    if "rate limit" in error_detail.lower():
+        st.error("⚠️ GitHub API rate limit exceeded. Please add a GitHub token in the sidebar for private repos.")
+    else:
+        st.error(f"❌ Error: {error_detail}")
@@ -25,25 +25,39 @@ def render(api_endpoint):
             DIAGRAM_TYPES
         )
     
+    no_cache = st.checkbox(
+        "🔄 Generate a fresh diagram (skip cached result)",
+        value=False,
+        key="quick_no_cache"
+    )
+    
     if st.button("🎨 Generate Diagram"):
         if not repo_url:
             st.error("Please enter a GitHub repository URL.")
         else:
-            generate_standard_diagram(api_endpoint, repo_url, diagram_type)
+            generate_standard_diagram(api_endpoint, repo_url, diagram_type, no_cache)
 
-def generate_standard_diagram(api_endpoint, repo_url, diagram_type):
+def generate_standard_diagram(api_endpoint, repo_url, diagram_type, no_cache=False):
     """Generate a standard diagram"""
     with st.spinner("Generating diagram..."):
         try:
             response = requests.post(
                 f"{api_endpoint}/generate-diagram",
-                json={"repo_url": repo_url, "diagram_type": diagram_type},
+                json={
+                    "repo_url": repo_url,
+                    "diagram_type": diagram_type,
+                    "subdirectory": st.session_state.get('subdirectory') or None,
+                    "no_cache": no_cache
+                },
                 timeout=60,
             )
             
             if response.status_code == 200:
                 data = response.json()
-                st.success("✅ Diagram Generated Successfully!")
+                if data.get("cached"):
+                    st.success("⚡ Diagram Loaded from Cache!")
+                else:
+                    st.success("✅ Diagram Generated Successfully!")
                 
                 mermaid_code = data["mermaid_code"]
                 repo_name = data.get("repo_name", "Unknown")
@@ -1,5 +1,6 @@
 # frontend/utils/helpers.py
 import hashlib
+import json
 
 def generate_key(content):
     """Generate a unique key based on content"""
@@ -9,4 +10,26 @@ def truncate_text(text, max_length=60):
     """Truncate text to specified length"""
     if len(text) <= max_length:
         return text
-    return text[:max_length] + "..."
\ No newline at end of file
+    return text[:max_length] + "..."
+
+def iter_sse_events(response):
+    """Yield (event, data) pairs from a streamed server-sent events response"""
+    event, data_lines = "message", []
+    
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            # Blank line terminates an event
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith(":"):
+            continue  # Comment, e.g. the server's keepalive
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+    
+    if data_lines:
+        yield event, json.loads("\n".join(data_lines))
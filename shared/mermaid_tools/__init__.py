@@ -0,0 +1,2 @@
+# shared/mermaid_tools/__init__.py - MERMAID PARSER AND REPAIR FOR BACKEND AND FRONTEND
+# Standard library only, so the Streamlit app can install it without the backend's dependencies.
@@ -0,0 +1,550 @@
+# shared/mermaid_tools/parser.py - MERMAID PARSER AND VALIDATOR
+import re
+from collections import namedtuple
+
+DIAGRAM_HEADERS = (
+    'sequenceDiagram', 'graph', 'flowchart', 'classDiagram', 'erDiagram',
+    'stateDiagram', 'journey', 'gantt', 'mindmap', 'pie', 'gitGraph'
+)
+HEADER_KINDS = {
+    'graph': 'flowchart', 'flowchart': 'flowchart', 'sequenceDiagram': 'sequence',
+    'classDiagram': 'class', 'erDiagram': 'er', 'stateDiagram': 'state', 'stateDiagram-v2': 'state'
+}
+DIRECTIONS = ('TB', 'TD', 'BT', 'RL', 'LR')
+
+# Flowchart node shapes, longest opener first: (opener, accepted closers)
+NODE_SHAPES = [
+    ("(((", (")))",)), ("[[", ("]]",)), ("[(", (")]",)), ("([", ("])",)), ("((", ("))",)),
+    ("{{", ("}}",)), ("[/", ("/]", "\\]")), ("[\\", ("\\]", "/]")),
+    ("[", ("]",)), ("(", (")",)), ("{", ("}",)), (">", ("]",))
+]
+BRACKET_PAIRS = {'(': ')', '[': ']', '{': '}'}
+CLOSING_BRACKETS = {')': '(', ']': '[', '}': '{'}
+
+# Blocks closed by '}' (the rest are closed by 'end')
+BRACE_BLOCKS = ('class', 'entity', 'state')
+
+# Flowchart statements that aren't node/link chains
+FLOWCHART_DIRECTIVES = ('classDef', 'class', 'style', 'linkStyle', 'click', 'direction')
+
+# --- Tokens (all anchored at the cursor; none of them backtrack more than a character or two) ---
+FLOW_ARROW_RE = re.compile(r'(?P<start><?)(?P<body>-{2,}|={2,}|-\.+-)(?P<head>[>ox]?)(?=[\s|"\w]|$)|~{3,}')
+FLOW_TEXT_OPEN_RE = re.compile(r'<?(--|==|-\.)(?=\s)')
+FLOW_TEXT_CLOSE_RE = re.compile(r'\s(-{2,}[>ox]?|={2,}[>ox]?|\.+-[>ox]?)(?=[\s"\w]|$)')
+SEQUENCE_ARROW_RE = re.compile(r'<<-->>|<<->>|-->>|->>|-->|->|--x|-x|--\)|-\)')
+CLASS_RELATION_RE = re.compile(
+    r'(?P<source>[\w`~.]+)\s*(?:"[^"]*"\s*)?'
+    r'(?P<arrow>(?:<\||\*|o|<)?(?:--|\.\.)(?:\|>|\*|o|>)?)\s*'
+    r'(?:"[^"]*"\s*)?(?P<target>[\w`~.]+)\s*(?::(?P<label>.*))?$'
+)
+ER_RELATION_RE = re.compile(
+    r'(?P<source>[\w-]+|"[^"]*")\s*(?P<cardinality>(?:\|o|\|\||\}o|\}\|)(?:--|\.\.)(?:o\||\|\||o\{|\|\{))'
+    r'\s*(?P<target>[\w-]+|"[^"]*")\s*(?::\s*(?P<label>.*))?$'
+)
+ER_ATTRIBUTE_RE = re.compile(r'(?P<type>[\w\-\[\](),]+)\s+(?P<name>[\w\-\[\]]+)(?P<rest>.*)$')
+STATE_REF = r'\[\*\]|[\w.-]+'
+STATE_TRANSITION_RE = re.compile(rf'(?P<source>{STATE_REF})\s*-->\s*(?P<target>{STATE_REF})\s*(?::(?P<label>.*))?$')
+STATE_DECL_RE = re.compile(r'(?P<id>[\w.-]+)(?::::[\w-]+)?\s*(?::(?P<label>.*))?$')
+NOTE_RE = re.compile(r'[Nn]ote\s+(?P<placement>left of|right of|over)\s+(?P<actors>[^:]+?)\s*(?::(?P<text>.*))?$')
+WORD_RE = re.compile(r'[\w-]+')
+
+ParseErrorBase = namedtuple("ParseErrorBase", ["line", "column", "message"])
+
+class ParseError(ParseErrorBase):
+    """A syntax error at a 1-based line and column"""
+    __slots__ = ()
+
+    def __str__(self) -> str:
+        return f"Line {self.line}, col {self.column}: {self.message}"
+
+# open_blocks: (keyword, line, column) of blocks never closed, outermost first
+Diagram = namedtuple("Diagram", ["kind", "header", "statements", "errors", "open_blocks"])
+
+# --- AST (every statement records the line it came from) ---
+# flowchart
+Node = namedtuple("Node", ["line", "id", "shape", "label", "css_class"])  # shape: opener, "" for a bare id
+Link = namedtuple("Link", ["line", "source", "target", "arrow", "label"])
+Subgraph = namedtuple("Subgraph", ["line", "id", "title"])
+# sequence
+Participant = namedtuple("Participant", ["line", "kind", "id", "alias"])
+Message = namedtuple("Message", ["line", "source", "target", "arrow", "text"])
+# class
+ClassDecl = namedtuple("ClassDecl", ["line", "name"])
+Member = namedtuple("Member", ["line", "class_name", "text"])
+Relation = namedtuple("Relation", ["line", "source", "target", "arrow", "label"])
+# er
+Entity = namedtuple("Entity", ["line", "name"])
+Attribute = namedtuple("Attribute", ["line", "entity", "type", "name", "extra"])
+Relationship = namedtuple("Relationship", ["line", "source", "cardinality", "target", "label"])
+# state
+State = namedtuple("State", ["line", "id", "label"])
+Transition = namedtuple("Transition", ["line", "source", "target", "label"])
+# shared
+Note = namedtuple("Note", ["line", "placement", "targets", "text"])
+Block = namedtuple("Block", ["line", "keyword", "text"])  # sequence loop/alt/..., composite state
+End = namedtuple("End", ["line", "keyword"])  # closes a Subgraph or Block
+Directive = namedtuple("Directive", ["line", "keyword", "text"])  # classDef, style, activate, ...
+
+class _Abort(Exception):
+    """Stop parsing the current line (its error is already recorded)"""
+
+class MermaidParser:
+    """
+    Incremental Mermaid parser: feed() text as it arrives (e.g. while a response streams),
+    close() for the Diagram. Each line is parsed once, left to right, so the cost is linear
+    in the input; errors carry the line and column they were found at.
+    Flowchart, sequence, class, ER and state diagrams are parsed into statements; other
+    types (journey, gantt, mindmap, pie, gitGraph) are checked for their header and
+    balanced brackets outside quotes.
+    """
+
+    def __init__(self):
+        self.kind = None
+        self.header = None
+        self.statements = []
+        self.errors = []
+        self._pending = []  # Text of the current, not yet complete line
+        self._line = 0
+        self._blocks = []  # (keyword, line, column, name) of open subgraphs/blocks
+        self._in_note = False  # stateDiagram multi-line note
+        self._text_close_miss = 0  # Per flowchart line: no `-- text -->` closes after this index
+
+    # --- input ---
+
+    def feed(self, text: str) -> None:
+        if '\n' not in text:
+            self._pending.append(text)
+            return
+        head, *middle, tail = text.split('\n')
+        self._pending.append(head)
+        self._parse_line(''.join(self._pending))
+        for line in middle:
+            self._parse_line(line)
+        self._pending = [tail]
+
+    def close(self) -> Diagram:
+        if self._pending:
+            self._parse_line(''.join(self._pending))
+            self._pending = []
+        if self.kind is None:
+            self.errors.append(ParseError(max(self._line, 1), 1, "Empty diagram code"))
+        for keyword, line, column, _ in reversed(self._blocks):
+            closer = "'}'" if keyword in BRACE_BLOCKS else "'end'"
+            self.errors.append(ParseError(line, column, f"'{keyword}' opened here is never closed with {closer}"))
+        if self._in_note:
+            self.errors.append(ParseError(self._line, 1, "note is never closed with 'end note'"))
+        open_blocks = [(keyword, line, column) for keyword, line, column, _ in self._blocks]
+        self._blocks = []
+        return Diagram(self.kind, self.header, self.statements, self.errors, open_blocks)
+
+    # --- helpers ---
+
+    def _error(self, column: int, message: str):
+        self.errors.append(ParseError(self._line, column + 1, message))
+        raise _Abort()
+
+    def _emit(self, kind, *fields) -> None:
+        self.statements.append(kind(self._line, *fields))
+
+    def _open(self, keyword: str, offset: int, name: str = None) -> None:
+        self._blocks.append((keyword, self._line, offset + 1, name))
+
+    def _close(self, column: int, keywords: tuple, token: str) -> None:
+        if not self._blocks or self._blocks[-1][0] not in keywords:
+            self._error(column, f"'{token}' without a matching opening statement")
+        keyword = self._blocks.pop()[0]
+        self._emit(End, keyword)
+
+    def _parse_line(self, raw: str) -> None:
+        self._line += 1
+        text = raw.rstrip('\r')
+        stripped = text.strip()
+        if not stripped or stripped.startswith('%%'):
+            return
+        offset = len(text) - len(text.lstrip())
+        try:
+            if self.kind is None:
+                self._parse_header(stripped, offset)
+            elif self.kind == 'invalid':
+                return
+            else:
+                getattr(self, f"_parse_{self.kind}", self._parse_other)(stripped, offset)
+        except _Abort:
+            pass
+
+    def _parse_header(self, text: str, offset: int) -> None:
+        word, _, rest = text.partition(' ')
+        if word not in HEADER_KINDS and not word.startswith(DIAGRAM_HEADERS):
+            self.kind = 'invalid'
+            self._error(offset, f"Invalid diagram type: {text[:50]} (expected one of {', '.join(DIAGRAM_HEADERS)})")
+        self.kind = HEADER_KINDS.get(word, 'other')
+        self.header = text
+        direction = rest.strip().rstrip(';')
+        if self.kind == 'flowchart' and direction and direction not in DIRECTIONS:
+            self._error(offset + len(word) + 1, f"Unknown direction '{direction}' (use {', '.join(DIRECTIONS)})")
+
+    # --- flowchart ---
+
+    def _parse_flowchart(self, text: str, offset: int) -> None:
+        word = WORD_RE.match(text)
+        keyword = word.group(0) if word else ''
+        rest = text[len(keyword):].strip()
+
+        if keyword == 'end' and rest in ('', ';'):
+            self._close(offset, ('subgraph',), 'end')
+            return
+        if keyword == 'subgraph':
+            if not rest:
+                self._error(offset + len(text), "subgraph needs an id or a title")
+            subgraph_id, _, title = rest.partition('[')
+            self._emit(Subgraph, subgraph_id.strip(), title.rstrip(']').strip('"') or subgraph_id.strip())
+            self._open('subgraph', offset)
+            return
+        if keyword in FLOWCHART_DIRECTIVES and (rest or keyword == 'direction') and not rest.startswith(('-', '=', '.', '&', ':::', '[', '(', '{', '>')):
+            if keyword == 'direction' and rest not in DIRECTIONS:
+                self._error(offset + len(keyword), f"Unknown direction '{rest}'")
+            if not rest:
+                self._error(offset + len(keyword), f"'{keyword}' needs arguments")
+            self._emit(Directive, keyword, rest)
+            return
+
+        self._text_close_miss = len(text) + 1
+        pos = 0
+        while pos < len(text):
+            pos = self._parse_chain(text, pos, offset)
+            pos = _skip_space(text, pos)
+            if pos < len(text) and text[pos] == ';':
+                pos = _skip_space(text, pos + 1)
+
+    def _parse_chain(self, text: str, pos: int, offset: int) -> int:
+        """One `A & B --> C -->|x| D` statement; returns the position after it"""
+        sources, pos = self._parse_group(text, pos, offset)
+        while True:
+            pos = _skip_space(text, pos)
+            if pos >= len(text) or text[pos] == ';':
+                return pos
+            arrow, label, pos = self._parse_link(text, pos, offset)
+            targets, pos = self._parse_group(text, pos, offset)
+            for source in sources:
+                for target in targets:
+                    self._emit(Link, source, target, arrow, label)
+            sources = targets
+
+    def _parse_group(self, text: str, pos: int, offset: int) -> tuple:
+        ids = []
+        while True:
+            node_id, pos = self._parse_node(text, _skip_space(text, pos), offset)
+            ids.append(node_id)
+            pos = _skip_space(text, pos)
+            if pos < len(text) and text[pos] == '&':
+                pos += 1
+                continue
+            return ids, pos
+
+    def _parse_node(self, text: str, pos: int, offset: int) -> tuple:
+        start = pos
+        while pos < len(text) and (text[pos].isalnum() or text[pos] == '_' or (
+                text[pos] in '.-' and pos + 1 < len(text) and (text[pos + 1].isalnum() or text[pos + 1] == '_'))):
+            pos += 1
+        node_id = text[start:pos]
+        if not node_id:
+            found = text[pos:pos + 10] or 'end of line'
+            self._error(offset + pos, f"Expected a node id, found '{found}'")
+        if node_id == 'end':
+            self._error(offset + start, "'end' can't be used as a node id (it closes subgraphs; use End or end_node)")
+
+        shape, label = "", None
+        for opener, closers in NODE_SHAPES:
+            if text.startswith(opener, pos):
+                shape = opener
+                label, pos = self._parse_label(text, pos + len(opener), closers, offset)
+                break
+
+        css_class = None
+        if text.startswith(':::', pos):
+            match = WORD_RE.match(text, pos + 3)
+            if not match:
+                self._error(offset + pos + 3, "Expected a class name after ':::'")
+            css_class, pos = match.group(0), match.end()
+
+        # "user service[X]": a second word right after a node means the id has a space in it
+        after = _skip_space(text, pos)
+        if after > pos and after < len(text) and (text[after].isalnum() or text[after] == '_'):
+            self._error(offset + after, f"Unexpected '{WORD_RE.match(text, after).group(0)}' after node '{node_id}' (node ids can't contain spaces)")
+
+        self._emit(Node, node_id, shape, label, css_class)
+        return node_id, pos
+
+    def _parse_label(self, text: str, pos: int, closers: tuple, offset: int) -> tuple:
+        start = pos
+        if text.startswith('"', pos):
+            end = text.find('"', pos + 1)
+            if end < 0:
+                self._error(offset + pos, "Unterminated quoted label")
+            pos = end + 1
+            for closer in closers:
+                if text.startswith(closer, pos):
+                    return text[start + 1:end], pos + len(closer)
+            self._error(offset + pos, f"Expected '{closers[0]}' to close the node shape")
+
+        while pos < len(text):
+            for closer in closers:
+                if text.startswith(closer, pos):
+                    return text[start:pos], pos + len(closer)
+            char = text[pos]
+            if char in BRACKET_PAIRS or char in CLOSING_BRACKETS or char == '"':
+                self._error(offset + pos, f"Unquoted '{char}' in label; wrap the label in double quotes")
+            pos += 1
+        self._error(offset + start - 1, f"Node shape is never closed with '{closers[0]}'")
+
+    def _parse_link(self, text: str, pos: int, offset: int) -> tuple:
+        """(arrow, label, position after) for `-->`, `-->|text|` or `-- text -->`"""
+        match = FLOW_TEXT_OPEN_RE.match(text, pos)
+        if match and match.end() < self._text_close_miss:
+            close = FLOW_TEXT_CLOSE_RE.search(text, match.end())
+            if close is None:
+                self._text_close_miss = match.end()  # No later `-- text` can close either; keeps the line linear
+            elif '|' not in text[match.end():close.start()]:
+                start = '<' if match.group(0).startswith('<') else ''
+                return start + close.group(1), text[match.end():close.start()].strip(), close.end()
+
+        match = FLOW_ARROW_RE.match(text, pos)
+        if not match:
+            found = text[pos:pos + 10]
+            self._error(offset + pos, f"Expected an arrow (-->, ---, -.->, ==>), found '{found}'")
+        arrow = match.group(0)
+        if match.group('start') and not match.group('head'):
+            self._error(offset + pos, f"Arrow '{arrow}' points backwards; write it as target --> source")
+        if match.group('body') in ('--', '==') and not match.group('head'):
+            self._error(offset + pos, f"Incomplete arrow '{arrow}' (use {arrow[-1] * 3} or {arrow}>)")
+        pos = match.end()
+
+        label = None
+        if text.startswith('|', pos):
+            end = text.find('|', pos + 1)
+            if end < 0:
+                self._error(offset + pos, "Link label is never closed with '|'")
+            label, pos = text[pos + 1:end].strip(), end + 1
+        return arrow, label, pos
+
+    # --- sequence ---
+
+    def _parse_sequence(self, text: str, offset: int) -> None:
+        word = WORD_RE.match(text)
+        keyword = word.group(0) if word else ''
+        rest = text[len(keyword):].strip()
+
+        if keyword == 'create':
+            keyword, _, rest = rest.partition(' ')
+            rest = rest.strip()
+        if keyword in ('participant', 'actor'):
+            if not rest:
+                self._error(offset + len(text), f"'{keyword}' needs a name")
+            name, _, alias = rest.partition(' as ')
+            self._emit(Participant, keyword, name.strip(), alias.strip() or None)
+            return
+        if keyword in ('loop', 'alt', 'opt', 'par', 'critical', 'break', 'rect', 'box'):
+            self._emit(Block, keyword, rest)
+            self._open(keyword, offset)
+            return
+        if keyword in ('else', 'and', 'option'):
+            parent = {'else': 'alt', 'and': 'par', 'option': 'critical'}[keyword]
+            if not self._blocks or self._blocks[-1][0] != parent:
+                self._error(offset, f"'{keyword}' is only valid inside a '{parent}' block")
+            self._emit(Block, keyword, rest)
+            return
+        if keyword == 'end' and not rest:
+            self._close(offset, ('loop', 'alt', 'opt', 'par', 'critical', 'break', 'rect', 'box'), 'end')
+            return
+        if keyword in ('activate', 'deactivate', 'destroy', 'autonumber', 'title', 'link', 'links'):
+            self._emit(Directive, keyword, rest)
+            return
+        if keyword.lower() == 'note':
+            self._parse_note(text, offset)
+            return
+
+        head, colon, message = text.partition(':')
+        match = SEQUENCE_ARROW_RE.search(head)
+        if not match:
+            self._error(offset, f"Unrecognized statement '{text[:40]}' (expected a message like A->>B: text)")
+        source = head[:match.start()].strip()
+        if not source:
+            self._error(offset, "Message is missing its sender")
+        after = match.end()
+        if after < len(head) and head[after] in '+-':
+            after += 1
+        target = head[after:]
+        if not target.strip():
+            self._error(offset + after, "Message is missing its receiver")
+        if not colon:
+            self._error(offset + len(text), "Message needs ': text' after the receiver")
+        self._emit(Message, source, target.strip(), match.group(0), message.strip())
+
+    def _parse_note(self, text: str, offset: int) -> None:
+        match = NOTE_RE.match(text)
+        if not match:
+            self._error(offset, "Expected 'note left of|right of|over <name>: text'")
+        if match.group('text') is None:
+            if self.kind != 'state':
+                self._error(offset + len(text), "Note needs ': text'")
+            self._in_note = True  # stateDiagram: text follows until 'end note'
+        targets = [target.strip() for target in match.group('actors').split(',')]
+        self._emit(Note, match.group('placement'), targets, (match.group('text') or '').strip())
+
+    # --- class ---
+
+    def _parse_class(self, text: str, offset: int) -> None:
+        if self._blocks and self._blocks[-1][0] == 'class':
+            if text == '}':
+                self._close(offset, ('class',), '}')
+            else:
+                self._emit(Member, self._blocks[-1][3], text)
+            return
+
+        word = WORD_RE.match(text)
+        keyword = word.group(0) if word else ''
+        rest = text[len(keyword):].strip()
+
+        if keyword == 'class' and rest:
+            name = re.match(r'[\w`~.]+', rest)
+            if not name:
+                self._error(offset + len(keyword) + 1, "Expected a class name")
+            self._emit(ClassDecl, name.group(0))
+            tail = rest[name.end():].strip()
+            if tail.endswith('{'):
+                self._open('class', offset, name.group(0))
+            elif tail and not tail.startswith(('[', ':::', '<<')):
+                self._error(offset + len(text) - len(tail), f"Unexpected '{tail[:20]}' after class name")
+            return
+        if keyword.lower() == 'note' or keyword in ('direction', 'classDef', 'cssClass', 'style', 'click', 'link', 'callback') or text.startswith('<<'):
+            self._emit(Directive, keyword or 'annotation', rest or text)
+            return
+
+        match = CLASS_RELATION_RE.match(text)
+        if match:
+            self._emit(Relation, match.group('source'), match.group('target'), match.group('arrow'), (match.group('label') or '').strip())
+            return
+        name, colon, member = text.partition(':')
+        if colon and re.fullmatch(r'[\w`~.]+', name.strip()):
+            self._emit(Member, name.strip(), member.strip())
+            return
+        self._error(offset, f"Unrecognized statement '{text[:40]}' (expected a class, member or relation like A <|-- B)")
+
+    # --- er ---
+
+    def _parse_er(self, text: str, offset: int) -> None:
+        if self._blocks and self._blocks[-1][0] == 'entity':
+            if text == '}':
+                self._close(offset, ('entity',), '}')
+                return
+            match = ER_ATTRIBUTE_RE.match(text)
+            if not match:
+                self._error(offset, "Expected an attribute like 'string name PK'")
+            self._emit(Attribute, self._blocks[-1][3], match.group('type'), match.group('name'), match.group('rest').strip())
+            return
+
+        match = ER_RELATION_RE.match(text)
+        if match:
+            if not (match.group('label') or '').strip():
+                self._error(offset + len(text), "Relationship needs a label (': label')")
+            self._emit(Relationship, match.group('source'), match.group('cardinality'), match.group('target'), match.group('label').strip())
+            return
+
+        name = re.match(r'([\w-]+|"[^"]*")(?:\["[^"]*"\])?', text)
+        if not name:
+            self._error(offset, f"Unrecognized statement '{text[:40]}'")
+        rest = text[name.end():].strip()
+        if rest == '{':
+            self._emit(Entity, name.group(1))
+            self._open('entity', offset, name.group(1))
+        elif not rest:
+            self._emit(Entity, name.group(1))
+        else:
+            self._error(offset + name.end(), f"Expected a relationship like A ||--o{{ B : label, found '{rest[:20]}'")
+
+    # --- state ---
+
+    def _parse_state(self, text: str, offset: int) -> None:
+        if self._in_note:
+            if text in ('end note', 'end'):
+                self._in_note = False
+            return
+
+        if text == '}':
+            self._close(offset, ('state',), '}')
+            return
+        if text == '--':
+            if not self._blocks:
+                self._error(offset, "'--' only separates regions inside a composite state")
+            return
+
+        word = WORD_RE.match(text)
+        keyword = word.group(0) if word else ''
+        rest = text[len(keyword):].strip()
+
+        if keyword == 'state' and rest:
+            described = re.match(r'"([^"]*)"\s+as\s+([\w.-]+)', rest)
+            if described:
+                state_id, label, tail = described.group(2), described.group(1), rest[described.end():].strip()
+            else:
+                name = re.match(r'[\w.-]+', rest)
+                if not name:
+                    self._error(offset + len(keyword) + 1, "Expected a state name")
+                state_id, label, tail = name.group(0), None, rest[name.end():].strip()
+            self._emit(State, state_id, label)
+            if tail == '{':
+                self._emit(Block, 'state', state_id)
+                self._open('state', offset, state_id)
+            elif tail and not tail.startswith(('<<', ':::')):
+                self._error(offset + len(text) - len(tail), f"Unexpected '{tail[:20]}' after state name")
+            return
+        if keyword.lower() == 'note':
+            self._parse_note(text, offset)
+            return
+        if keyword in ('direction', 'classDef', 'class', 'style', 'click', 'hide'):
+            self._emit(Directive, keyword, rest)
+            return
+
+        match = STATE_TRANSITION_RE.match(text)
+        if match:
+            self._emit(Transition, match.group('source'), match.group('target'), (match.group('label') or '').strip())
+            return
+        match = STATE_DECL_RE.match(text)
+        if match:
+            self._emit(State, match.group('id'), (match.group('label') or '').strip() or None)
+            return
+        self._error(offset, f"Unrecognized statement '{text[:40]}' (expected a transition like A --> B)")
+
+    # --- everything else ---
+
+    def _parse_other(self, text: str, offset: int) -> None:
+        """Types without a statement grammar here: brackets outside quotes must balance"""
+        stack = []
+        in_quote = False
+        for index, char in enumerate(text):
+            if char == '"':
+                in_quote = not in_quote
+            elif in_quote:
+                continue
+            elif char in BRACKET_PAIRS:
+                stack.append((char, index))
+            elif char in CLOSING_BRACKETS:
+                if not stack or stack[-1][0] != CLOSING_BRACKETS[char]:
+                    self._error(offset + index, f"Unmatched '{char}'")
+                stack.pop()
+        if in_quote:
+            self._error(offset + text.rindex('"'), "Unterminated quote")
+        if stack:
+            char, index = stack[-1]
+            self._error(offset + index, f"'{char}' is never closed with '{BRACKET_PAIRS[char]}'")
+
+def _skip_space(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in ' \t':
+        pos += 1
+    return pos
+
+def parse_mermaid(code: str) -> Diagram:
+    """Parse a complete diagram"""
+    parser = MermaidParser()
+    parser.feed(code.strip())
+    return parser.close()
@@ -0,0 +1,363 @@
+# shared/mermaid_tools/repair.py - DETERMINISTIC MERMAID REPAIR
+import re
+from collections import namedtuple
+
+from .parser import parse_mermaid, DIAGRAM_HEADERS, NODE_SHAPES, BRACKET_PAIRS, CLOSING_BRACKETS, BRACE_BLOCKS
+
+# Flowchart statements that aren't node/edge chains (rename node ids in them, nothing else)
+DIRECTIVE_PREFIXES = ('classDef', 'class ', 'style ', 'linkStyle', 'click ', 'direction ')
+
+ARROW_RE = re.compile(r'(?P<start><)?(?P<body>-{2,}|={2,}|-?\.+-|\.{2,}(?=>)|-(?=>)|~{3,})(?P<head>>|[xo](?=[\s|]|$))?')
+# "A -- text --> B" style labels
+TEXT_EDGE_RE = re.compile(
+    r'(?P<start><)?(?P<open>--|==|-\.)\s*(?P<text>[^\s\-=.>|][^|]*?)\s*'
+    r'(?P<close>-{2,}[>xo]?|={2,}>?|\.+-+>?)(?=\s|$|[\w"])'
+)
+PIPE_LABEL_RE = re.compile(r'\s*\|(?P<label>[^|]*)\|')
+CLASS_SUFFIX_RE = re.compile(r':::[\w-]+')
+# Label characters Mermaid would read as syntax unless the label is quoted
+LABEL_SPECIAL_CHARS = set('[](){}<>|"')
+
+# A flowchart node reference; opener/closer are "" for a bare id
+Node = namedtuple("Node", ["id", "opener", "label", "closer", "css_class"])
+# reverse: written backwards ("A <-- B"), arrow already points the right way
+Edge = namedtuple("Edge", ["arrow", "label", "reverse"])
+
+RepairResult = namedtuple("RepairResult", ["code", "fixes"])
+
+class MermaidParseError(ValueError):
+    pass
+
+def strip_code_fences(code: str) -> str:
+    """Drop ```mermaid fences and any chatter before the diagram header"""
+    code = code.strip()
+    fenced = re.search(r'```(?:mermaid)?\s*\n(.*?)(?:\n```|$)', code, re.S)
+    if fenced:
+        code = fenced.group(1)
+    lines = code.replace('\r\n', '\n').split('\n')
+    for index, line in enumerate(lines):
+        if line.strip().startswith(DIAGRAM_HEADERS):
+            lines = lines[index:]
+            break
+    return '\n'.join(lines).strip('\n')
+
+def balance_brackets(line: str) -> str:
+    """Drop stray closing brackets and close unclosed ones at the end of the line (quoted text is left alone)"""
+    stack = []
+    out = []
+    in_quote = False
+    for char in line:
+        if char == '"':
+            in_quote = not in_quote
+        elif not in_quote and char in BRACKET_PAIRS:
+            stack.append(char)
+        elif not in_quote and char in CLOSING_BRACKETS:
+            if stack and stack[-1] == CLOSING_BRACKETS[char]:
+                stack.pop()
+            else:
+                continue
+        out.append(char)
+    if in_quote:
+        out.append('"')
+    out.extend(BRACKET_PAIRS[char] for char in reversed(stack))
+    return ''.join(out)
+
+def normalize_arrow(start: str, body: str, head: str) -> tuple:
+    """(canonical arrow, reversed) for an arrow as written, e.g. '---->' -> '-->', '..>' -> '-.->'"""
+    if '~' in body:
+        return '~~~', False
+    style = '.' if '.' in body else ('=' if '=' in body else '-')
+    if head:
+        arrow = {'-': '--', '=': '==', '.': '-.-'}[style] + head
+        if head == '>' and style == '.':
+            arrow = '-.->'
+        return ('<' + arrow if start and head == '>' else arrow), False
+    arrow = {'-': '---', '=': '===', '.': '-.-'}[style]
+    # "A <-- B" has no direct Mermaid form: flip it into "B --> A"
+    if start:
+        return {'-': '-->', '=': '==>', '.': '-.->'}[style], True
+    return arrow, False
+
+class FlowchartLineParser:
+    """Parse one flowchart statement (`A[x] --> B & C`) into [[Node, ...], Edge, [Node, ...], ...]"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.fixes = []
+        self.renames = {}  # id as written -> fixed id
+
+    def _skip_space(self) -> None:
+        while self.pos < len(self.text) and self.text[self.pos].isspace():
+            self.pos += 1
+
+    def _at_end(self) -> bool:
+        self._skip_space()
+        return self.pos >= len(self.text)
+
+    def _arrow_at(self, index: int):
+        return TEXT_EDGE_RE.match(self.text, index) or ARROW_RE.match(self.text, index)
+
+    def _is_arrow_start(self, index: int) -> bool:
+        text = self.text
+        if text.startswith(('--', '==', '-.', '->', '~~~', '<-', '<=', '..'), index):
+            return self._arrow_at(index) is not None
+        return False
+
+    def parse(self) -> list:
+        chain = [self._parse_group()]
+        while not self._at_end():
+            edge = self._parse_edge()
+            chain.append(edge)
+            chain.append(self._parse_group())
+        return chain
+
+    def _parse_group(self) -> list:
+        nodes = [self._parse_node()]
+        while not self._at_end() and self.text[self.pos] == '&':
+            self.pos += 1
+            nodes.append(self._parse_node())
+        return nodes
+
+    def _parse_node(self) -> Node:
+        self._skip_space()
+        text = self.text
+        start = self.pos
+        while self.pos < len(text):
+            char = text[self.pos]
+            if char in '[({' or char == '&' or text.startswith(':::', self.pos):
+                break
+            if char == '>' and self.pos > start and not text[self.pos - 1].isspace():
+                break
+            if self._is_arrow_start(self.pos):
+                break
+            self.pos += 1
+
+        raw_id = text[start:self.pos].strip()
+        if not raw_id:
+            raise MermaidParseError(f"expected a node at: {text[start:start + 30]}")
+        node_id = re.sub(r'\s+', '_', raw_id)
+        if node_id == 'end':
+            node_id = 'end_node'  # A bare "end" closes the subgraph instead
+        if node_id != raw_id:
+            self.renames[raw_id] = node_id
+            self.fixes.append(f"node id '{raw_id}' -> '{node_id}'")
+
+        opener, label, closer = "", None, ""
+        for shape_opener, closers in NODE_SHAPES:
+            if text.startswith(shape_opener, self.pos):
+                opener = shape_opener
+                self.pos += len(shape_opener)
+                label, closer = self._parse_label(closers)
+                break
+
+        css_class = None
+        suffix = CLASS_SUFFIX_RE.match(text, self.pos)
+        if suffix:
+            css_class = suffix.group(0)[3:]
+            self.pos = suffix.end()
+
+        return Node(node_id, opener, label, closer, css_class)
+
+    def _parse_label(self, closers: tuple) -> tuple:
+        """(label, closer) after a shape opener; unclosed or mismatched shapes are closed"""
+        text = self.text
+        start = self.pos
+
+        if text.startswith('"', start):
+            end = text.find('"', start + 1)
+            if end < 0:
+                self.fixes.append("closed quoted label")
+                end = len(text)
+                cut = self._arrow_cut(start + 1)
+                if cut is not None:
+                    end = cut
+                label = text[start + 1:end].rstrip()
+                self.pos = end
+                return label, closers[0]
+            label = text[start + 1:end]
+            self.pos = end + 1
+            for closer in closers:
+                if text.startswith(closer, self.pos):
+                    self.pos += len(closer)
+                    return label, closer
+            self.fixes.append("closed node shape")
+            return label, closers[0]
+
+        stack = []
+        index = start
+        while index < len(text):
+            if not stack:
+                for closer in closers:
+                    if text.startswith(closer, index):
+                        self.pos = index + len(closer)
+                        return text[start:index], closer
+            char = text[index]
+            if char in BRACKET_PAIRS:
+                stack.append(char)
+            elif char in CLOSING_BRACKETS:
+                if stack and stack[-1] == CLOSING_BRACKETS[char]:
+                    stack.pop()
+                elif char == closers[0][-1] or not stack:
+                    # Wrong closer (A(text]) or inner brackets left open: end the label here
+                    self.fixes.append(f"mismatched bracket in label '{text[start:index]}'")
+                    self.pos = index + 1
+                    return text[start:index], closers[0]
+            index += 1
+
+        # Never closed: the label runs up to the next arrow (or the end of the line)
+        cut = self._arrow_cut(start)
+        end = len(text) if cut is None else cut
+        self.fixes.append(f"closed unclosed label '{text[start:end].strip()}'")
+        self.pos = end
+        return text[start:end].rstrip(), closers[0]
+
+    def _arrow_cut(self, start: int):
+        """Index of the first arrow preceded by whitespace after start, if any"""
+        for match in re.finditer(r'\s', self.text[start:]):
+            index = start + match.end()
+            if self._is_arrow_start(index):
+                return index
+        return None
+
+    def _parse_edge(self) -> Edge:
+        text = self.text
+        match = TEXT_EDGE_RE.match(text, self.pos)
+        if match:
+            # "A -- text --> B" is written as "A -->|text| B"
+            close = match.group('close')
+            head = close[-1] if close[-1] in '>xo' else ''
+            body = match.group('open') + close[:len(close) - len(head)]
+            label = match.group('text').strip()
+        else:
+            match = ARROW_RE.match(text, self.pos)
+            if not match:
+                raise MermaidParseError(f"expected an arrow at: {text[self.pos:self.pos + 30]}")
+            body, head, label = match.group('body'), match.group('head') or '', None
+        self.pos = match.end()
+
+        arrow, reverse = normalize_arrow(match.group('start') or '', body, head)
+        if label is None:
+            pipe = PIPE_LABEL_RE.match(text, self.pos)
+            if pipe:
+                label = pipe.group('label').strip()
+                self.pos = pipe.end()
+            if arrow != match.group(0) and not reverse:
+                self.fixes.append(f"arrow '{match.group(0)}' -> '{arrow}'")
+        return Edge(arrow, label, reverse)
+
+def format_label(label: str) -> str:
+    """Label text as it goes between shape brackets, quoted when it contains Mermaid syntax"""
+    if label is None:
+        return ""
+    if label.startswith('"') and label.endswith('"') and len(label) > 1:
+        label = label[1:-1]
+    if label.startswith('`') and label.endswith('`') and len(label) > 1:
+        return '"' + label + '"'  # Markdown string: only read as markdown inside quotes
+    if any(char in LABEL_SPECIAL_CHARS for char in label):
+        return '"' + label.replace('"', '#quot;') + '"'
+    return label
+
+def format_node(node: Node) -> str:
+    text = node.id
+    if node.opener:
+        text += node.opener + format_label(node.label) + node.closer
+    if node.css_class:
+        text += ':::' + node.css_class
+    return text
+
+def format_chain(chain: list) -> str:
+    """Serialize a parsed chain"""
+    # A backwards edge can only be flipped when it is the whole statement
+    if len(chain) == 3 and chain[1].reverse:
+        chain = [chain[2], chain[1], chain[0]]
+
+    parts = []
+    for index, item in enumerate(chain):
+        if index % 2 == 0:
+            parts.append(' & '.join(format_node(node) for node in item))
+            continue
+        arrow = item.arrow
+        if item.reverse and len(chain) != 3:
+            arrow = {'-->': '---', '==>': '===', '-.->': '-.-'}[arrow]
+        label = f"|{item.label.replace('|', '/')}|" if item.label else ""
+        parts.append(f"{arrow}{label}")
+    return ' '.join(parts)
+
+def repair_flowchart_line(line: str, renames: dict) -> tuple:
+    """(repaired line, fixes) for one flowchart statement; node id renames are added to renames"""
+    indent = line[:len(line) - len(line.lstrip())]
+    body = line.strip()
+    terminator = ';' if body.endswith(';') else ''
+    body = body.rstrip(';').rstrip()
+
+    parser = FlowchartLineParser(body)
+    chain = parser.parse()
+    renames.update(parser.renames)
+    if any(edge.reverse for edge in chain[1::2]):
+        parser.fixes.append("flipped backwards '<--' edge")
+    return indent + format_chain(chain) + terminator, parser.fixes
+
+def _rename_ids(line: str, renames: dict) -> str:
+    for old in sorted(renames, key=len, reverse=True):
+        line = re.sub(rf'(?<![\w]){re.escape(old)}(?![\w])', renames[old], line)
+    return line
+
+def repair_mermaid(code: str) -> RepairResult:
+    """
+    Fix common LLM Mermaid mistakes without another model call
+    - Code fences and text before the diagram header are dropped
+    - Diagrams that already parse are returned as they are; otherwise only the lines
+      the parser reports are touched
+    - Flowchart statements are re-parsed: unclosed or mismatched node shapes are closed,
+      labels with brackets/quotes are quoted, node ids with spaces get underscores (everywhere
+      the id is used), and arrows are normalized ('<--' is flipped, '..>' -> '-.->');
+      node-shape lines that still don't parse get their brackets balanced
+    - Blocks left open (subgraph, alt, class {, ...) are closed at the end
+    Other lines are never rewritten: in class, ER and state diagrams '{', '}' delimit blocks
+    or are part of cardinalities like '}o--o{'. Indentation is kept (mindmaps depend on it).
+    """
+    code = strip_code_fences(code)
+    lines = code.split('\n')
+    if not lines or not lines[0].strip():
+        return RepairResult(code, [])
+    diagram = parse_mermaid(code)
+    if not diagram.errors:
+        return RepairResult(code, [])
+    error_lines = {error.line for error in diagram.errors}
+
+    is_flowchart = lines[0].strip().startswith(('graph', 'flowchart'))
+    fixes = []
+    renames = {}
+    repaired = [lines[0].rstrip()]
+    directive_lines = []
+
+    for number, line in enumerate(lines[1:], start=2):
+        stripped = line.strip()
+        if is_flowchart and stripped.startswith(DIRECTIVE_PREFIXES):
+            directive_lines.append(len(repaired))
+            repaired.append(line.rstrip())
+            continue
+
+        if number not in error_lines or not is_flowchart or stripped.startswith(('%%', 'subgraph')) or stripped == 'end':
+            repaired.append(line.rstrip())
+            continue
+
+        try:
+            fixed, line_fixes = repair_flowchart_line(line.rstrip(), renames)
+            fixes.extend(line_fixes)
+        except MermaidParseError:
+            fixed = balance_brackets(line.rstrip())
+            if fixed != line.rstrip():
+                fixes.append(f"balanced brackets in '{stripped[:40]}'")
+        repaired.append(fixed)
+
+    for index in directive_lines:
+        repaired[index] = _rename_ids(repaired[index], renames)
+
+    for keyword, line, column in reversed(diagram.open_blocks):
+        indent = lines[line - 1][:column - 1]
+        repaired.append(indent + ('}' if keyword in BRACE_BLOCKS else 'end'))
+        fixes.append(f"closed '{keyword}' block opened on line {line}")
+
+    return RepairResult('\n'.join(repaired), fixes)
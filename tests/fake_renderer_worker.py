@@ -0,0 +1,22 @@
+# tests/fake_renderer_worker.py - STAND-IN FOR backend/renderer/mermaid_worker.mjs
+# Speaks the worker protocol; the image is "<pid>:<code>", "crash" exits mid-request, "bad" fails to render
+import os
+import sys
+import json
+import base64
+
+def send(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+send({"ready": True})
+
+for line in sys.stdin:
+    request = json.loads(line)
+    if "crash" in request["code"]:
+        sys.exit(1)
+    if "bad" in request["code"]:
+        send({"id": request["id"], "ok": False, "error": "Parse error on line 1"})
+        continue
+    image = f"{os.getpid()}:{request['code']}".encode('utf-8')
+    send({"id": request["id"], "ok": True, "data": base64.b64encode(image).decode('ascii')})
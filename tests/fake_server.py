@@ -0,0 +1,71 @@
+# tests/fake_server.py - LOCAL HTTP SERVER FOR TESTS AGAINST FAKE UPSTREAMS
+import json
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# What the handler saw; headers are lower-cased
+Request = namedtuple("Request", ["method", "path", "headers", "body"])
+# delay: seconds to wait before answering
+Reply = namedtuple("Reply", ["status", "body", "headers", "delay"], defaults=[None, 0.0])
+
+class FakeServer:
+    """
+    Threaded HTTP server on a free localhost port; handler(Request) -> Reply
+    Records every request and every TCP connection it accepted.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse is visible
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def _answer(self):
+                length = int(self.headers.get("content-length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                request = Request(
+                    self.command, self.path, {k.lower(): v for k, v in self.headers.items()},
+                    json.loads(raw) if raw else None
+                )
+                with server._lock:
+                    server.requests.append(request)
+                reply = server.handler(request)
+                if reply.delay:
+                    time.sleep(reply.delay)
+                payload = b"" if reply.body is None else json.dumps(reply.body).encode()
+                self.send_response(reply.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (reply.headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _answer
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,277 @@
+# tests/legacy_ingestion.py - PRE-OPTIMIZATION INGESTION CODE, KEPT AS A REFERENCE FOR BENCHMARKS
+# Copied unchanged from backend/services/github_service.py before the parallel and single-pass rewrites;
+# analyze_local_repo called every function below, each walking or probing the checkout itself.
+import os
+
+def build_file_tree_from_disk(repo_path: str, max_depth: int = 6) -> dict:
+    """
+    Build file tree from local repository
+    ✅ ENHANCED: Increased depth for better analysis
+    """
+    
+    skip_dirs = {
+        '.git', 'node_modules', '__pycache__', '.next', 'dist', 'build',
+        'coverage', '.venv', 'venv', 'env', '.idea', '.vscode', 'target',
+        '.pytest_cache', '.mypy_cache', '__pypackages__', 'eggs', '.eggs',
+        'vendor', 'bower_components', '.bundle'
+    }
+    
+    def build_tree(path: str, depth: int = 0) -> dict:
+        if depth > max_depth:
+            return {}
+        
+        tree = {}
+        try:
+            items = os.listdir(path)
+        except PermissionError:
+            return {}
+        
+        for item in items:
+            # Skip hidden files except important ones
+            if item.startswith('.') and item not in ['.env', '.gitignore', '.env.example', '.github']:
+                continue
+            
+            item_path = os.path.join(path, item)
+            
+            try:
+                if os.path.isdir(item_path):
+                    if item not in skip_dirs:
+                        subtree = build_tree(item_path, depth + 1)
+                        if subtree:  # Only add if has contents
+                            tree[item] = {
+                                "type": "dir",
+                                "path": os.path.relpath(item_path, repo_path).replace('\\', '/'),
+                                "contents": subtree
+                            }
+                else:
+                    size = os.path.getsize(item_path)
+                    extension = item.split(".")[-1] if "." in item else "none"
+                    purpose = classify_file_purpose(item, os.path.relpath(item_path, repo_path))
+                    
+                    tree[item] = {
+                        "type": "file",
+                        "path": os.path.relpath(item_path, repo_path).replace('\\', '/'),
+                        "size": size,
+                        "extension": extension,
+                        "purpose": purpose
+                    }
+            except (PermissionError, OSError) as e:
+                continue
+        
+        return tree
+    
+    return build_tree(repo_path)
+
+def classify_file_purpose(filename: str, filepath: str) -> str:
+    """Classify file purpose for better diagram organization"""
+    name_lower = filename.lower()
+    path_lower = filepath.lower()
+    
+    # Test files
+    if any(x in name_lower for x in ["test", "spec", ".test.", "_test", "test_"]):
+        return "testing"
+    
+    # Config files
+    if any(x in name_lower for x in ["config", "setup", ".env", "settings", "conf"]):
+        return "configuration"
+    
+    # Data models
+    if any(x in name_lower for x in ["model", "schema", "entity", "dto"]):
+        return "data_model"
+    
+    # API/Routes
+    if any(x in name_lower for x in ["route", "endpoint", "api", "controller", "handler"]):
+        return "api"
+    
+    # UI Components
+    if any(x in name_lower for x in ["component", "view", "page", "screen", "template"]):
+        return "ui"
+    
+    # Utilities
+    if any(x in name_lower for x in ["util", "helper", "tool", "common"]):
+        return "utility"
+    
+    # Services
+    if any(x in name_lower for x in ["service", "provider", "manager", "factory"]):
+        return "service"
+    
+    # Middleware
+    if any(x in name_lower for x in ["middleware", "interceptor", "filter"]):
+        return "middleware"
+    
+    # Database
+    if any(x in name_lower for x in ["migration", "seed", "database", "db", ".sql"]):
+        return "database"
+    
+    # Dependencies
+    if filename in ["package.json", "requirements.txt", "Cargo.toml", "go.mod", "pom.xml", "build.gradle"]:
+        return "dependencies"
+    
+    # Documentation
+    if any(x in name_lower for x in ["readme", "doc", "docs", ".md"]):
+        return "documentation"
+    
+    return "general"
+
+def read_important_files(repo_path: str, max_files: int = 200) -> dict:
+    """
+    Read important files from repository
+    ✅ ENHANCED: Increased limits for detailed diagram generation
+    - More files: 100 → 200
+    - More content: 20KB → 40KB per file
+    - Larger file size: 200KB → 400KB
+    """
+    important_files = {}
+    
+    code_extensions = {
+        'py', 'js', 'jsx', 'ts', 'tsx', 'java', 'go', 'rs', 'cpp', 'c', 'h',
+        'rb', 'php', 'swift', 'kt', 'kts', 'scala', 'sh', 'bash', 'yml', 'yaml', 
+        'json', 'xml', 'md', 'txt', 'toml', 'ini', 'cfg', 'env', 'sql', 'graphql',
+        'vue', 'svelte', 'css', 'scss', 'sass', 'html', 'htm'
+    }
+    
+    skip_dirs = {
+        '.git', 'node_modules', '__pycache__', '.next', 'dist', 'build',
+        'coverage', '.venv', 'venv', 'env', '.idea', '.vscode', 'target',
+        '.pytest_cache', '.mypy_cache', '__pypackages__', 'vendor'
+    }
+    
+    file_count = 0
+    
+    for root, dirs, files in os.walk(repo_path):
+        # Remove skip directories from traversal
+        dirs[:] = [d for d in dirs if d not in skip_dirs and not d.startswith('.')]
+        
+        for file in files:
+            if file_count >= max_files:
+                break
+            
+            file_path = os.path.join(root, file)
+            rel_path = os.path.relpath(file_path, repo_path).replace('\\', '/')
+            
+            extension = file.split(".")[-1] if "." in file else ""
+            
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                continue
+            
+            # Read if: code file or important config, and under 400KB
+            should_read = (
+                extension in code_extensions or 
+                file in [
+                    "package.json", "requirements.txt", "Dockerfile", "README.md",
+                    "docker-compose.yml", "Makefile", ".env.example", "pyproject.toml",
+                    "go.mod", "Cargo.toml", "pom.xml", "build.gradle", "tsconfig.json"
+                ]
+            )
+            
+            if should_read and size < 400000:  # 400KB limit
+                try:
+                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                        content = f.read()
+                    
+                    purpose = classify_file_purpose(file, rel_path)
+                    
+                    important_files[rel_path] = {
+                        "content": content[:40000],  # First 40KB (increased from 20KB)
+                        "size": size,
+                        "extension": extension,
+                        "purpose": purpose,
+                        "full_size": len(content)
+                    }
+                    
+                    file_count += 1
+                    
+                except Exception as e:
+                    continue
+        
+        if file_count >= max_files:
+            break
+    
+    return important_files
+
+def read_readme_from_disk(repo_path: str) -> str:
+    """Read README file from repository"""
+    readme_files = ["README.md", "README.txt", "README.rst", "README", "readme.md", "Readme.md"]
+    
+    for readme_name in readme_files:
+        readme_path = os.path.join(repo_path, readme_name)
+        if os.path.exists(readme_path):
+            try:
+                with open(readme_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    return f.read()
+            except Exception:
+                continue
+    
+    return ""
+
+def detect_languages(repo_path: str) -> dict:
+    """Detect programming languages in repository"""
+    languages = {}
+    
+    language_extensions = {
+        'Python': ['.py', '.pyw'],
+        'JavaScript': ['.js', '.jsx', '.mjs'],
+        'TypeScript': ['.ts', '.tsx'],
+        'Java': ['.java'],
+        'Go': ['.go'],
+        'Rust': ['.rs'],
+        'C++': ['.cpp', '.cc', '.cxx', '.hpp'],
+        'C': ['.c', '.h'],
+        'Ruby': ['.rb'],
+        'PHP': ['.php'],
+        'Swift': ['.swift'],
+        'Kotlin': ['.kt', '.kts'],
+        'Scala': ['.scala'],
+        'HTML': ['.html', '.htm'],
+        'CSS': ['.css', '.scss', '.sass', '.less'],
+        'Shell': ['.sh', '.bash'],
+        'SQL': ['.sql'],
+        'Vue': ['.vue'],
+        'Svelte': ['.svelte']
+    }
+    
+    skip_dirs = {'.git', 'node_modules', '__pycache__', 'venv', '.venv', 'vendor'}
+    
+    for root, dirs, files in os.walk(repo_path):
+        dirs[:] = [d for d in dirs if d not in skip_dirs]
+        
+        for file in files:
+            ext = os.path.splitext(file)[1]
+            for lang, exts in language_extensions.items():
+                if ext in exts:
+                    languages[lang] = languages.get(lang, 0) + 1
+    
+    return languages
+
+def analyze_dependencies_from_disk(repo_path: str) -> dict:
+    """Analyze dependencies from dependency files"""
+    dependencies = {}
+    
+    dependency_files = {
+        "package.json": "npm",
+        "yarn.lock": "yarn",
+        "requirements.txt": "pip",
+        "Pipfile": "pipenv",
+        "pyproject.toml": "poetry",
+        "Cargo.toml": "cargo",
+        "go.mod": "go",
+        "pom.xml": "maven",
+        "build.gradle": "gradle",
+        "build.gradle.kts": "gradle",
+        "composer.json": "composer",
+        "Gemfile": "bundler"
+    }
+    
+    for dep_file, package_manager in dependency_files.items():
+        file_path = os.path.join(repo_path, dep_file)
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    content = f.read()
+                dependencies[package_manager] = content[:10000]  # First 10KB
+            except Exception:
+                continue
+    
+    return dependencies
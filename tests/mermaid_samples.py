@@ -0,0 +1,65 @@
+# tests/mermaid_samples.py - MERMAID DIAGRAMS SHARED BY THE PARSER AND REPAIR TESTS
+
+# Valid diagrams: the parser finds no errors and repair must return them unchanged
+VALID_DIAGRAMS = {
+    "class": """classDiagram
+    class Animal {
+        +String name
+        +makeSound() void
+    }
+    class Dog
+    Animal <|-- Dog
+    Dog : +fetch()""",
+    "er": """erDiagram
+    CUSTOMER ||--o{ ORDER : places
+    ORDER ||--|{ LINE_ITEM : contains
+    CUSTOMER }|..|{ DELIVERY_ADDRESS : uses
+    PRODUCT }o--|| LINE_ITEM : "ordered in"
+    CUSTOMER {
+        string name
+        string custNumber PK
+    }""",
+    "state": """stateDiagram-v2
+    [*] --> Still
+    state Moving {
+        [*] --> Slow
+        Slow --> Fast
+    }
+    Still --> Moving
+    Moving --> [*]""",
+    "flowchart": """flowchart TD
+    A["`**Markdown** label`"] --> B{Decision}
+    B -->|yes| C[(Database)]
+    B --> D{{Hexagon}}
+    subgraph api [API Layer]
+        E([Gateway]) -.-> F>Queue]
+    end
+    C -- reads --> E
+    classDef hot fill:#f96
+    class C hot""",
+    "sequence": """sequenceDiagram
+    participant U as User
+    participant API
+    U->>API: POST /diagram
+    alt cached
+        API-->>U: 200 cached
+    else
+        API->>API: generate
+        API-->>U: 200
+    end
+    Note over U,API: done""",
+    "mindmap": """mindmap
+  root((RepoVision))
+    Backend
+      FastAPI
+    Frontend[Streamlit]""",
+}
+
+# What LLMs tend to send back: fences, spaces in ids, unquoted brackets, backwards and dotted arrows
+BROKEN_FLOWCHART = """```mermaid
+flowchart LR
+    user service[User Service] --> db[(Postgres]
+    api[API (v2)] ..> user service
+    cache <-- api
+    style user service fill:#f9f
+```"""
@@ -0,0 +1,60 @@
+# tests/synthetic_repo.py - GENERATED REPOSITORY CHECKOUTS FOR INGESTION TESTS AND BENCHMARKS
+import os
+import random
+
+MODULE_NAMES = [
+    "user_service.py", "models.py", "test_api.py", "routes.py", "helpers.js", "index.ts",
+    "App.tsx", "config.yaml", "schema.sql", "handler.go", "main.rs", "page.vue", "README.md",
+    "data.json", "styles.css", "Makefile", "notes.txt", "logo.png", "module.c", "build.sh"
+]
+ROOT_FILES = {
+    "README.md": "# Demo\n\nA generated repository.\n",
+    "requirements.txt": "fastapi==0.104.1\nhttpx==0.25.1\n",
+    "package.json": '{"name": "demo", "dependencies": {"react": "^18.0.0"}}\n',
+    "go.mod": "module example.com/demo\n\ngo 1.21\n",
+    ".env.example": "API_KEY=\n",
+}
+BINARY_EXTENSIONS = ('.png',)
+
+def make_repo(root: str, file_count: int, seed: int = 7, large_every: int = 200, skipped_dirs: bool = True) -> int:
+    """
+    Write a repository of about file_count files under root; returns the number written
+    Files sit up to five directories deep. Every large_every-th file is ~300KB (above the
+    40KB read cap, below the 400KB size limit); .png files hold binary data. node_modules
+    and .git are filled too, since both are skipped by the scans.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    written = 0
+    for name, content in ROOT_FILES.items():
+        _write(os.path.join(root, name), content.encode())
+        written += 1
+
+    text = ("def handler(request):\n    return {'status': 'ok', 'items': [1, 2, 3]}\n" * 40).encode()
+    large = (text * 200)[:300_000]
+    binary = bytes(rng.randrange(256) for _ in range(2048)) + b"\0"
+
+    index = 0
+    while written < file_count:
+        depth = rng.randint(0, 5)
+        parts = [f"pkg{rng.randrange(8)}" if level == 0 else f"mod{rng.randrange(6)}" for level in range(depth)]
+        if skipped_dirs and index % 50 == 0:
+            parts = [rng.choice(["node_modules", ".git"])] + parts
+        name = MODULE_NAMES[index % len(MODULE_NAMES)]
+        stem, dot, extension = name.rpartition('.')
+        name = f"{stem}_{index}{dot}{extension}" if dot else f"{name}_{index}"
+        if name.endswith(BINARY_EXTENSIONS):
+            content = binary
+        elif index % large_every == 0:
+            content = large
+        else:
+            content = text[:rng.randint(200, len(text))]
+        _write(os.path.join(root, *parts, name), content)
+        written += 1
+        index += 1
+    return written
+
+def _write(path: str, content: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
@@ -0,0 +1,123 @@
+# tests/test_analysis_cache.py - SINGLE-FLIGHT ANALYSIS CACHE UNDER CONCURRENT LOAD
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from services import analysis_cache
+
+REPO_URL = "https://github.com/octo/demo"
+CONCURRENT_REQUESTS = 50
+
+class FakeAnalysis:
+    """Stands in for the clone-and-analyze step: counts runs and takes `seconds` of (non-blocking) time"""
+
+    def __init__(self, seconds: float = 0.2, fail_first: bool = False):
+        self.seconds = seconds
+        self.fail_first = fail_first
+        self.runs = []
+
+    async def __call__(self, repo_url, github_token=None, commit_sha=None, subdirectory=""):
+        self.runs.append((commit_sha, subdirectory))
+        await asyncio.sleep(self.seconds)
+        if self.fail_first and len(self.runs) == 1:
+            raise RuntimeError("clone failed")
+        return {"name": "demo", "commit_sha": commit_sha, "file_contents": {}, "timings": {"clone": self.seconds}}
+
+@pytest.fixture
+def fake_repo(monkeypatch):
+    """Fresh cache state; the remote HEAD is whatever fake_repo.head says"""
+    monkeypatch.setattr(analysis_cache, "_analysis_cache", OrderedDict())
+    monkeypatch.setattr(analysis_cache, "_analysis_cache_bytes", 0)
+    monkeypatch.setattr(analysis_cache, "_inflight", {})
+
+    class Repo:
+        head = "a" * 40
+        analysis = FakeAnalysis()
+
+    async def resolve_remote_head(clone_url):
+        return Repo.head
+
+    monkeypatch.setattr(analysis_cache, "resolve_remote_head", resolve_remote_head)
+    monkeypatch.setattr(analysis_cache, "clone_and_analyze_repo", lambda *a, **kw: Repo.analysis(*a, **kw))
+    return Repo
+
+def test_concurrent_requests_for_one_commit_run_one_analysis(fake_repo):
+    async def load():
+        return await asyncio.gather(*(analysis_cache.get_repo_analysis(REPO_URL) for _ in range(CONCURRENT_REQUESTS)))
+
+    results = asyncio.run(load())
+
+    assert len(fake_repo.analysis.runs) == 1
+    assert {result["commit_sha"] for result in results} == {fake_repo.head}
+    assert all("total" in result["timings"] for result in results)
+    assert analysis_cache._inflight == {}
+
+def test_concurrent_requests_do_not_serialize(fake_repo):
+    """Requests for different commits overlap instead of queuing behind each other"""
+    loop_ticks = 0
+
+    async def ticker():
+        nonlocal loop_ticks
+        while True:
+            await asyncio.sleep(0.01)
+            loop_ticks += 1
+
+    async def load():
+        tick = asyncio.ensure_future(ticker())
+        requests = []
+        for index in range(10):
+            fake_repo.head = f"{index:040d}"
+            requests.append(asyncio.ensure_future(analysis_cache.get_repo_analysis(REPO_URL)))
+            await asyncio.sleep(0)  # Let it resolve this HEAD before the next one changes it
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(*requests)
+        elapsed = asyncio.get_running_loop().time() - started
+        tick.cancel()
+        return elapsed
+
+    elapsed = asyncio.run(load())
+
+    assert len(fake_repo.analysis.runs) == 10
+    assert elapsed < 10 * fake_repo.analysis.seconds / 2  # Ten 0.2s analyses in well under 2s
+    assert loop_ticks >= 10  # The event loop kept running other work meanwhile
+
+def test_later_requests_hit_the_memory_cache(fake_repo):
+    async def load():
+        await analysis_cache.get_repo_analysis(REPO_URL)
+        await analysis_cache.get_repo_analysis("https://github.com/Octo/Demo")  # Same repo, other casing
+        fake_repo.head = "b" * 40
+        await analysis_cache.get_repo_analysis(REPO_URL)
+
+    asyncio.run(load())
+
+    assert fake_repo.analysis.runs == [("a" * 40, ""), ("b" * 40, "")]
+
+def test_failed_analysis_is_not_cached_and_can_be_retried(fake_repo):
+    fake_repo.analysis = FakeAnalysis(seconds=0.05, fail_first=True)
+
+    async def load():
+        first = await asyncio.gather(*(analysis_cache.get_repo_analysis(REPO_URL) for _ in range(5)), return_exceptions=True)
+        second = await analysis_cache.get_repo_analysis(REPO_URL)
+        return first, second
+
+    first, second = asyncio.run(load())
+
+    assert all(isinstance(result, RuntimeError) for result in first)
+    assert second["commit_sha"] == fake_repo.head
+    assert len(fake_repo.analysis.runs) == 2
+
+def test_cancelled_request_does_not_cancel_the_shared_analysis(fake_repo):
+    async def load():
+        leaving = asyncio.ensure_future(analysis_cache.get_repo_analysis(REPO_URL))
+        staying = asyncio.ensure_future(analysis_cache.get_repo_analysis(REPO_URL))
+        await asyncio.sleep(0.05)
+        leaving.cancel()
+        return await staying
+
+    result = asyncio.run(load())
+
+    assert result["commit_sha"] == fake_repo.head
+    assert len(fake_repo.analysis.runs) == 1
@@ -0,0 +1,25 @@
+# tests/test_app.py - APPLICATION STARTUP AND SHUTDOWN
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("langchain_openai")
+
+from fastapi.testclient import TestClient
+
+import main
+from services.llm_clients import llm_clients
+from services.github_client import github_client
+
+def test_startup_and_shutdown_run_in_the_lifespan():
+    # on_event handlers are deprecated in FastAPI
+    assert main.app.router.on_startup == [] and main.app.router.on_shutdown == []
+
+def test_lifespan_opens_and_closes_the_shared_clients(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")  # Clients are built at startup; nothing is sent
+    with TestClient(main.app) as client:
+        assert llm_clients._http_async_client is not None
+        assert not llm_clients._http_async_client.is_closed
+        assert client.get("/").status_code == 200
+        github_client._get_client()
+    assert llm_clients._http_async_client is None
+    assert github_client._client is None
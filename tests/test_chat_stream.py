@@ -0,0 +1,96 @@
+# tests/test_chat_stream.py - /chat/stream SERVER-SENT EVENTS AND KEEPALIVES
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("langchain_openai")
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from routes import chat_routes
+
+def collect(messages):
+    async def run():
+        return [message async for message in messages]
+    return asyncio.run(run())
+
+async def slow_events(*delays):
+    for index, delay in enumerate(delays):
+        await asyncio.sleep(delay)
+        yield chat_routes.format_sse("progress", {"index": index})
+
+def parse_stream(text: str) -> list:
+    """(event, data) per SSE message, with comments as ("comment", text)"""
+    parsed = []
+    for block in text.strip().split("\n\n"):
+        if block.startswith(":"):
+            parsed.append(("comment", block[1:].strip()))
+            continue
+        event, data = block.split("\n")
+        parsed.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+def test_keepalive_fills_idle_gaps_only():
+    messages = collect(chat_routes.with_keepalive(slow_events(0, 0.35, 0), interval=0.1))
+    assert messages[0] == chat_routes.format_sse("progress", {"index": 0})
+    assert messages[-2:] == [chat_routes.format_sse("progress", {"index": i}) for i in (1, 2)]
+    assert set(messages[1:-2]) == {": keepalive\n\n"}
+    assert 2 <= len(messages[1:-2]) <= 3
+
+def test_keepalive_closes_the_inner_stream():
+    closed = []
+    async def events():
+        try:
+            yield "first"
+            await asyncio.sleep(10)
+            yield "never"
+        finally:
+            closed.append(True)
+
+    async def run():
+        stream = chat_routes.with_keepalive(events(), interval=0.05)
+        assert await stream.__anext__() == "first"
+        assert await stream.__anext__() == ": keepalive\n\n"
+        await stream.aclose()
+    asyncio.run(run())
+    assert closed == [True]
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(chat_routes, "SSE_KEEPALIVE_SECONDS", 0.05)
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+    return TestClient(app)
+
+def test_stream_sends_keepalives_while_the_clone_waits(client, monkeypatch):
+    async def slow_analysis(repo_url, github_token=None, subdirectory=None):
+        await asyncio.sleep(0.3)
+        return {"name": "demo", "total_files_analyzed": 3}
+
+    async def answer(repo_data, question, chat_history):
+        yield "token", {"text": "Hello"}
+        yield "diagram", {"mermaid_code": "flowchart TD\n    A --> B", "diagram_type": "flowchart", "valid": True, "errors": []}
+        yield "done", {"answer": "Hello", "has_diagram": True}
+
+    monkeypatch.setattr(chat_routes, "get_repo_analysis", slow_analysis)
+    monkeypatch.setattr(chat_routes, "stream_repo_chat", answer)
+
+    response = client.post("/chat/stream", json={"repo_url": "https://github.com/octo/demo", "question": "What?"})
+    events = parse_stream(response.text)
+
+    assert events[0][0] == "progress"
+    keepalives = [index for index, (event, _) in enumerate(events) if event == "comment"]
+    assert len(keepalives) >= 3
+    assert max(keepalives) < [event for event, _ in events].index("token")
+    assert [event for event, _ in events if event != "comment"][-4:] == ["progress", "token", "diagram", "done"]
+
+def test_stream_reports_errors_as_events(client, monkeypatch):
+    async def busy(repo_url, github_token=None, subdirectory=None):
+        raise HTTPException(status_code=429, detail="Clone queue is full", headers={"Retry-After": "30"})
+
+    monkeypatch.setattr(chat_routes, "get_repo_analysis", busy)
+    response = client.post("/chat/stream", json={"repo_url": "https://github.com/octo/demo", "question": "What?"})
+    assert parse_stream(response.text)[-1] == ("error", {"status_code": 429, "detail": "Clone queue is full", "retry_after": 30})
@@ -0,0 +1,190 @@
+# tests/test_diagram_ir.py - FLOWCHART IR: ROUND TRIP, COLLAPSING, TRANSITIVE REDUCTION, DIRECTIVE PRUNING
+import pytest
+
+pytest.importorskip("dotenv")
+
+from mermaid_tools.parser import parse_mermaid
+from services.diagram_ir import (
+    DiagramGraph, GraphEdge, simplify_mermaid, collapse_to_budget, transitive_reduce, COLLAPSED_SHAPE
+)
+
+SMALL = """flowchart LR
+    api[API Gateway]
+    subgraph core [Core Services]
+        direction TB
+        auth(Auth):::service
+        db[(Database)]
+    end
+    api -->|login| auth
+    auth --> db
+    api -.-> db
+    classDef service fill:#eef
+    style api fill:#fee
+    linkStyle 0 stroke:red
+"""
+
+def graph_of(code: str) -> DiagramGraph:
+    diagram = parse_mermaid(code)
+    assert diagram.errors == []
+    return DiagramGraph.from_diagram(diagram)
+
+def layered(groups: int, size: int) -> str:
+    """Flowchart with one subgraph per group, each a chain of nodes, chained to the next group"""
+    lines = ["flowchart TD", "    start([Start])"]
+    for g in range(groups):
+        lines.append(f"    subgraph group{g} [Group {g}]")
+        lines += [f"        g{g}n{i}[Node {g}.{i}]" for i in range(size)]
+        lines.append("    end")
+        lines += [f"    g{g}n{i} --> g{g}n{i + 1}" for i in range(size - 1)]
+        lines.append(f"    {'start' if g == 0 else f'g{g - 1}n{size - 1}'} --> g{g}n0")
+    lines += ["    style g0n1 fill:#fee", "    class g1n0,start,g2n2 important", "    linkStyle 0 stroke:red"]
+    return '\n'.join(lines)
+
+def edge_pairs(graph: DiagramGraph) -> set:
+    return {(edge.source, edge.target) for edge in graph.edges}
+
+def reachable(graph: DiagramGraph) -> set:
+    successors = {}
+    for edge in graph.edges:
+        successors.setdefault(edge.source, set()).add(edge.target)
+    pairs = set()
+    for start in successors:
+        stack, seen = [start], set()
+        while stack:
+            for nxt in successors.get(stack.pop(), ()):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        pairs |= {(start, node) for node in seen}
+    return pairs
+
+def test_within_budget_diagrams_come_back_unchanged():
+    code, stats = simplify_mermaid(SMALL, node_budget=10, edge_budget=10)
+    assert code == SMALL
+    assert stats is None
+
+def test_graph_round_trips_through_mermaid():
+    graph = graph_of(SMALL)
+    again = graph_of(graph.to_mermaid())
+
+    assert again.direction == "LR"
+    assert again.nodes == graph.nodes
+    assert again.edges == graph.edges
+    assert again.subgraphs == graph.subgraphs
+    assert again.subgraphs["core"].direction == "TB"
+    assert again.directives == graph.directives
+
+def test_collapse_to_budget_fits_and_still_parses():
+    code = layered(groups=4, size=8)  # 33 nodes
+    simplified, stats = simplify_mermaid(code, node_budget=12, edge_budget=200)
+    graph = graph_of(simplified)
+
+    assert stats["nodes_before"] == 33
+    assert len(graph.nodes) == stats["nodes_after"] <= 12
+    collapsed = [graph.nodes[group] for group in stats["collapsed_subgraphs"]]
+    assert collapsed and all(node.shape == COLLAPSED_SHAPE for node in collapsed)
+    assert all(node.label.endswith("(8 nodes)") for node in collapsed)
+    # Edges into and out of a collapsed group now point at its node
+    assert all(edge.source in graph.nodes and edge.target in graph.nodes for edge in graph.edges)
+    assert ("start", "group0") in edge_pairs(graph) and ("group0", "g1n0") in edge_pairs(graph)
+
+def test_collapse_stops_when_nothing_is_left_to_collapse():
+    graph = graph_of("flowchart TD\n" + "\n".join(f"    n{i} --> n{i + 1}" for i in range(20)))
+    assert collapse_to_budget(graph, 5) == []
+    assert len(graph.nodes) == 21
+
+def test_collapsed_node_ids_do_not_clash_with_existing_nodes():
+    graph = graph_of("""flowchart TD
+    subgraph group [Group]
+        b1
+        b2
+    end
+    a1 --> group
+""")
+    graph.nodes["group"] = graph.nodes["a1"]._replace(id="group")  # A node already named like the subgraph
+
+    assert collapse_to_budget(graph, 3) == ["group"]
+    assert graph.nodes["group_2"].label == "Group (2 nodes)"
+    assert graph.nodes["group"].shape == ""
+    assert ("a1", "group_2") in edge_pairs(graph)
+
+def test_transitive_reduce_drops_shortcuts_and_keeps_reachability():
+    graph = graph_of("""flowchart TD
+    a --> b
+    b --> c
+    a --> c
+    a -->|direct| d
+    b --> d
+    c --- e
+    a --- e
+""")
+    before = reachable(graph)
+
+    removed = transitive_reduce(graph)
+
+    assert removed == 1
+    assert ("a", "c") not in edge_pairs(graph)
+    assert ("a", "d") in edge_pairs(graph)  # Labeled edges carry information: kept
+    assert ("a", "e") in edge_pairs(graph)  # Undirected links are not paths
+    assert reachable(graph) == before
+    assert graph.edges_changed
+
+def test_transitive_reduce_keeps_reachability_in_cycles():
+    graph = graph_of("""flowchart TD
+    a --> b
+    b --> c
+    c --> a
+    a --> c
+    b --> a
+    c --> c
+""")
+    before = reachable(graph)
+
+    transitive_reduce(graph)
+
+    assert reachable(graph) == before
+    assert ("c", "c") in edge_pairs(graph)  # Self-loops are never shortcuts
+    # Every edge left is needed: removing any one of them loses a reachable pair
+    for edge in [e for e in graph.edges if e.source != e.target]:
+        rest = DiagramGraph()
+        rest.edges = [e for e in graph.edges if e is not edge]
+        assert reachable(rest) != reachable(graph)
+
+def test_transitive_reduce_leaves_a_reduced_graph_alone():
+    graph = graph_of("flowchart TD\n    a --> b\n    b --> c\n    a <--> c\n    linkStyle 0 stroke:red")
+    assert transitive_reduce(graph) == 0
+    assert not graph.edges_changed
+    assert "linkStyle 0 stroke:red" in graph.to_mermaid()
+
+def test_directives_for_removed_nodes_and_edges_are_pruned():
+    graph = graph_of(layered(groups=3, size=4))
+    collapse_to_budget(graph, 7)
+    code = graph.to_mermaid()
+
+    assert list(graph.subgraphs) == ["group1"]
+    assert "style g0n1" not in code  # Its node is inside a collapsed group
+    assert "linkStyle" not in code  # Edge indexes changed
+    assert "    class g1n0,start important" in code  # Only the surviving ids stay in the list
+    assert parse_mermaid(code).errors == []
+
+def test_directives_survive_when_nothing_changes():
+    graph = graph_of(SMALL)
+    code = graph.to_mermaid()
+    assert "style api fill:#fee" in code
+    assert "linkStyle 0 stroke:red" in code
+    assert "classDef service fill:#eef" in code
+
+def test_edges_to_a_collapsed_subgraph_id_follow_its_node():
+    graph = graph_of("""flowchart TD
+    start --> inner
+    subgraph inner [Inner]
+        x --> y
+    end
+    y --> done
+""")
+    graph.edges.append(GraphEdge("inner", "done", "-->", None))
+
+    collapse_to_budget(graph, 3)
+
+    assert edge_pairs(graph) == {("start", "inner"), ("inner", "done")}
+    assert graph.nodes["inner"].label == "Inner (2 nodes)"
@@ -0,0 +1,27 @@
+# tests/test_diagram_renderer.py - MERMAID RENDERER BACKENDS
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("dotenv")
+
+from services.diagram_renderer import RemoteRenderer
+from fake_server import FakeServer, Reply
+
+def test_remote_exports_share_one_pooled_connection():
+    with FakeServer(lambda request: Reply(200, {"image": True})) as server:
+        renderer = RemoteRenderer(server.url)
+
+        async def exports():
+            try:
+                return [await renderer.render(f"graph TD\n  A-->B{i}", "svg", "default") for i in range(5)]
+            finally:
+                await renderer.close()
+
+        images = asyncio.run(exports())
+
+    assert images == [b'{"image": true}'] * 5
+    assert server.connections == 1
+    assert [request.path.split('/')[1] for request in server.requests] == ["svg"] * 5
+    assert renderer._client is None
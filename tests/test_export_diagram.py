@@ -0,0 +1,90 @@
+# tests/test_export_diagram.py - /export-diagram: RENDERER BACKENDS, EXPORT CACHE AND ETAGS
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("langchain_openai")
+
+from fastapi.testclient import TestClient
+
+import main
+from services import diagram_renderer
+from services.diagram_renderer import LocalRendererPool, RemoteRenderer, StubRenderer
+from services.tiered_cache import TieredCache
+from fake_server import FakeServer, Reply
+
+CODE = "graph TD\n  A-->B"
+WORKER = f"{sys.executable} {os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_renderer_worker.py')}"
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    """The app with an empty export cache and no renderers created yet (DIAGRAM_RENDERER=stub)"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")  # Clients are built at startup; nothing is sent
+    monkeypatch.setattr(main, "export_cache", TieredCache("export", str(tmp_path), 1 << 20, 1 << 20))
+    monkeypatch.setattr(diagram_renderer, "DIAGRAM_RENDERER", "stub")
+    monkeypatch.setattr(diagram_renderer, "_renderers", {})
+    return main.app
+
+def export(client, code=CODE, format_type="png", **headers):
+    return client.post("/export-diagram", json={"mermaid_code": code, "format": format_type}, headers=headers)
+
+def test_export_misses_then_hits_then_answers_304(app):
+    with TestClient(app) as client:
+        first = export(client)
+        second = export(client, "graph TD\r\n\n  A-->B   \n")  # Same diagram once normalized
+        etag = first.headers["etag"]
+        not_modified = export(client, **{"If-None-Match": etag})
+        weak = export(client, **{"If-None-Match": f'"other", W/{etag}'})
+        svg = export(client, format_type="svg")
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["x-cache"] == "MISS" and second.headers["x-cache"] == "HIT"
+    assert first.content == second.content == StubRenderer.PNG_PIXEL
+    assert first.headers["content-type"] == "image/png"
+    assert second.headers["etag"] == etag
+    assert not_modified.status_code == weak.status_code == 304
+    assert not_modified.content == b"" and not_modified.headers["etag"] == etag
+    assert svg.headers["x-cache"] == "MISS" and svg.headers["etag"] != etag
+    assert svg.content.startswith(b"<svg")
+
+def test_a_stale_etag_gets_the_image(app):
+    with TestClient(app) as client:
+        response = export(client, **{"If-None-Match": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.headers["x-cache"] == "MISS"
+
+def test_auto_falls_back_to_mermaid_ink_when_local_workers_cannot_start(app, monkeypatch):
+    monkeypatch.setattr(diagram_renderer, "DIAGRAM_RENDERER", "auto")
+    broken = LocalRendererPool(f"{sys.executable} -c pass", 1)  # Exits without announcing it is ready
+    with FakeServer(lambda request: Reply(200, {"remote": True})) as server:
+        diagram_renderer._renderers.update(local=broken, remote=RemoteRenderer(server.url))
+        with TestClient(app) as client:
+            first = export(client)
+            second = export(client, "graph LR\n  A-->B")
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content == b'{"remote": true}'
+    assert [request.path.split('/')[1] for request in server.requests] == ["img", "img"]
+    assert not broken.is_available()  # Marked broken once; the second export went straight to remote
+
+def test_a_crashed_local_worker_is_respawned(app, monkeypatch):
+    monkeypatch.setattr(diagram_renderer, "DIAGRAM_RENDERER", "local")
+    pool = diagram_renderer._renderers["local"] = LocalRendererPool(WORKER, 1)
+    with TestClient(app) as client:
+        first = export(client, "graph TD\n  first")
+        bad = export(client, "graph TD\n  bad")
+        same_worker = export(client, "graph TD\n  second")
+        crashed = export(client, "graph TD\n  crash")
+        respawned = export(client, "graph TD\n  third")
+
+    pid = lambda response: response.content.split(b":")[0]
+    assert first.status_code == same_worker.status_code == respawned.status_code == 200
+    assert bad.status_code == 500 and "Parse error" in bad.json()["detail"]
+    assert crashed.status_code == 500
+    assert pid(first) == pid(same_worker)  # A diagram that fails to render keeps its worker
+    assert pid(respawned) != pid(first)
+    assert respawned.content.endswith(b"third")
+    assert pool._workers == []  # Stopped by the lifespan
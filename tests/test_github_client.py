@@ -0,0 +1,199 @@
+# tests/test_github_client.py - GITHUB CLIENT AGAINST A FAKE API SERVER
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from services import github_client as client_module
+from services.github_client import GitHubClient
+from fake_server import FakeServer, Reply
+
+REPO = {"full_name": "octo/demo", "description": "Demo", "stargazers_count": 7}
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+class FakeGitHub:
+    """/repos/octo/demo with an ETag; `limited` replies are sent first, in order"""
+
+    def __init__(self, etag: str = '"v1"', remaining: int = 59, reset: int = 1_700_003_600):
+        self.etag = etag
+        self.remaining = remaining
+        self.reset = reset
+        self.limited = []
+
+    def __call__(self, request):
+        if self.limited:
+            return self.limited.pop(0)
+        headers = {"ETag": self.etag, "X-RateLimit-Remaining": str(self.remaining), "X-RateLimit-Reset": str(self.reset)}
+        if request.headers.get("if-none-match") == self.etag:
+            return Reply(304, None, headers)
+        self.remaining -= 1
+        headers["X-RateLimit-Remaining"] = str(self.remaining)
+        return Reply(200, REPO, headers)
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(client_module, "time", fake)
+    return fake
+
+def make_client(server: FakeServer, max_connections: int = 4) -> GitHubClient:
+    return GitHubClient(server.url, timeout=5, max_connections=max_connections, cache_size=16)
+
+def run(client: GitHubClient, coroutine_factory):
+    """Run the coroutine and close the client's pool on the same event loop"""
+    async def main():
+        try:
+            return await coroutine_factory()
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+def test_sequential_requests_reuse_one_connection(clock):
+    with FakeServer(FakeGitHub()) as server:
+        client = make_client(server)
+
+        async def calls():
+            return [await client.get_repo("octo", f"repo{i}") for i in range(10)]
+
+        run(client, calls)
+
+    assert len(server.requests) == 10
+    assert server.connections == 1
+
+def test_concurrent_requests_stay_within_the_pool(clock):
+    with FakeServer(FakeGitHub()) as server:
+        client = make_client(server, max_connections=2)
+
+        async def calls():
+            return await asyncio.gather(*(client.get_repo("octo", f"repo{i}") for i in range(20)))
+
+        results = run(client, calls)
+
+    assert results == [REPO] * 20
+    assert server.connections <= 2
+
+def test_conditional_get_reuses_the_cached_body_on_304(clock):
+    with FakeServer(FakeGitHub()) as server:
+        client = make_client(server)
+
+        async def calls():
+            return [await client.get_repo("octo", "demo", "token-1") for _ in range(3)]
+
+        results = run(client, calls)
+
+    assert results == [REPO] * 3
+    assert [request.headers.get("if-none-match") for request in server.requests] == [None, '"v1"', '"v1"']
+    assert all(request.headers["authorization"] == "Bearer token-1" for request in server.requests)
+    assert client.stats["not_modified"] == 2
+
+def test_etags_are_kept_per_token(clock):
+    with FakeServer(FakeGitHub()) as server:
+        client = make_client(server)
+
+        async def calls():
+            await client.get_repo("octo", "demo", "token-1")
+            await client.get_repo("octo", "demo", "token-2")
+
+        run(client, calls)
+
+    assert [request.headers.get("if-none-match") for request in server.requests] == [None, None]
+
+def test_exhausted_window_pauses_calls_until_reset(clock):
+    github = FakeGitHub(remaining=1, reset=int(clock.now) + 120)
+    with FakeServer(github) as server:
+        client = make_client(server)
+
+        async def calls():
+            first = await client.get_repo("octo", "demo")  # Uses the last call of the window
+            paused = await client.get_repo("octo", "demo")
+            clock.now += 121
+            resumed = await client.get_repo("octo", "demo")
+            return first, paused, resumed
+
+        first, paused, resumed = run(client, calls)
+
+    assert first == paused == resumed == REPO
+    assert len(server.requests) == 2  # The paused call was answered from the cache
+    assert client.stats["skipped_rate_limited"] == 1
+
+def test_429_with_retry_after_blocks_the_token(clock):
+    github = FakeGitHub()
+    github.limited = [Reply(429, {"message": "slow down"}, {"Retry-After": "30"})]
+    with FakeServer(github) as server:
+        client = make_client(server)
+
+        async def calls():
+            limited = await client.get_repo("octo", "demo", "token-1")
+            other_token = await client.get_repo("octo", "demo", "token-2")
+            skipped = await client.get_repo("octo", "demo", "token-1")
+            clock.now += 31
+            retried = await client.get_repo("octo", "demo", "token-1")
+            return limited, other_token, skipped, retried
+
+        limited, other_token, skipped, retried = run(client, calls)
+
+    assert (limited, skipped) == ({}, {})
+    assert other_token == retried == REPO
+    assert len(server.requests) == 3
+    assert client.stats["rate_limited"] == 1
+
+def test_secondary_limit_without_hint_backs_off_exponentially(clock):
+    github = FakeGitHub()
+    secondary = Reply(403, {"message": "You have exceeded a secondary rate limit"})
+    github.limited = [secondary, secondary]
+    with FakeServer(github) as server:
+        client = make_client(server)
+
+        async def calls():
+            await client.get_repo("octo", "demo")
+            first_block = client._blocked_for("anonymous")
+            clock.now += first_block + 1
+            await client.get_repo("octo", "demo")
+            second_block = client._blocked_for("anonymous")
+            clock.now += second_block + 1
+            return first_block, second_block, await client.get_repo("octo", "demo")
+
+        first_block, second_block, result = run(client, calls)
+
+    assert first_block == client_module.RATE_LIMIT_BACKOFF_SECONDS
+    assert second_block == 2 * client_module.RATE_LIMIT_BACKOFF_SECONDS
+    assert result == REPO
+    assert client._limits["anonymous"]["strikes"] == 0  # Reset by the successful call
+
+def test_unreachable_api_falls_back_to_the_cached_body(clock):
+    with FakeServer(FakeGitHub()) as server:
+        client = make_client(server)
+        first = run(client, lambda: client.get_repo("octo", "demo"))
+    # The server is gone now
+    second = run(client, lambda: client.get_repo("octo", "demo"))
+    uncached = run(client, lambda: client.get_repo("octo", "other"))
+
+    assert first == second == REPO
+    assert uncached == {}
+    assert client.stats["errors"] == 2
+
+def test_blob_sizes_come_from_one_uncached_trees_request(clock):
+    tree = {
+        "sha": "abc",
+        "truncated": True,
+        "tree": [
+            {"path": "src", "type": "tree", "sha": "t1"},
+            {"path": "src/app.py", "type": "blob", "sha": "b1", "size": 120},
+            {"path": "dist.js", "type": "blob", "sha": "b2", "size": 900_000},
+            {"path": "vendor", "type": "commit", "sha": "c1"}
+        ]
+    }
+    with FakeServer(lambda request: Reply(200, tree, {"ETag": '"t"'})) as server:
+        client = make_client(server)
+        sizes = run(client, lambda: client.get_blob_sizes("octo", "demo", "abc"))
+
+    assert sizes == {"b1": 120, "b2": 900_000}
+    assert server.requests[0].path == "/repos/octo/demo/git/trees/abc?recursive=1"
+    assert client._responses == {}  # Trees of a commit never change; not worth the cache slot
@@ -0,0 +1,63 @@
+# tests/test_import_graph.py - IMPORT GRAPH DIAGRAMS
+import pytest
+
+pytest.importorskip("dotenv")
+
+from services.import_graph import ImportResolver, build_import_graph, generate_import_diagram, EXTERNAL_SUBGRAPH_ID
+from mermaid_tools.parser import parse_mermaid
+
+def test_python_imports_become_edges_grouped_by_folder():
+    graph, stats = build_import_graph({
+        "app/main.py": {"content": "from app import models\nimport requests\n"},
+        "app/models.py": {"content": "import os\n"}
+    })
+    assert stats == {"files": 2, "internal_edges": 1, "external_packages": 1}
+    assert graph.nodes["f_app_main_py"].subgraph == "dir_app"
+    assert graph.nodes["ext_requests"].subgraph == EXTERNAL_SUBGRAPH_ID
+
+def test_external_folder_is_not_the_external_packages_group():
+    graph, _ = build_import_graph({
+        "external/client.py": {"content": "import requests\nfrom lib import util\n"},
+        "lib/util.py": {"content": ""},
+        "main.py": {"content": "from external import client\n"}
+    })
+    assert graph.nodes["f_external_client_py"].subgraph == "dir_external"
+    assert graph.nodes["f_main_py"].subgraph is None
+    assert graph.nodes["ext_requests"].subgraph == EXTERNAL_SUBGRAPH_ID
+    assert graph.subgraphs[EXTERNAL_SUBGRAPH_ID].title == "External packages"
+    # Every subgraph holds at least one node
+    used = {node.subgraph for node in graph.nodes.values()}
+    assert set(graph.subgraphs) <= used | {subgraph.parent for subgraph in graph.subgraphs.values()}
+
+def test_diagram_parses():
+    code, _ = generate_import_diagram({"file_contents": {
+        "external/client.py": {"content": "import requests\n"},
+        "main.py": {"content": "from external import client\n"}
+    }})
+    assert parse_mermaid(code).errors == []
+
+def test_same_named_files_away_from_source_roots_are_not_packages():
+    resolver = ImportResolver(['app/main.py', 'app/utils/logging.py', 'scripts/requests.py'])
+    assert resolver.python('app/main.py', 'import logging\nimport requests\n') == (set(), {'requests'})
+
+def test_absolute_imports_resolve_from_source_roots():
+    resolver = ImportResolver([
+        'app/main.py', 'app/utils/helpers.py', 'src/pkg/core.py', 'tests/test_core.py', 'tools/deploy.py'
+    ])
+    internal, external = resolver.python('app/main.py', 'from utils import helpers\nfrom app.utils.helpers import x\n')
+    assert internal == {'app/utils/helpers.py'}
+    assert resolver.python('tests/test_core.py', 'from pkg import core\n') == ({'src/pkg/core.py'}, set())
+    # tools/ is neither a source root nor above the importer
+    assert resolver.python('app/main.py', 'import deploy\n') == (set(), {'deploy'})
+
+def test_paths_differing_in_punctuation_get_separate_nodes():
+    graph, stats = build_import_graph({
+        "src/main.py": {"content": "from . import a_b\nfrom . import c\n"},
+        "src/a_b.py": {"content": ""},
+        "src/c.py": {"content": "import importlib\nmod = importlib.import_module('src.a-b')\n"},
+        "src/a-b.py": {"content": "from . import c\n"}
+    })
+    assert stats["files"] == 4
+    labels = {node.label for node in graph.nodes.values()}
+    assert {"a_b.py", "a-b.py"} <= labels
+    assert len({edge.source for edge in graph.edges}) == 2
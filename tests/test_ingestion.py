@@ -0,0 +1,106 @@
+# tests/test_ingestion.py - REPOSITORY INGESTION: EQUIVALENCE WITH THE OLD CODE AND BENCHMARKS
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from services import github_service
+from services.file_index import get_file_index
+import legacy_ingestion
+from synthetic_repo import make_repo
+
+BENCHMARK_FILES = 50_000
+
+@pytest.fixture(scope="module")
+def small_repo(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("repo"))
+    make_repo(root, 600, large_every=40)
+    return root
+
+def _timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def legacy_pipeline(root):
+    """What analyze_local_repo ran before the single scan: every stage walks the checkout"""
+    return (
+        legacy_ingestion.build_file_tree_from_disk(root),
+        legacy_ingestion.read_important_files(root),
+        legacy_ingestion.read_readme_from_disk(root),
+        legacy_ingestion.detect_languages(root),
+        legacy_ingestion.analyze_dependencies_from_disk(root)
+    )
+
+def single_scan_pipeline(root):
+    """The stages of analyze_local_repo, all fed by one scan_repository pass"""
+    records = github_service.scan_repository(root)
+    return (
+        github_service.build_file_tree_from_disk(root, github_service.TREE_MAX_DEPTH, records),
+        github_service.read_important_files(root, 200, records),
+        github_service.read_readme_from_disk(root, records),
+        github_service.detect_languages(root, records),
+        github_service.analyze_dependencies_from_disk(root, records)
+    )
+
+def legacy_tree_files(tree):
+    """{path: (size, purpose)} of a nested legacy file tree"""
+    files = {}
+    for info in tree.values():
+        if info["type"] == "dir":
+            files.update(legacy_tree_files(info["contents"]))
+        else:
+            files[info["path"]] = (info["size"], info["purpose"])
+    return files
+
+def test_parallel_reader_matches_serial_reader(small_repo):
+    old = legacy_ingestion.read_important_files(small_repo, max_files=10**6)
+    new = github_service.read_important_files(small_repo, max_files=10**6)
+
+    assert set(new) == set(old)
+    assert any(len(entry["content"]) == github_service.MAX_CONTENT_CHARS for entry in new.values())
+    for path, entry in new.items():
+        # full_size is the size on disk now that only the head of a file is read
+        assert {**entry, "full_size": None} == {**old[path], "full_size": None}, path
+        assert entry["full_size"] == entry["size"]
+
+def test_parallel_reader_stops_at_max_files(small_repo):
+    files = github_service.read_important_files(small_repo, max_files=25)
+    assert len(files) == 25
+
+def test_single_scan_matches_separate_walks(small_repo):
+    old_tree, old_files, old_readme, old_languages, old_dependencies = legacy_pipeline(small_repo)
+    tree, files, readme, languages, dependencies = single_scan_pipeline(small_repo)
+
+    tree_files = {path: (size, purpose) for path, size, purpose in get_file_index(tree).iter_files()}
+    assert tree_files == legacy_tree_files(old_tree)
+    assert set(files) == set(old_files)
+    assert readme == old_readme
+    assert languages == old_languages
+    assert dependencies == old_dependencies
+
+@pytest.mark.benchmark
+def test_benchmark_read_important_files(tmp_path):
+    root = str(tmp_path)
+    make_repo(root, BENCHMARK_FILES)
+    # The scan is shared with the tree, language and dependency passes, so it is timed apart
+    records, scan_seconds = _timed(github_service.scan_repository, root)
+    print(f"\nscan_repository: {scan_seconds * 1000:8.1f} ms for {len(records)} files")
+    for max_files in (200, BENCHMARK_FILES):
+        old, old_seconds = _timed(legacy_ingestion.read_important_files, root, max_files=max_files)
+        new, new_seconds = _timed(github_service.read_important_files, root, max_files=max_files, records=records)
+        assert len(new) == len(old)
+        print(f"read_important_files max_files={max_files:>6}: serial {old_seconds * 1000:8.1f} ms"
+              f"  parallel {new_seconds * 1000:8.1f} ms  ({old_seconds / new_seconds:.1f}x,"
+              f" {github_service.READ_WORKERS} workers)")
+
+@pytest.mark.benchmark
+def test_benchmark_single_scan_pipeline(tmp_path):
+    root = str(tmp_path)
+    make_repo(root, BENCHMARK_FILES)
+    for _ in range(2):  # The first round warms the page cache for both
+        _, old_seconds = _timed(legacy_pipeline, root)
+        _, new_seconds = _timed(single_scan_pipeline, root)
+    print(f"\nanalysis stages on {BENCHMARK_FILES} files: separate walks {old_seconds * 1000:8.1f} ms"
+          f"  single scan {new_seconds * 1000:8.1f} ms  ({old_seconds / new_seconds:.1f}x)")
@@ -0,0 +1,181 @@
+# tests/test_llm_gateway.py - LLM GATEWAY AGAINST A FAKE OPENAI SERVER
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+from langchain_openai import ChatOpenAI
+
+from services import llm_gateway as gateway_module
+from services.llm_gateway import LLMGateway
+from fake_server import FakeServer, Reply
+
+def completion(content: str, total_tokens: int = 10) -> dict:
+    return {
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": total_tokens // 2, "completion_tokens": total_tokens - total_tokens // 2, "total_tokens": total_tokens}
+    }
+
+def error(status: int, headers: dict = None) -> Reply:
+    return Reply(status, {"error": {"message": f"upstream {status}", "type": "test"}}, headers)
+
+class ScriptedLLM:
+    """Fake /v1/chat/completions: answers from a script of Replies, then echoes the prompt"""
+
+    def __init__(self, script=(), delay: float = 0.0):
+        self.script = list(script)
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        with self._lock:
+            if self.script:
+                return self.script.pop(0)
+        return Reply(200, completion("echo: " + request.body["messages"][-1]["content"]), delay=self.delay)
+
+def chat_model(server: FakeServer) -> ChatOpenAI:
+    # max_retries=0: retries are the gateway's job
+    return ChatOpenAI(model="gpt-4o", temperature=0, base_url=server.url + "/v1", api_key="test", max_retries=0)
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(gateway_module, "LLM_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(gateway_module, "LLM_BACKOFF_MAX_SECONDS", 0.1)
+    monkeypatch.setattr(gateway_module, "LLM_EXPECTED_COMPLETION_TOKENS", 100)
+
+def test_retries_429_and_5xx_with_jittered_backoff(monkeypatch):
+    draws = []
+    uniform = gateway_module.random.uniform
+    monkeypatch.setattr(gateway_module.random, "uniform", lambda a, b: draws.append((a, b)) or uniform(a, b))
+
+    with FakeServer(ScriptedLLM([error(429), error(500), error(503)])) as server:
+        gateway = LLMGateway(4, 0, 0, max_retries=4)
+        response = asyncio.run(gateway.invoke(chat_model(server), "hello"))
+
+    assert response.content == "echo: hello"
+    assert len(server.requests) == 4
+    assert gateway.stats["retries"] == 3
+    assert gateway.stats["provider_rate_limited"] == 1
+    # Full jitter: each delay is drawn from [0, base * 2^attempt]
+    assert draws == [(0, 0.01), (0, 0.02), (0, 0.04)]
+
+def test_retry_after_header_is_honoured():
+    with FakeServer(ScriptedLLM([error(429, {"Retry-After": "0.3"})])) as server:
+        gateway = LLMGateway(4, 0, 0, max_retries=2)
+        started = time.perf_counter()
+        asyncio.run(gateway.invoke(chat_model(server), "hello"))
+        elapsed = time.perf_counter() - started
+
+    assert elapsed >= 0.3
+    assert len(server.requests) == 2
+
+def test_client_errors_are_not_retried():
+    with FakeServer(ScriptedLLM([error(400)])) as server:
+        gateway = LLMGateway(4, 0, 0, max_retries=4)
+        with pytest.raises(Exception) as raised:
+            asyncio.run(gateway.invoke(chat_model(server), "hello"))
+
+    assert getattr(raised.value, "status_code", None) == 400
+    assert len(server.requests) == 1
+    assert gateway.stats["retries"] == 0
+
+def test_exhausted_retries_surface_as_503():
+    with FakeServer(ScriptedLLM([error(502)] * 3)) as server:
+        gateway = LLMGateway(4, 0, 0, max_retries=2)
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(gateway.invoke(chat_model(server), "hello"))
+
+    assert raised.value.status_code == 503
+    assert "Retry-After" in raised.value.headers
+    assert len(server.requests) == 3
+
+def test_rpm_bucket_paces_calls():
+    with FakeServer(ScriptedLLM()) as server:
+        gateway = LLMGateway(8, rpm_limit=600, tpm_limit=0, max_retries=0)  # Refills 10 requests/s
+        llm = chat_model(server)
+
+        async def burst():
+            gateway.requests.take(gateway.requests.capacity)
+            return await asyncio.gather(*(gateway.invoke(llm, f"prompt {i}") for i in range(5)))
+
+        started = time.perf_counter()
+        asyncio.run(burst())
+        elapsed = time.perf_counter() - started
+
+    assert len(server.requests) == 5
+    assert elapsed >= 0.45  # Five requests at 10/s from an empty bucket
+    assert gateway.stats["throttled_seconds"] > 0
+
+def test_tpm_bucket_paces_calls():
+    with FakeServer(ScriptedLLM()) as server:
+        gateway = LLMGateway(8, rpm_limit=0, tpm_limit=60000, max_retries=0)  # Refills 1000 tokens/s
+        llm = chat_model(server)
+
+        async def burst():
+            gateway.tokens.take(gateway.tokens.capacity)
+            return await asyncio.gather(*(gateway.invoke(llm, f"prompt {i}") for i in range(3)))
+
+        started = time.perf_counter()
+        asyncio.run(burst())
+        elapsed = time.perf_counter() - started
+
+    # A call reserves ~102 tokens (prompt estimate + expected completion) before it is sent
+    assert elapsed >= 0.1
+    assert len(server.requests) == 3
+
+def test_reported_usage_is_refunded():
+    with FakeServer(ScriptedLLM()) as server:
+        gateway = LLMGateway(8, rpm_limit=0, tpm_limit=600, max_retries=0)  # Refills 10 tokens/s
+        asyncio.run(gateway.invoke(chat_model(server), "hello"))
+
+    # ~102 tokens reserved, 10 used according to the server
+    assert 588 < gateway.tokens.level < 596
+
+def test_budget_beyond_queue_limit_is_rejected_with_429(monkeypatch):
+    monkeypatch.setattr(gateway_module, "LLM_MAX_QUEUE_SECONDS", 0.05)
+    with FakeServer(ScriptedLLM()) as server:
+        gateway = LLMGateway(8, rpm_limit=60, tpm_limit=0, max_retries=0)  # 1 request/s
+        gateway.requests.take(gateway.requests.capacity)
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(gateway.invoke(chat_model(server), "hello"))
+
+    assert raised.value.status_code == 429
+    assert raised.value.headers["Retry-After"] == "1"
+    assert server.requests == []
+
+def test_identical_concurrent_prompts_share_one_call():
+    with FakeServer(ScriptedLLM(delay=0.3)) as server:
+        gateway = LLMGateway(8, 0, 0, max_retries=0)
+        llm = chat_model(server)
+
+        async def burst():
+            same = [gateway.invoke(llm, "same prompt") for _ in range(5)]
+            return await asyncio.gather(*same, gateway.invoke(llm, "other prompt"))
+
+        responses = asyncio.run(burst())
+
+    assert [response.content for response in responses] == ["echo: same prompt"] * 5 + ["echo: other prompt"]
+    assert len(server.requests) == 2
+    assert gateway.stats["coalesced"] == 4
+    assert gateway._inflight == {}
+
+def test_concurrency_limit_queues_calls():
+    with FakeServer(ScriptedLLM(delay=0.2)) as server:
+        gateway = LLMGateway(2, 0, 0, max_retries=0)
+        llm = chat_model(server)
+
+        async def burst():
+            return await asyncio.gather(*(gateway.invoke(llm, f"prompt {i}") for i in range(4)))
+
+        started = time.perf_counter()
+        asyncio.run(burst())
+        elapsed = time.perf_counter() - started
+
+    assert elapsed >= 0.4  # Two waves of two calls
+    assert gateway.stats["calls"] == 4
@@ -0,0 +1,153 @@
+# tests/test_mermaid_parser.py - MERMAID PARSER: AST, ERROR POSITIONS, FUZZ AND BENCHMARK
+import random
+import time
+
+import pytest
+
+from mermaid_tools.parser import (
+    MermaidParser, parse_mermaid, ClassDecl, Member, Relation, Relationship, Attribute,
+    Transition, Block, End, Link, Message
+)
+from mermaid_tools.repair import repair_mermaid, strip_code_fences
+from mermaid_samples import VALID_DIAGRAMS, BROKEN_FLOWCHART
+
+FUZZ_CASES = 3000
+MUTATION_CHARS = '[](){}"|-<>.:;&`~=*o \n\t'
+
+def parse_in_chunks(code: str, rng: random.Random):
+    parser = MermaidParser()
+    code = code.strip()
+    pos = 0
+    while pos < len(code):
+        size = rng.randint(1, 40)
+        parser.feed(code[pos:pos + size])
+        pos += size
+    return parser.close()
+
+def mutate(code: str, rng: random.Random) -> str:
+    for _ in range(rng.randint(1, 4)):
+        op = rng.randrange(5)
+        index = rng.randrange(len(code) + 1)
+        if op == 0:
+            code = code[:index] + code[index + 1:]
+        elif op == 1:
+            code = code[:index] + rng.choice(MUTATION_CHARS) + code[index:]
+        elif op == 2:
+            code = code[:index]
+        else:
+            lines = code.split('\n')
+            line = rng.randrange(len(lines))
+            if op == 3:
+                lines.insert(line, lines[rng.randrange(len(lines))])
+            elif len(lines) > 1:
+                del lines[line]
+            code = '\n'.join(lines)
+    return code
+
+@pytest.mark.parametrize("kind", sorted(VALID_DIAGRAMS))
+def test_valid_diagrams_parse_without_errors(kind):
+    diagram = parse_mermaid(VALID_DIAGRAMS[kind])
+    assert diagram.errors == []
+    assert diagram.open_blocks == []
+
+def test_typed_statements():
+    class_diagram = parse_mermaid(VALID_DIAGRAMS["class"])
+    assert ClassDecl(2, "Animal") in class_diagram.statements
+    assert Member(3, "Animal", "+String name") in class_diagram.statements
+    assert Relation(7, "Animal", "Dog", "<|--", "") in class_diagram.statements
+
+    er = parse_mermaid(VALID_DIAGRAMS["er"])
+    assert Relationship(2, "CUSTOMER", "||--o{", "ORDER", "places") in er.statements
+    assert Attribute(8, "CUSTOMER", "string", "custNumber", "PK") in er.statements
+
+    state = parse_mermaid(VALID_DIAGRAMS["state"])
+    assert Block(3, "state", "Moving") in state.statements
+    assert End(6, "state") in state.statements
+    assert Transition(4, "[*]", "Slow", "") in state.statements
+
+    flowchart = parse_mermaid(VALID_DIAGRAMS["flowchart"])
+    assert Link(3, "B", "C", "-->", "yes") in flowchart.statements
+    assert Link(8, "C", "E", "-->", "reads") in flowchart.statements
+
+    sequence = parse_mermaid(VALID_DIAGRAMS["sequence"])
+    assert Message(4, "U", "API", "->>", "POST /diagram") in sequence.statements
+
+@pytest.mark.parametrize("code, line, column", [
+    ("flowchart TD\n    A[x --> B", 2, 6),
+    ("flowchart TD\n    A[Label (v2)] --> B", 2, 13),
+    ("flowchart TD\n    A <-- B", 2, 7),
+    ("flowchart TD\n    user service --> B", 2, 10),
+    ("sequenceDiagram\n    A->>B hello", 2, 16),
+    ("classDiagram\n    class Animal {\n        +eat()", 2, 5),
+    ("erDiagram\n    A ||--o{ B", 2, 15),
+    ("stateDiagram-v2\n    }", 2, 5),
+    ("flowchrt TD\n    A --> B", 1, 1),
+])
+def test_error_positions(code, line, column):
+    errors = parse_mermaid(code).errors
+    assert errors, code
+    assert (errors[0].line, errors[0].column) == (line, column), str(errors[0])
+
+def test_quoted_brackets_are_not_counted():
+    assert parse_mermaid('flowchart TD\n    A["List[int] (x)"] --> B').errors == []
+    assert parse_mermaid('mindmap\n  root["a ) b"]').errors == []
+
+def test_fuzzed_diagrams():
+    """Mutated diagrams never crash the parser or repair, and incremental parsing matches one-shot parsing"""
+    rng = random.Random(20240601)
+    samples = list(VALID_DIAGRAMS.values()) + [strip_code_fences(BROKEN_FLOWCHART)]
+    for _ in range(FUZZ_CASES):
+        code = mutate(rng.choice(samples), rng)
+        diagram = parse_mermaid(code)
+        line_count = max(1, len(code.strip().split('\n')))
+        for error in diagram.errors:
+            assert 1 <= error.line <= line_count and error.column >= 1, (code, error)
+        assert parse_in_chunks(code, rng) == diagram, code
+
+        repaired = repair_mermaid(code)
+        if not diagram.errors and code.strip():
+            assert repaired.code == strip_code_fences(code) and repaired.fixes == [], code
+
+def _parse_seconds(code: str) -> float:
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        parse_mermaid(code)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+# Lines that would make a backtracking parser quadratic
+PATHOLOGICAL_LINES = {
+    "text_edges": "    A -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- B",
+    "long_label": "    A[" + "x " * 400 + "] --> B",
+    "unclosed_label": "    A[" + "(" * 400,
+}
+
+@pytest.mark.parametrize("name", sorted(PATHOLOGICAL_LINES))
+def test_parse_time_is_linear(name):
+    line = PATHOLOGICAL_LINES[name]
+    small = _parse_seconds("flowchart TD\n" + "\n".join([line] * 200))
+    large = _parse_seconds("flowchart TD\n" + "\n".join([line] * 2000))
+    assert large < small * 30, (small, large)
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("kind", sorted(VALID_DIAGRAMS))
+def test_benchmark_parse_throughput(kind):
+    body = VALID_DIAGRAMS[kind].split('\n', 1)
+    header, lines = body[0], body[1]
+    for repeat in (100, 1000, 10000):
+        code = header + "\n" + "\n".join([lines] * repeat)
+        seconds = _parse_seconds(code)
+        print(f"\n{kind:>10} {len(code) / 1e6:7.2f} MB  {seconds * 1000:8.1f} ms  {len(code) / 1e6 / seconds:6.2f} MB/s")
+
+@pytest.mark.benchmark
+def test_benchmark_repair():
+    code = strip_code_fences(BROKEN_FLOWCHART)
+    header, lines = code.split('\n', 1)
+    for repeat in (100, 1000, 10000):
+        big = header + "\n" + "\n".join([lines] * repeat)
+        started = time.perf_counter()
+        result = repair_mermaid(big)
+        seconds = time.perf_counter() - started
+        assert parse_mermaid(result.code).errors == []
+        print(f"\n    repair {len(big) / 1e6:7.2f} MB  {seconds * 1000:8.1f} ms")
@@ -0,0 +1,41 @@
+# tests/test_mermaid_repair.py - LOCAL MERMAID REPAIR
+import pytest
+
+from mermaid_tools.parser import parse_mermaid
+from mermaid_tools.repair import repair_mermaid
+from mermaid_samples import VALID_DIAGRAMS, BROKEN_FLOWCHART
+
+@pytest.mark.parametrize("kind", sorted(VALID_DIAGRAMS))
+def test_valid_diagrams_are_left_unchanged(kind):
+    code = VALID_DIAGRAMS[kind]
+    assert parse_mermaid(code).errors == []
+    result = repair_mermaid(code)
+    assert result.code == code
+    assert result.fixes == []
+
+def test_markdown_label_stays_quoted():
+    result = repair_mermaid('flowchart TD\n    A["`**bold**`"] --> B[x')
+    assert result.code == 'flowchart TD\n    A["`**bold**`"] --> B[x]'
+    assert parse_mermaid(result.code).errors == []
+
+def test_braces_inside_an_invalid_class_diagram_are_not_balanced():
+    code = "classDiagram\n    class Animal {\n        +eat()\n    }\n    Animal <|-- Dog oops"
+    result = repair_mermaid(code)
+    assert result.code == code
+
+def test_unclosed_blocks_are_closed():
+    result = repair_mermaid("stateDiagram-v2\n    state Moving {\n        Slow --> Fast")
+    assert result.code.endswith("\n    }")
+    assert parse_mermaid(result.code).errors == []
+
+    result = repair_mermaid("sequenceDiagram\n    alt ok\n        A->>B: hi")
+    assert result.code.endswith("\n    end")
+    assert parse_mermaid(result.code).errors == []
+
+def test_broken_flowchart_is_repaired():
+    result = repair_mermaid(BROKEN_FLOWCHART)
+    assert parse_mermaid(result.code).errors == []
+    assert "user_service[User Service] --> db[(Postgres)]" in result.code
+    assert 'api["API (v2)"] -.-> user_service' in result.code
+    assert "api --> cache" in result.code
+    assert "style user_service fill:#f9f" in result.code
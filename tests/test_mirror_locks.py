@@ -0,0 +1,58 @@
+# tests/test_mirror_locks.py - PER-MIRROR GIT LOCKS
+import asyncio
+import gc
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from services import github_service
+
+def test_lock_is_shared_while_in_use_and_dropped_after():
+    order = []
+
+    async def use(path, name):
+        async with github_service.get_mirror_lock(path):
+            order.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} end")
+
+    async def run():
+        tasks = [asyncio.ensure_future(use("/mirrors/a.git", name)) for name in ("a1", "a2", "a3")]
+        tasks.append(asyncio.ensure_future(use("/mirrors/b.git", "b1")))
+        await asyncio.sleep(0)
+        assert set(github_service._mirror_locks) == {"/mirrors/a.git", "/mirrors/b.git"}
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    gc.collect()
+    a_events = [event for event in order if event.startswith("a")]
+    assert a_events == ["a1 start", "a1 end", "a2 start", "a2 end", "a3 start", "a3 end"]
+    assert len(github_service._mirror_locks) == 0
+
+def test_cancelled_waiter_does_not_keep_the_lock():
+    async def run():
+        lock = github_service.get_mirror_lock("/mirrors/c.git")
+        await lock.acquire()
+        waiter = asyncio.ensure_future(github_service.get_mirror_lock("/mirrors/c.git").acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        lock.release()
+
+    asyncio.run(run())
+    gc.collect()
+    assert "/mirrors/c.git" not in github_service._mirror_locks
+
+def test_many_repositories_leave_no_locks_behind():
+    async def touch(path):
+        async with github_service.get_mirror_lock(path):
+            await asyncio.sleep(0)
+
+    async def run():
+        await asyncio.gather(*(touch(f"/mirrors/repo{i}.git") for i in range(1000)))
+
+    asyncio.run(run())
+    gc.collect()
+    assert len(github_service._mirror_locks) == 0
@@ -0,0 +1,88 @@
+# tests/test_partial_mirror.py - ANALYSIS OF A PARTIAL MIRROR: ONLY THE BLOBS THAT GET READ ARE FETCHED
+import asyncio
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("fastapi")
+if shutil.which("git") is None:
+    pytest.skip("git is not installed", allow_module_level=True)
+
+from services import github_service
+
+REPO_URL = "https://github.com/octo/demo"
+
+def git(*args, cwd=None) -> str:
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+@pytest.fixture
+def source_repo(tmp_path):
+    """A repository with small source files, a generated bundle over the read limit and a binary"""
+    root = tmp_path / "source"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "app.py").write_text("import os\n\ndef main():\n    return os.getcwd()\n")
+    (root / "src" / "util.js").write_text("export const add = (a, b) => a + b;\n")
+    (root / "dist.js").write_text("var x = 1;\n" * (github_service.MAX_READ_FILE_SIZE // 10))
+    (root / "logo.png").write_bytes(b"\x89PNG\0" * 1000)
+    (root / "README.md").write_text("# Demo\n")
+    git("init", "-q", "-b", "main", cwd=root)
+    git("-c", "user.name=t", "-c", "user.email=t@example.com", "add", "-A", cwd=root)
+    git("-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-q", "-m", "init", cwd=root)
+    git("config", "uploadpack.allowFilter", "true", cwd=root)
+    return root
+
+def tree_sizes(root) -> dict:
+    """{oid: size} as the GitHub trees API would report them"""
+    sizes = {}
+    for line in git("ls-tree", "-r", "-l", "HEAD", cwd=root).splitlines():
+        meta, _ = line.split("\t", 1)
+        _, kind, oid, size = meta.split()
+        if kind == "blob":
+            sizes[oid] = int(size)
+    return sizes
+
+def analyze(source_repo, tmp_path, monkeypatch, sizes):
+    api_calls = []
+
+    async def fake_blob_sizes(owner, repo_name, commit_sha, github_token=None):
+        api_calls.append((owner, repo_name, commit_sha))
+        return sizes
+
+    monkeypatch.setattr(github_service, "fetch_blob_sizes", fake_blob_sizes)
+    mirror = str(tmp_path / "mirror.git")
+    clone_url = f"file://{source_repo}"
+
+    async def run():
+        commit_sha = await github_service.update_mirror(mirror, clone_url, "octo", "demo")
+        metadata = asyncio.get_running_loop().create_future()
+        metadata.set_result({})
+        repo_data = await github_service.analyze_mirror_commit(
+            mirror, clone_url, commit_sha, REPO_URL, metadata=metadata
+        )
+        present = await github_service.present_objects(mirror, commit_sha)
+        return repo_data, present
+
+    repo_data, present = asyncio.run(run())
+    return repo_data, present, api_calls
+
+def test_oversized_blobs_are_not_fetched(source_repo, tmp_path, monkeypatch):
+    sizes = tree_sizes(source_repo)
+    repo_data, present, api_calls = analyze(source_repo, tmp_path, monkeypatch, sizes)
+    oids = {path.split("\t")[1]: path.split()[2] for path in git("ls-tree", "-r", "HEAD", cwd=source_repo).splitlines()}
+
+    assert len(api_calls) == 1
+    assert set(repo_data["file_contents"]) == {"src/app.py", "src/util.js", "README.md"}
+    assert oids["dist.js"] not in present
+    assert oids["logo.png"] not in present
+    assert oids["src/app.py"] in present
+    # The sizes from the API end up in the file tree too
+    tree = {path: size for path, size, _ in github_service.get_file_index(repo_data["file_structure"]).iter_files()}
+    assert tree["dist.js"] == sizes[oids["dist.js"]]
+
+def test_without_api_sizes_oversized_blobs_are_fetched_and_skipped(source_repo, tmp_path, monkeypatch):
+    repo_data, present, _ = analyze(source_repo, tmp_path, monkeypatch, {})
+    oids = {path.split("\t")[1]: path.split()[2] for path in git("ls-tree", "-r", "HEAD", cwd=source_repo).splitlines()}
+
+    assert set(repo_data["file_contents"]) == {"src/app.py", "src/util.js", "README.md"}
+    assert oids["dist.js"] in present  # Documented over-fetch when sizes are unknown
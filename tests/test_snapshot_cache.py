@@ -0,0 +1,66 @@
+# tests/test_snapshot_cache.py - ON-DISK SNAPSHOTS: TTL AND LRU EVICTION
+import os
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from services import snapshot_cache
+
+TTL = 3600
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_cache, "SNAPSHOT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(snapshot_cache, "SNAPSHOT_CACHE_TTL_SECONDS", TTL)
+    monkeypatch.setattr(snapshot_cache, "SNAPSHOT_CACHE_MAX_BYTES", 10**9)
+    return tmp_path
+
+def save(commit_sha: str, written_ago: float = 0, used_ago: float = None) -> str:
+    snapshot_cache.save_snapshot("octo", "demo", commit_sha, {"name": "demo", "commit_sha": commit_sha})
+    path = snapshot_cache.get_snapshot_path("octo", "demo", commit_sha)
+    now = time.time()
+    os.utime(path, (now - (written_ago if used_ago is None else used_ago), now - written_ago))
+    return path
+
+def test_recently_used_snapshot_still_expires_by_write_time():
+    old = save("a" * 40, written_ago=TTL + 60, used_ago=5)
+    fresh = save("b" * 40, written_ago=60)
+
+    snapshot_cache.evict_snapshots()
+    assert not os.path.exists(old)
+    assert os.path.exists(fresh)
+
+def test_load_and_eviction_agree_on_expiry():
+    path = save("a" * 40, written_ago=TTL + 60, used_ago=5)
+    assert snapshot_cache.load_snapshot("octo", "demo", "a" * 40) is None
+    assert not os.path.exists(path)
+
+    path = save("b" * 40, written_ago=TTL - 60, used_ago=TTL - 60)
+    snapshot_cache.evict_snapshots()
+    assert os.path.exists(path)
+    assert snapshot_cache.load_snapshot("octo", "demo", "b" * 40)["commit_sha"] == "b" * 40
+
+def test_loading_keeps_the_write_time():
+    path = save("a" * 40, written_ago=600)
+    written = os.stat(path).st_mtime
+    snapshot_cache.load_snapshot("octo", "demo", "a" * 40)
+    assert os.stat(path).st_mtime == written
+    assert os.stat(path).st_atime > written + 500
+
+def test_eviction_drops_least_recently_used_first(monkeypatch):
+    older_but_used = save("a" * 40, written_ago=600)
+    newer_unused = save("b" * 40, written_ago=300)
+    snapshot_cache.load_snapshot("octo", "demo", "a" * 40)
+
+    monkeypatch.setattr(snapshot_cache, "SNAPSHOT_CACHE_MAX_BYTES", os.path.getsize(older_but_used))
+    snapshot_cache.evict_snapshots()
+    assert os.path.exists(older_but_used)
+    assert not os.path.exists(newer_unused)
+
+def test_latest_snapshot_is_the_most_recently_used():
+    save("a" * 40, written_ago=600)
+    save("b" * 40, written_ago=300)
+    snapshot_cache.load_snapshot("octo", "demo", "a" * 40)
+    assert snapshot_cache.load_latest_snapshot("octo", "demo")["commit_sha"] == "a" * 40